@@ -3,6 +3,9 @@ ASGI config for SeleniumTests project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+/events/<scenario> is answered here, outside Django's request cycle, with a Server-Sent Events
+stream of that scenario's live progress (see searchbox/events.py). Everything else goes to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
@@ -13,4 +16,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SeleniumTests.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from searchbox.events import sse_application  # noqa: E402 (needs the apps loaded by get_asgi_application)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"].startswith("/events/"):
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
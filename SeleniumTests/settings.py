@@ -148,3 +148,121 @@ STATIC_URL = '/static/'
 STATCFILES_DIRES = (
     os.path.join(BASE_DIR, 'static'),
 )
+
+
+# SELENIUM RUNNER
+# Run every browser in a view's browser_set at once (one worker per browser) instead of one after another.
+# SELENIUM_MAX_WORKERS caps how many browsers are driven at the same time; None means one per browser.
+SELENIUM_PARALLEL = True
+SELENIUM_MAX_WORKERS = None
+
+# Warm handler pool: tear_down() parks the browser (reset to a blank page) for the next request instead of quitting.
+# Handlers idle longer than SELENIUM_POOL_MAX_IDLE seconds or used SELENIUM_POOL_MAX_USES times are quit.
+# SELENIUM_POOL_PREWARM lists browsers to launch at startup, e.g. ["Firefox", "Chrome"].
+SELENIUM_POOL = True
+SELENIUM_POOL_MAX_IDLE = 300
+SELENIUM_POOL_MAX_USES = 20
+SELENIUM_POOL_PREWARM = []
+
+# Background jobs: the display_log views queue the run and answer at once with a job id instead of holding the
+# request open until every browser finishes. SELENIUM_JOB_WORKERS caps how many runs execute at the same time.
+SELENIUM_BACKGROUND_JOBS = True
+SELENIUM_JOB_WORKERS = 2
+SELENIUM_JOB_KEEP_FINISHED = 100
+# Identical runs share one in-flight job, and a finished result is reused for SELENIUM_RESULT_TTL seconds
+# (0 turns the cache off). POST runs/<scenario>/invalidate to drop it early.
+SELENIUM_RESULT_TTL = 60
+# The JSON endpoints that start or drop runs (runs/.../submit, runs/.../invalidate, keyword lists POSTed to
+# run/<scenario>/keywords) only take POSTs, from a signed-in user (with the CSRF token, like any of our forms) or
+# from a script sending "Authorization: Bearer <token>" with one of these. Keep them in secrets.json.
+SELENIUM_API_TOKENS = secrets.get("SELENIUM_API_TOKENS", [])
+# Where queued runs wait: "memory" runs them on this process's SELENIUM_JOB_WORKERS threads; "db" puts them in the
+# database for `manage.py run_worker` processes on any number of hosts (sharing DATABASES) to claim. A worker holds
+# a job on a SELENIUM_WORKER_LEASE second lease it keeps renewing; if it dies the job is requeued, at most
+# SELENIUM_JOB_MAX_ATTEMPTS times in all.
+SELENIUM_JOB_BACKEND = "memory"
+SELENIUM_WORKER_LEASE = 60
+SELENIUM_JOB_MAX_ATTEMPTS = 3
+
+# Logging: log calls only queue a JSON-lines record; one background thread writes them. Each run goes to
+# <scenario>.log as one block once it ends, and everything else (scheduler, workers, startup) to SELENIUM_LOG_FILE.
+# A log is rotated to .log.1 ... .log.<SELENIUM_LOG_BACKUPS> (at most 10) before it would pass SELENIUM_LOG_MAX_BYTES.
+SELENIUM_LOG_FILE = "searchbox.log"
+SELENIUM_LOG_MAX_BYTES = 10 * 1024 * 1024
+SELENIUM_LOG_BACKUPS = 5
+
+# Waits: every step polls its condition (element present, URL reached, DOM settled) starting every `poll` seconds
+# and backing off by `backoff` up to `max_poll`. A wait gives up after `timeout` seconds, or once a browser's run
+# has used up `run_budget` seconds in total.
+SELENIUM_WAITS = {
+    "timeout": 10,
+    "poll": 0.1,
+    "backoff": 1.5,
+    "max_poll": 1.0,
+    "run_budget": 120,
+}
+
+# HTTP fast path: with SELENIUM_CHECK_MODE = "http" (or ?mode=http) a scenario is first checked over plain HTTP and
+# only escalated to the browsers when that fails, or for SELENIUM_ESCALATION_SAMPLE of the passing checks.
+# SELENIUM_SUGGEST_URLS maps a scenario to its suggestion endpoint, e.g. "https://example.com/suggest?q={keyword}".
+SELENIUM_CHECK_MODE = "browser"
+SELENIUM_ESCALATION_SAMPLE = 0.1
+SELENIUM_SUGGEST_URLS = {}
+
+# Capability probe: at startup we check which browsers' drivers exist and actually launch (see /capabilities; a POST
+# from staff or with an API token queues a re-probe). Runs skip browsers known to be unavailable; a failure is retried after SELENIUM_PROBE_RETRY_AFTER seconds.
+SELENIUM_PROBE_AT_STARTUP = True
+SELENIUM_PROBE_RETRY_AFTER = 3600
+
+# Remote WebDriver nodes: browsers any node serves run there instead of on local drivers. An entry is a URL (a Grid
+# hub such as "http://grid:4444/wd/hub", or a standalone "chromedriver --port=9515") or a dict with its session
+# slots and the browsers it serves. Each session goes to the least-loaded healthy node; a node that stops answering
+# is skipped (sessions fail over to the others) and checked again every SELENIUM_REMOTE_RETRY_AFTER seconds.
+# When every slot is taken a launch waits up to SELENIUM_REMOTE_SLOT_WAIT seconds for one. For example:
+#   {"url": "http://10.0.0.5:4444/wd/hub", "slots": 4, "browsers": ["Chrome", "Firefox"]}
+SELENIUM_REMOTE_NODES = []
+SELENIUM_REMOTE_RETRY_AFTER = 30
+SELENIUM_REMOTE_SLOT_WAIT = 60
+
+# Browser backends beyond the built-in ones (backends/), by name: a dotted path to a module (or module:attribute)
+# with launch(page). Installed packages can add theirs through the "solotests.browser_backends" entry point group.
+# Each is only imported the first time a browser_set asks for it; /capabilities shows which are loaded and how long
+# their import took, along with what the app's own startup cost. For example: {"Brave": "mybackends.brave"}
+SELENIUM_BROWSER_BACKENDS = {}
+
+# A failing step is tried SELENIUM_STEP_RETRIES more times, SELENIUM_RETRY_BACKOFF seconds apart (doubling each time).
+# If it still fails it is recorded as failed and that browser's run ends; the other browsers carry on.
+SELENIUM_STEP_RETRIES = 1
+SELENIUM_RETRY_BACKOFF = 1.0
+
+# Extra scenarios, in the same shape as searchbox/scenarios.py DEFINITIONS (same name replaces ours).
+# They are validated and compiled once at startup and served at /run/<name>. For example:
+#   "t7search": {"initial_url": "https://solosegment.com/", "results_url": "https://solosegment.com/?s=seo",
+#                "keyword": "seo", "browser_set": {"Linux": ["Firefox", "Chrome"]},
+#                "steps": [{"name": "search box", "locator": '//*[@id="search-6"]/form/label/input',
+#                           "action": "type_enter"}, {"name": "results URL", "expect": "url"}]}
+SELENIUM_SCENARIOS = {}
+
+# Scenarios that opt in with "resources" (e.g. searchbox.scenarios.SEARCH_ONLY) block images, fonts, trackers... and
+# may load pages "eager"ly. To report what blocking saves, the first run per browser and this fraction of later runs
+# load the page unblocked, with the same page-load strategy. A browser that can't block something logs a warning.
+SELENIUM_RESOURCE_BASELINE_SAMPLE = 0.05
+
+# Keywords for /run/<scenario>/keywords when the request doesn't list any: one per line, # for comments
+SELENIUM_KEYWORDS_FILE = None
+
+# Checks to run on a schedule, by `manage.py run_scheduler` (or inside the web process when
+# SELENIUM_SCHEDULE_IN_PROCESS). every and jitter are seconds; mode is "browser" or "http";
+# on_overlap ("skip" or "queue") says what to do when a run falls due while the last one is going.
+# At most SELENIUM_SCHEDULE_MAX_RUNS run at once, and at most the limit here per browser.
+# Checks are queued like any other run (SELENIUM_JOB_BACKEND), so they share cached results with the
+# pages. Only the process holding the SELENIUM_SCHEDULE_LOCK file runs the schedule, so of several web
+# workers on one host just one starts it; with several hosts, run `run_scheduler` on one of them.
+SELENIUM_SCHEDULE = [
+    # {"check": "t5search", "every": 300, "jitter": 30, "mode": "browser", "on_overlap": "skip"},
+    # {"check": "t6search", "every": 600, "jitter": 60, "mode": "http", "on_overlap": "queue"},
+]
+SELENIUM_SCHEDULE_IN_PROCESS = False
+SELENIUM_SCHEDULE_LOCK = os.path.join(BASE_DIR, "scheduler.lock")
+SELENIUM_SCHEDULE_MAX_RUNS = 2
+SELENIUM_SCHEDULE_BROWSER_LIMITS = {"Firefox": 1, "Chrome": 1}
@@ -25,5 +25,19 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('display_log5.html',views.t5search),
     path('display_log6.html',views.t6search),
+    path('run/<str:scenario>', views.scenario_view, name='scenario'),
+    path('run/<str:scenario>/keywords', views.keyword_matrix, name='keyword_matrix'),
+    path('batch', views.batch, name='batch'),
+    path('runs/batch/submit', views.submit_batch_run, name='submit_batch_run'),
+    path('runs/<str:scenario>/submit', views.submit_run, name='submit_run'),
+    path('runs/<str:scenario>/invalidate', views.invalidate_run, name='invalidate_run'),
+    path('jobs/<str:job_id>', views.run_status, name='run_status'),
+    path('jobs/<str:job_id>/result', views.run_result, name='run_result'),
+    path('logs/<str:scenario>', views.view_log, name='view_log'),
+    path('capabilities', views.capabilities, name='capabilities'),
+    path('metrics', views.metrics, name='metrics'),
+    path('history.html', views.history, name='history'),
+    path('history.json', views.history_json, name='history_json'),
+    path('timings.json', views.timing_summary, name='timing_summary'),
     path('errors.html', views.errors)
 ]
@@ -0,0 +1,118 @@
+#!
+"""Browser backends, each imported the first time a run asks for it.
+
+A backend is a module (or any object) with launch(page), which starts a browser for a MainInterfacer
+page and returns its handler, or None if it couldn't. Selenium's webdriver package and every
+browser's driver bindings are only imported by the backends, so a process that never launches a
+browser (the home page, admin, migrate) never pays for them, and one that only drives Firefox never
+loads Chrome's.
+
+The built-in backends are below. Others can be added without touching this package:
+  * by a distribution, with an entry point in the "solotests.browser_backends" group, e.g. in its
+    setup.cfg: [options.entry_points] solotests.browser_backends = Brave = brave_backend
+  * by settings.SELENIUM_BROWSER_BACKENDS, e.g. {"Brave": "mybackends.brave"}
+  * by calling browser_backends.register(name, backend)
+Either way the backend's name is what a scenario's browser_set lists, and what scenarios are validated
+against. Where a built-in browser runs is in PLATFORMS; a backend from elsewhere is probed on any platform.
+"""
+import threading
+import time
+from importlib import import_module
+
+ENTRY_POINT_GROUP = "solotests.browser_backends"
+
+BUILTIN = { # backend name -> module that implements it
+    "Chrome": "backends.chrome",
+    "Firefox": "backends.firefox",
+    "Edge": "backends.edge",
+    "Safari": "backends.safari",
+    "IE": "backends.ie",
+    "Remote": "backends.remote", # any browser, on the nodes in SELENIUM_REMOTE_NODES
+}
+
+PLATFORMS = { # backend name -> the platforms its browser runs on, for the probe (see BackendRegistry.for_platform)
+    "Chrome": ("Windows", "Darwin", "Linux"),
+    "Firefox": ("Windows", "Darwin", "Linux"),
+    "Edge": ("Windows",),
+    "Safari": ("Darwin",),
+    "IE": ("Windows",),
+    "Remote": (), # reaches the other browsers on remote nodes; not a browser to probe itself
+}
+
+
+class BackendRegistry():
+    """ Backends by name. get() imports a backend on first use and remembers how long that took"""
+    def __init__(self, builtin=None, platforms=None):
+        self.targets = {name: (target, "builtin") for name, target in (builtin or {}).items()}
+        self.platforms = dict(platforms or {}) # name -> platforms; a name not here runs on any platform
+        self.loaded = {} # name -> the imported backend
+        self.import_seconds = {} # name -> how long its first import took
+        self.entry_points_read = False
+        self.lock = threading.RLock()
+
+    def register(self, name, target, source="registered", platforms=None):
+        """target: the backend itself, or a dotted path to it ("package.module" or "package.module:attribute").
+        platforms, if given, are the platforms its browser runs on"""
+        with self.lock:
+            self.targets[name] = (target, source)
+            self.loaded.pop(name, None)
+            if platforms is not None:
+                self.platforms[name] = tuple(platforms)
+
+    def get(self, name):
+        """The backend called name, importing it if this is the first use. LookupError if there's no such backend"""
+        with self.lock:
+            if name in self.loaded:
+                return self.loaded[name]
+            if name not in self.targets:
+                self.read_entry_points()
+            if name not in self.targets:
+                raise LookupError(f"no browser backend called {name} (known: {', '.join(self.names())})")
+            target, source = self.targets[name]
+            start = time.perf_counter()
+            backend = load(target) if isinstance(target, str) else target
+            self.import_seconds[name] = time.perf_counter() - start
+            self.loaded[name] = backend
+            return backend
+
+    def names(self):
+        with self.lock:
+            self.read_entry_points()
+            return list(self.targets)
+
+    def for_platform(self, running_platform):
+        """The backends whose browsers run on running_platform, in the order they were registered"""
+        with self.lock:
+            self.read_entry_points()
+            return [name for name in self.targets if running_platform in self.platforms.get(name, (running_platform,))]
+
+    def read_entry_points(self):
+        """Add the backends installed distributions declare. Only their names are read here, not their code"""
+        if self.entry_points_read:
+            return
+        self.entry_points_read = True
+        from importlib.metadata import entry_points
+        found = entry_points()
+        group = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, "select") else found.get(ENTRY_POINT_GROUP, [])
+        for entry_point in group:
+            self.targets.setdefault(entry_point.name, (entry_point.value, "entry point"))
+
+    def as_list(self):
+        """Every known backend, whether it has been imported yet, and how long that took"""
+        with self.lock:
+            self.read_entry_points()
+            return [{"backend": name, "source": source, "loaded": name in self.loaded,
+                     "import_ms": round(self.import_seconds[name] * 1000, 1) if name in self.import_seconds else None}
+                    for name, (target, source) in self.targets.items()]
+
+
+def load(target):
+    """Import "package.module" or "package.module:attribute" """
+    module_name, _, attribute = target.partition(":")
+    backend = import_module(module_name)
+    for part in filter(None, attribute.split(".")):
+        backend = getattr(backend, part)
+    return backend
+
+
+browser_backends = BackendRegistry(BUILTIN, PLATFORMS) # One registry per process
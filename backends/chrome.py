@@ -0,0 +1,58 @@
+#!
+"""Chrome, through a local chromedriver"""
+from selenium import webdriver # The webdriver class connects to the browser's instance
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+from pathlib2 import Path # this module lets us consolidate paths across platforms
+
+from maininterfacer import BLOCKABLE, block_patterns
+
+SERVICE = Service # a standalone chromedriver can serve as a remote node (see searchbox.runner.start_local_nodes)
+RESOURCES = {"block": tuple(BLOCKABLE), "block_urls": True, "page_load_strategy": True} # DevTools blocks any pattern
+
+
+def options(page):
+    """Running Chrome headless with sendkeys requires a window size"""
+    options = webdriver.ChromeOptions()
+    options.add_argument("window-size=1920x1080")
+    options.add_argument("headless")
+    strategy = page.resources.get("page_load_strategy", "normal")
+    if strategy != "normal":
+        options.set_capability("pageLoadStrategy", strategy) # eager: don't wait for images and subframes
+    if "image" in page.resources.get("block", ()):
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+
+def block_urls(page, execute_cdp):
+    """Have Chrome's DevTools block the scenario's resource patterns for the whole session"""
+    patterns = block_patterns(page.resources)
+    if patterns:
+        try: # the DevTools block list lasts for the whole session, which is why it's part of pool_key
+            execute_cdp("Network.enable", {})
+            execute_cdp("Network.setBlockedURLs", {"urls": patterns})
+        except WebDriverException as exc:
+            page.log(f"Warning {page.browse} could not block resources: {exc.msg}")
+
+
+def launch(page):
+    """Product name: unavailable Product version: unavailable"""
+    chrome_options = options(page)
+
+    try:
+        if page.running_platform == "Darwin": # If it's a mac, then use the old API code regardless of Selenium version
+            handler = webdriver.Chrome(options=chrome_options, executable_path=page.handler_path + 'chromedriver')
+        elif page.running_platform == "Windows" and page.selenium_ver == "4": # If it's Windows, then check selenium version
+            service = Service(Path(page.handler_path + 'chromedriver.exe')) # Specify the custom path new for Selenium 4
+            handler = webdriver.Chrome(options=chrome_options, service=service)
+        elif page.running_platform == "Windows":
+            handler = webdriver.Chrome(options=chrome_options, executable_path=Path(page.handler_path + 'chromedriver.exe'))
+
+        else: # In case it's Linux
+            handler = webdriver.Chrome(options=chrome_options, executable_path=Path(page.handler_path + 'chromedriver'))
+        page.log(f"Info {page.browse} browser handler found")
+        block_urls(page, handler.execute_cdp_cmd)
+    except (WebDriverException):
+        page.log(f"Warning  {page.browse} browser handler not found or failed to launch.")
+        handler = None
+    return handler
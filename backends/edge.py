@@ -0,0 +1,37 @@
+#!
+"""Edge, through a local msedgedriver and the msedge-selenium-tools package"""
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.edge.service import Service # couldn't get Service to work for Edge
+from pathlib2 import Path # this module lets us consolidate paths across platforms
+try:
+    from msedge.selenium_tools import Edge, EdgeOptions
+except ImportError:
+    Edge = EdgeOptions = None # only needed where Edge runs (Windows)
+
+from maininterfacer import unsupported
+
+SERVICE = Service # a standalone msedgedriver can serve as a remote node
+RESOURCES = {} # the legacy msedge-selenium-tools launch takes no blocking or page-load strategy
+
+
+def launch(page):
+    """Product name: Microsoft WebDriver Product version 83.0.478.58
+    * Edge gets wordy when it's headless, but at least it's working (by setting window size)
+    * At the time of this refactor for Selenium 4, Edge does not yet support the new API, so I'm using the legacy one"""
+    if Edge is None:
+        page.log(f"Warning {page.browse} needs the msedge-selenium-tools package")
+        return None
+    unsupported(page, **RESOURCES)
+    options = EdgeOptions()
+    options.use_chromium = True
+    #EdgeOptions.AddArguments("headless")  # this version of selenium doesn't have addarguments for edge
+    options.headless = True # I got this to work by setting the handler window size
+
+    try:
+        handler = Edge(executable_path=Path(page.handler_path + 'msedgedriver.exe'), options=options)
+        handler.set_window_size(1600, 1200)  # set the browser handler window size so that headless will work with sendkeys
+        page.log(f"Info {page.browse} browser handler found")
+    except (WebDriverException):
+        page.log(f"Warning {page.browse} browser handler not found or failed to launch.")
+        handler = None
+    return handler # ignore the handshake errors
@@ -0,0 +1,57 @@
+#!
+"""Firefox, through a local geckodriver"""
+from selenium import webdriver # The webdriver class connects to the browser's instance
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.firefox.service import Service
+from pathlib2 import Path # this module lets us consolidate paths across platforms
+
+from maininterfacer import unsupported
+
+SERVICE = Service # a standalone geckodriver can serve as a remote node, one session at a time
+# preferences cover these; there's no stylesheet blocking or URL pattern blocking (block_urls) without DevTools
+RESOURCES = {"block": ("image", "font", "media"), "block_urls": False, "page_load_strategy": True}
+
+
+def options(page):
+    """Firefox can run headless with sendkeys"""
+    options = Options()
+    options.headless = True
+    strategy = page.resources.get("page_load_strategy", "normal")
+    if strategy != "normal":
+        options.set_capability("pageLoadStrategy", strategy)
+    block = page.resources.get("block", ())
+    if "image" in block:
+        options.set_preference("permissions.default.image", 2)
+    if "font" in block:
+        options.set_preference("browser.display.use_document_fonts", 0)
+    if "media" in block:
+        options.set_preference("media.autoplay.default", 5) # no autoplaying audio or video
+    if page.resources.get("block_urls"): # no URL patterns, but its tracker list covers the usual analytics
+        options.set_preference("privacy.trackingprotection.enabled", True)
+    return options
+
+
+def launch(page):
+    """Product name: Firefox Nightly Product version: 71.0a1
+    (Firefox handler is called GeckoDriver)
+    Note about firefox driver on MacOS: if it fails to load there's a simple one-time workaround:
+    https://firefox-source-docs.mozilla.org/testing/geckodriver/Notarization.html"""
+    firefox_options = options(page)
+    unsupported(page, **RESOURCES)
+
+    try:
+        if page.running_platform == "Darwin": # If it's a mac, then use the old API code regardless of Selenium version
+            handler = webdriver.Firefox(options=firefox_options, executable_path=page.handler_path + 'geckodriver')
+        elif page.running_platform == "Windows" and page.selenium_ver == "4": # If it's Windows, then check selenium version
+            service = Service(Path(page.handler_path + 'geckodriver.exe')) # Specify the custom path (new for Selenium 4)
+            handler = webdriver.Firefox(options=firefox_options, service=service)
+        elif page.running_platform == "Windows":
+            handler = webdriver.Firefox(options=firefox_options, executable_path=Path(page.handler_path + 'geckodriver.exe'))
+        else: # In case it's Unix
+            handler = webdriver.Firefox(options=firefox_options, executable_path=Path(page.handler_path + 'geckodriver'))
+        page.log(f"Info {page.browse} browser handler found")
+    except (WebDriverException):
+        page.log(f"Warning {page.browse} browser handler not found or failed to launch.")
+        handler = None
+    return handler
@@ -0,0 +1,34 @@
+#!
+"""Internet Explorer, through a local IEDriverServer"""
+from selenium import webdriver # The webdriver class connects to the browser's instance
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.ie.service import Service
+from pathlib2 import Path # this module lets us consolidate paths across platforms
+
+from maininterfacer import unsupported
+
+RESOURCES = {} # IEDriverServer can't block resources, and we launch it without options
+
+
+def launch(page):
+    """Product name: Selenium WebDriver Product version: 2.42.0.0
+    IE does not have support for a headless mode
+    IE has some other gotchas, too, which I posted in my blog.
+    See https://speakingpython.blogspot.com/2020/07/working-with-selenium-webdriver-in.html
+    """
+    unsupported(page, **RESOURCES)
+    try:
+        if page.selenium_ver == "4":
+            # for IE, we use the IEDriverServer which might be why it redirects (see log)
+            service = Service(Path(page.handler_path + 'IEDriverServer.exe')) # Specify the custom path (new for Selenium 4)
+            handler = webdriver.Ie(service=service)
+            page.log(f"Info {page.browse} Finished handler setup")
+        else:
+            handler = webdriver.Ie(executable_path=Path(page.handler_path + 'IEDriverServer.exe'))
+
+        handler.maximize_window()
+        page.log(f"Info {page.browse} browser handler found")
+    except (WebDriverException):
+        page.log(f"Warning {page.browse} browser handler not found or failed to launch.")
+        handler = None
+    return handler
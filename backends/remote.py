@@ -0,0 +1,214 @@
+#!
+"""Any browser, as a session on one of the remote WebDriver nodes (a Selenium Grid hub, or a standalone
+chromedriver/geckodriver started with --port), and remote_nodes, which keeps track of those nodes.
+
+remote_nodes is imported by every process (maininterfacer, the views, startup), so this module only
+imports selenium's webdriver once a remote session is launched, like the other backends do theirs"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.request import urlopen
+
+from backends import browser_backends
+
+
+class RemoteNode():
+    """A remote WebDriver endpoint: a Selenium Grid hub or node, or a standalone driver process"""
+    def __init__(self, url, slots=1, browsers=None):
+        self.url = url.rstrip("/")
+        self.slots = slots # sessions it can run at once (geckodriver: 1; chromedriver and Grid: more)
+        self.browsers = browsers # None: any browser
+        self.sessions = 0
+        self.healthy = True
+        self.down_since = None
+        self.last_error = ""
+        self.launched = 0 # sessions started here, for the node listing
+
+    def serves(self, browse):
+        return self.browsers is None or browse in self.browsers
+
+    def load(self):
+        return self.sessions / self.slots
+
+    def as_dict(self):
+        return {"url": self.url, "slots": self.slots, "sessions": self.sessions, "healthy": self.healthy,
+                "browsers": self.browsers, "launched": self.launched, "last_error": self.last_error,
+                "down_since": None if self.down_since is None else
+                              datetime.fromtimestamp(self.down_since, timezone.utc).isoformat()}
+
+
+class RemoteNodes():
+    """ The remote WebDriver nodes (settings.SELENIUM_REMOTE_NODES) and their free slots. acquire() sends each new
+    session to the least-loaded healthy node serving the browser, waiting up to slot_wait seconds when every slot
+    is taken. A node that stops answering /status is marked down and skipped, and checked again once it has been
+    down retry_after seconds, so a node that comes back rejoins without a restart."""
+    def __init__(self, retry_after=30, slot_wait=60, status_timeout=3):
+        self.retry_after = retry_after
+        self.slot_wait = slot_wait
+        self.status_timeout = status_timeout
+        self.nodes = []
+        self.freed = threading.Condition()
+
+    def configure(self, nodes=None, retry_after=None, slot_wait=None):
+        """nodes: URLs, or dicts of url, slots and browsers"""
+        if nodes is not None:
+            with self.freed:
+                self.nodes = [RemoteNode(node) if isinstance(node, str) else RemoteNode(**node) for node in nodes]
+        if retry_after is not None:
+            self.retry_after = retry_after
+        if slot_wait is not None:
+            self.slot_wait = slot_wait
+
+    def serves(self, browse):
+        return any(node.serves(browse) for node in self.nodes)
+
+    def acquire(self, browse, exclude=()):
+        """Take a slot on the least-loaded healthy node for browse. None if no node can take the session"""
+        deadline = time.monotonic() + self.slot_wait
+        while True:
+            self.recheck(browse)
+            with self.freed:
+                nodes = [node for node in self.nodes if node.serves(browse) and node.healthy and node not in exclude]
+                if not nodes:
+                    return None
+                free = [node for node in nodes if node.sessions < node.slots]
+                if free:
+                    node = min(free, key=RemoteNode.load)
+                    node.sessions += 1
+                    return node
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.freed.wait(min(remaining, self.retry_after)) # woken when a session quits
+
+    def release(self, node):
+        with self.freed:
+            node.sessions = max(0, node.sessions - 1)
+            self.freed.notify_all()
+
+    def launch_failed(self, node, exc):
+        """A session didn't start on node: mark it down if it no longer answers, else it's the session's fault"""
+        node.last_error = repr(exc)
+        self.check(node)
+
+    def recheck(self, browse):
+        """Check the down nodes serving browse that have been down for retry_after seconds"""
+        now = time.time()
+        for node in [node for node in self.nodes if node.serves(browse) and not node.healthy
+                     and now - node.down_since >= self.retry_after]:
+            self.check(node)
+
+    def check(self, node):
+        """Ask the node for its /status. True if it answers; otherwise it's marked down"""
+        try:
+            with urlopen(f"{node.url}/status", timeout=self.status_timeout) as response:
+                if "value" not in json.loads(response.read().decode("utf-8")):
+                    raise ValueError("not a WebDriver status")
+        except Exception as exc: # refused, timed out, or not a WebDriver endpoint
+            if node.healthy:
+                logging.warning(f"{datetime.now(tz=None)} Warning remote node {node.url} is down: {exc!r}")
+            node.healthy, node.down_since, node.last_error = False, time.time(), repr(exc)
+            return False
+        if not node.healthy:
+            logging.info(f"{datetime.now(tz=None)} Info remote node {node.url} is back")
+        with self.freed:
+            node.healthy, node.down_since = True, None
+            self.freed.notify_all()
+        return True
+
+    def check_all(self):
+        for node in self.nodes:
+            self.check(node)
+        return self.as_list()
+
+    def as_list(self):
+        return [node.as_dict() for node in self.nodes]
+
+
+remote_nodes = RemoteNodes() # One set of nodes per process, configured from settings at startup
+
+
+def remote_resources(browse):
+    """What a remote session can do: DevTools (Chrome, Edge) blocks any pattern; Firefox as locally"""
+    from maininterfacer import BLOCKABLE
+    return {
+        "Chrome": {"block": tuple(BLOCKABLE), "block_urls": True, "page_load_strategy": True},
+        "Edge": {"block": tuple(BLOCKABLE), "block_urls": True, "page_load_strategy": True},
+        "Firefox": {"block": ("image", "font", "media"), "block_urls": False, "page_load_strategy": True},
+    }.get(browse, {"page_load_strategy": True})
+
+
+@lru_cache(maxsize=None)
+def remote_handler():
+    """The RemoteHandler class, defined the first time a session starts so that selenium's webdriver loads then"""
+    from selenium import webdriver # The webdriver class connects to the browser's instance
+    from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection # Remote sessions that speak CDP
+
+    class RemoteHandler(webdriver.Remote):
+        """A session on a RemoteNode. Quitting it gives the node's slot back, whichever way it's quit
+        (tear down, the pool retiring it, or a failover)"""
+        node = None
+
+        @classmethod
+        def start(cls, node, browse, options):
+            executor = node.url
+            if browse in ("Chrome", "Edge"): # knows the vendor's DevTools endpoint, so we can block resources
+                executor = ChromiumRemoteConnection(node.url, vendor_prefix="goog" if browse == "Chrome" else "ms",
+                                                    browser_name=browse.lower(), keep_alive=True)
+            handler = cls(command_executor=executor, options=options)
+            handler.node = node
+            node.launched += 1
+            return handler
+
+        def quit(self):
+            node, self.node = self.node, None
+            try:
+                super().quit()
+            finally:
+                if node is not None:
+                    remote_nodes.release(node)
+
+    return RemoteHandler
+
+
+def options(page):
+    """The options a remote session asks for: the same as a local launch's where we build them"""
+    from selenium import webdriver
+    from selenium.webdriver.safari.options import Options as SafariOptions
+    if page.browse in ("Chrome", "Firefox"):
+        return browser_backends.get(page.browse).options(page)
+    options = {"Edge": webdriver.EdgeOptions, "IE": webdriver.IeOptions}.get(page.browse, SafariOptions)()
+    strategy = page.resources.get("page_load_strategy", "normal")
+    if strategy != "normal":
+        options.set_capability("pageLoadStrategy", strategy)
+    return options
+
+
+def launch(page):
+    """A session on the least-loaded healthy node with a free slot, chosen by remote_nodes.
+    A node that fails to start the session is checked and, if it's gone, skipped until it comes back"""
+    from maininterfacer import unsupported
+    unsupported(page, **remote_resources(page.browse))
+    tried = []
+    while True:
+        node = remote_nodes.acquire(page.browse, exclude=tried)
+        if node is None:
+            page.log(f"Warning {page.browse} no remote node with a free slot"
+                     f"{' (tried ' + ', '.join(node.url for node in tried) + ')' if tried else ''}")
+            return None
+        tried.append(node)
+        try:
+            handler = remote_handler().start(node, page.browse, options(page))
+        except Exception as exc: # WebDriverException, or the node refusing the connection
+            remote_nodes.release(node)
+            remote_nodes.launch_failed(node, exc)
+            page.log(f"Warning {page.browse} remote node {node.url} failed to start a session: {exc!r}")
+            continue
+        page.log(f"Info {page.browse} browser handler found on remote node {node.url}")
+        if page.browse in ("Chrome", "Edge"):
+            browser_backends.get("Chrome").block_urls(page, lambda cmd, params: handler.execute(
+                "executeCdpCommand", {"cmd": cmd, "params": params}))
+        return handler
@@ -0,0 +1,19 @@
+#!
+"""Safari, through the safaridriver that ships with macOS"""
+from selenium import webdriver # The webdriver class connects to the browser's instance
+
+from maininterfacer import unsupported
+
+RESOURCES = {} # safaridriver can't block resources, and we launch it without options
+
+
+def launch(page): # this Selenium (3) legacy API code works with both selenium 3 and selenium 4
+    unsupported(page, **RESOURCES)
+    try:
+        handler = webdriver.Safari(executable_path=page.handler_path + 'safaridriver')
+        handler.maximize_window() # necessary for sendkeys to work
+        page.log(f"Info {page.browse} browser handler found")
+    except:
+        page.log(f"Warning {page.browse} browser handler not found or failed to launch.")
+        handler = None
+    return handler
@@ -1,34 +1,38 @@
 #!
 # System and Module Imports
 import logging
-from datetime import datetime
-# Selenium Imports
-from selenium import webdriver # The webdriver class connects to the browser's instance
-from selenium.common.exceptions import WebDriverException
-# browser Imports
-from selenium.webdriver.firefox.options import Options
-try:
-    from msedge.selenium_tools import Edge, EdgeOptions
-except:
-    pass 
-from selenium.webdriver.chrome import service
-# browser Imports for Selenium 4
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.edge.service import Service # couldn't get Service to work for Edge
-from selenium.webdriver.safari.service import Service  
-from selenium.webdriver.ie.service import Service
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+# Selenium Imports: only its exceptions here; webdriver and the browsers' bindings load with their backend
+from selenium.common.exceptions import WebDriverException, TimeoutException
+from backends import browser_backends # Chrome, Firefox... each imported the first time it's launched
+from backends.remote import remote_nodes # the remote WebDriver nodes; selenium's webdriver only loads for a session
+from waits import Waiter # condition-based waits shared by every page
 # Determine which platform
 from pathlib2 import Path # this module lets us consolidate paths across platforms
  
 
+class StepFailed(Exception):
+    """A step didn't do what it should. The step has already been recorded as failed (end_step) when this is
+    raised; the run catches it, tears down and moves on to the next browser instead of exiting the process"""
+
+
+def correlation_id():
+    """A short random id that ties a browser's or a step's log lines together"""
+    return uuid.uuid4().hex[:12]
+
+
 class MainInterfacer():
     """ Parent class for selenium webdriver scripts. It does the handler setup based on three factors:
     1. Browser (Firefox, IE, Safari, Edge, Chrome)
     2. Selenium version (could be Selenium 3 or the Selenium 4 beta)
     3. OS Platofrm (Mac, Windows or Linux)
     """
-    def __init__(self, config, browse):        
+    def __init__(self, config, browse, launch=True):        
         self.initial_url = config["initial_url"]
         self.results_url = config["results_url"]
         self.keyword = config["keyword"]        
@@ -36,115 +40,672 @@ class MainInterfacer():
         self.selenium_ver = config["selenium_ver"]
         self.handler_path = config["handler_path"]
         self.browse=browse
+        self.use_pool = config.get("use_pool", False) # check a warm handler out of handler_pool instead of cold-launching
+        self.step_retries = config.get("step_retries", 0) # how many more times attempt() tries a failing step
+        self.retry_backoff = config.get("retry_backoff", 1.0) # seconds before the first retry; doubles each time
+        self.report = [] # This browser's log lines, kept apart so parallel runs don't interleave
+        self.on_event = config.get("on_event") # optional callback that gets every log line and step as it happens
+        self.run_log = config.get("run_log") # the run's searchbox.runlog.RunLog; each line goes there as it's logged
+        self.log_id = correlation_id() # tells this browser's lines apart from the run's other browsers'
+        self.steps = [] # Structured result of each step (see begin_step/end_step), saved with the run
+        self.current_step = None
+        self.phases = [] # (phase, seconds) for launch, pre-check, page load, lookups, verification, teardown
+        self.launched = False
+        self.resources = config.get("resources") or {} # what to block and the page-load strategy (see block_patterns)
+        self.baseline_run = False # an unblocked load, measured so we know what blocking saves
+        self.page_weight = None # {"bytes", "requests", "seconds"} of the last measured page load
+        self.resource_savings = None # {"bytes", "seconds"} blocking saved against the unblocked baseline
+        self.timing = {} # the site's own timings: "landing"/"results" navigation and resources, keystroke_to_dropdown
+        if block_patterns(self.resources) and launch and not config.get("probe") and load_baselines.wanted(self.baseline_key()):
+            self.resources, self.baseline_run = unblocked(self.resources), True
+
+        # With SELENIUM_REMOTE_NODES the browsers they serve run there instead (config "remote": False keeps them local)
+        self.remote = config.get("remote", True) and remote_nodes.serves(self.browse)
+        # remote nodes come and go, so their health is tracked by remote_nodes rather than remembered here
+        known = None if config.get("probe") or self.remote else browser_capabilities.lookup(self.capability_key())
+        if self.browse in (config.get("unavailable") or {}): # the run was told so (a job worker without this browser)
+            known = {"available": False, "reason": config["unavailable"][self.browse]}
+        if known is not None and not known["available"]: # don't pay for a launch we know will fail
+            self.log(f"Warning {self.browse} skipped: {known['reason']}")
+            self.handler = None
+        elif not launch:
+            self.handler = None
+        else:
+            with self.phase("driver_launch"):
+                if self.use_pool:
+                    self.handler = handler_pool.checkout(self) # Borrow a warm handler, launching one only if none is idle
+                else:
+                    self.handler = self.launch_handler() # Go get Our Handler
+            if known is None and not config.get("probe") and not self.remote:
+                browser_capabilities.learn(self) # remember how this launch went
+        self.launched = self.handler is not None
+        self.waiter = Waiter(self, **config.get("waits", {})) # the run budget starts counting here
+
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of the run (see searchbox/metrics.py). Recorded even if the phase fails"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.monotonic() - start))
+
+
+    def capability_key(self):
+        """Whether a browser can be launched depends on the browser, the platform, selenium and the driver path
+        (or, for remote sessions, that they're remote: a pooled remote handler never stands in for a local one)"""
+        return (self.browse, self.running_platform, self.selenium_ver, "remote" if self.remote else self.handler_path)
+
+
+    def pool_key(self):
+        """Handlers are only interchangeable if they were launched for the same browser with the same options"""
+        return self.capability_key() + (self.resources.get("page_load_strategy", "normal"),
+                                        tuple(sorted(self.resources.get("block", ()))),
+                                        tuple(self.resources.get("block_urls", ())))
+
+
+    def baseline_key(self):
+        """Loads are only compared under the same page-load strategy: an eager load stops at DOMContentLoaded"""
+        return (self.browse, self.initial_url, self.resources.get("page_load_strategy", "normal"))
 
-        self.driverSelect = {
-            "Chrome": self.SetUpChrome,          
-            "Firefox": self.SetUpFirefox,
-            "Edge": self.SetUpEdge,
-            "IE": self.SetUpIE,
-            "Safari": self.SetUpSafari
-        }
-        self.handler = self.driverSelect[self.browse]() # Go get Our Handler         
-
-
-    def SetUpChrome(self):
-        """Product name: unavailable Product version: unavailable 
-        Running Chrome headless with sendkeys requires a window size"""
-        options = webdriver.ChromeOptions()           
-        options.add_argument("window-size=1920x1080")
-        options.add_argument("headless")         
-
-        try:   
-            if self.running_platform == "Darwin": # If it's a mac, then use the old API code regardless of Selenium version
-                handler = webdriver.Chrome(options=options, executable_path=self.handler_path + 'chromedriver')   
-            elif self.running_platform == "Windows" and self.selenium_ver == "4": # If it's Windows, then check selenium version                
-                service = Service(Path(self.handler_path + 'chromedriver.exe')) # Specify the custom path new for Selenium 4                            
-                handler = webdriver.Chrome(options=options, service=service)                    
-            elif self.running_platform == "Windows":                  
-                handler = webdriver.Chrome(options=options,executable_path=Path(self.handler_path + 'chromedriver.exe')) 
-
-            else: # In case it's Linux
-                handler = webdriver.Chrome(options=options,executable_path=Path(self.handler_path +'chromedriver'))    
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} browser handler found")  
-        except (WebDriverException):
-            logging.info(f"{datetime.now(tz=None)} Warning  {self.browse} browser handler not found or failed to launch.")  
-            handler = None  
-        return handler         
-
-    def SetUpFirefox(self):
-        """Product name: Firefox Nightly Product version: 71.0a1 
-        Firefox can run headless with sendkeys. (Firefox handler is called GeckoDriver)
-        Note about firefox driver on MacOS: if it fails to load there's a simple one-time workaround: 
-        https://firefox-source-docs.mozilla.org/testing/geckodriver/Notarization.html"""  
-        options = Options()
-        options.headless = True
-                
+
+    def measure_page_load(self, seconds):
+        """Log the page's weight (bytes transferred and requests, from Resource Timing) and load time.
+        An unblocked load becomes the baseline; a blocked one is compared with it (see baseline_key)"""
+        try:
+            weight = self.handler.execute_script(PAGE_WEIGHT_SCRIPT)
+        except WebDriverException:
+            weight = None
+        if not weight: # no Resource Timing in this browser
+            load_baselines.forget(self.baseline_key())
+            return
+        self.page_weight = dict(weight, seconds=seconds)
+        self.log(f"Info {self.browse} page weight {weight['bytes'] / 1024:.0f} kB in {weight['requests']} requests, "
+                 f"loaded in {seconds:.2f}s{' (unblocked baseline)' if self.baseline_run else ''}")
+        if not block_patterns(self.resources):
+            load_baselines.update(self.baseline_key(), weight["bytes"], seconds)
+            return
+        baseline = load_baselines.get(self.baseline_key())
+        if baseline is None:
+            self.log(f"Info {self.browse} no unblocked load of {self.initial_url} to compare blocking with yet")
+            return
+        self.resource_savings = {"bytes": max(0, baseline[0] - weight["bytes"]), "seconds": baseline[1] - seconds}
+        self.log(f"Info {self.browse} blocking saved {self.resource_savings['bytes'] / 1024:.0f} kB and "
+                 f"{self.resource_savings['seconds']:.2f}s against unblocked loads")
+        self.emit(dict(self.resource_savings, type="resource_savings"))
+
+
+    def capture_timing(self, label):
+        """Keep the current page's Navigation Timing and a summary of its Resource Timing under timing[label].
+        Times are whole milliseconds from the start of the navigation. The driver hands the page back at
+        DOMContentLoaded (eager) or before the results page is loaded at all (a URL change), so we wait for
+        the load event first; if it never comes, what the page has so far is kept"""
+        try:
+            self.waiter.page_loaded(f"{label} page load")
+        except WebDriverException: # a timeout is logged by the waiter as given up; load and late resources stay null
+            pass
+        try:
+            timing = self.handler.execute_script(TIMING_SCRIPT)
+        except WebDriverException:
+            timing = None
+        if not timing:
+            return
+        timing = {key: round(value) if isinstance(value, (int, float)) else value for key, value in timing.items()}
+        timing["resources"] = {kind: [count, size, round(longest)] for kind, (count, size, longest)
+                               in timing["resources"].items()} # initiator type -> [count, bytes, longest ms]
+        timing["slowest"] = [[name, round(duration)] for name, duration in timing["slowest"]]
+        self.timing[label] = timing
+        shown = {key: "-" if timing[key] is None else f"{timing[key]}ms" for key in ("ttfb", "dom_content_loaded", "load")}
+        self.log(f"Info {self.browse} {label} timing: TTFB {shown['ttfb']}, DOMContentLoaded "
+                 f"{shown['dom_content_loaded']}, load {shown['load']}, "
+                 f"{sum(count for count, size, longest in timing['resources'].values())} resources")
+
+
+    def watch_suggestions(self, xpath):
+        """Before typing: start timing from the first keystroke until xpath (the suggestion list) fills in.
+        False if this browser can't be watched (no XPath in its DOM)"""
         try:
-            if self.running_platform=="Darwin": # If it's a mac, then use the old API code regardless of Selenium version
-                handler = webdriver.Firefox(options=options,executable_path= self.handler_path +'geckodriver')  
-            elif self.running_platform == "Windows" and self.selenium_ver == "4": # If it's Windows, then check selenium version
-                service = Service(Path(self.handler_path +'geckodriver.exe')) # Specify the custom path (new for Selenium 4)                
-                handler = webdriver.Firefox(options=options, service=service)               
-            elif self.running_platform == "Windows":     
-                handler = webdriver.Firefox(options=options,executable_path=Path(self.handler_path +'geckodriver.exe')  )
-            else: # In case it's Unix
-                handler = webdriver.Firefox(options=options,executable_path=Path(self.handler_path +'geckodriver')  )      
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} browser handler found")             
-        except (WebDriverException):
-            logging.info(f"{datetime.now(tz=None)} Warning {self.browse} browser handler not found or failed to launch.")    
-            handler = None    
-        return handler            
-                
-
-    def SetUpEdge(self):
-        """Product name: Microsoft WebDriver Product version 83.0.478.58 
-        * Edge gets wordy when it's headless, but at least it's working (by setting window size)
-        * At the time of this refactor for Selenium 4, Edge does not yet support the new API, so I'm using the legacy one"""  
-        options = EdgeOptions()
-        options.use_chromium = True          
-        #EdgeOptions.AddArguments("headless")  # this version of selenium doesn't have addarguments for edge
-        options.headless = True # I got this to work by setting the handler window size  
-          
-        try:        
-            handler = Edge(executable_path=Path(self.handler_path +'msedgedriver.exe'), options = options)   
-            handler.set_window_size(1600, 1200)  # set the browser handler window size so that headless will work with sendkeys   
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} browser handler found")     
-        except (WebDriverException):
-            logging.info(f"{datetime.now(tz=None)} Warning {self.browse} browser handler not found or failed to launch.")    
-            handler = None                       
-        return handler # ignore the handshake errors  
-
-
-    def SetUpSafari(self): # this Selenium (3) legacy API code works with both selenium 3 and selenium 4
+            return bool(self.handler.execute_script(SUGGESTION_WATCH_SCRIPT, xpath))
+        except WebDriverException:
+            return False
+
+
+    def suggestions_shown(self, timeout=3):
+        """After typing: wait for the watched suggestion list. Returns the ms from the first keystroke, or None"""
         try:
-            handler = webdriver.Safari (executable_path=self.handler_path +'safaridriver')
-            handler.maximize_window() # necessary for sendkeys to work           
-            logging.info
-            (f"{datetime.now(tz=None)} Info {self.browse} browser handler found")
-        except:
-            logging.info(f"{datetime.now(tz=None)} Warning {self.browse} browser handler not found or failed to launch.")    
-            handler = None      
-        return handler 
-
-
-    def SetUpIE(self):
-        """Product name: Selenium WebDriver Product version: 2.42.0.0        
-        IE does not have support for a headless mode
-        IE has some other gotchas, too, which I posted in my blog. 
-        See https://speakingpython.blogspot.com/2020/07/working-with-selenium-webdriver-in.html
-        """    
-        try:  
-            if self.selenium_ver == "4":
-                # for IE, we use the IEDriverServer which might be why it redirects (see log)
-                service = Service(Path(self.handler_path +'IEDriverServer.exe')) # Specify the custom path (new for Selenium 4)  
-                handler = webdriver.Ie(service=service)  
-                logging.info(f"{datetime.now(tz=None)} Info {self.browse} Finished handler setup")                  
+            elapsed, = self.waiter.until(
+                lambda handler: handler.execute_script(
+                    "return window.__suggestionsAt != null ? [window.__suggestionsAt - window.__keystrokeAt] : null;"),
+                "suggestion dropdown", timeout, "suggestions_wait")
+        except TimeoutException:
+            self.log(f"Info {self.browse} no suggestion dropdown within {timeout}s of the first keystroke")
+            return None
+        self.log(f"Info {self.browse} suggestion dropdown {round(elapsed)}ms after the first keystroke")
+        return round(elapsed)
+
+
+    def release_handler(self):
+        """Give the handler back to the pool (or quit it if we're not pooling). Use this instead of handler.quit()"""
+        if self.handler is None:
+            return
+        with self.phase("teardown"):
+            if self.use_pool:
+                handler_pool.checkin(self, self.handler)
             else:
-                handler = webdriver.Ie(executable_path = Path(self.handler_path +'IEDriverServer.exe') )                
-             
-            handler.maximize_window()
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} browser handler found") 
-        except (WebDriverException):
-            logging.info(f"{datetime.now(tz=None)} Warning {self.browse} browser handler not found or failed to launch.")    
-            handler = None      
-        return handler    
+                HandlerPool._quit(self.handler) # a session that has already died can't answer quit()
+        self.handler = None
+
+
+    def reset_state(self, reset=("storage", "cookies", "navigate")):
+        """Wipe what an earlier scenario left in a shared handler before the next one starts on it.
+        Storage is cleared for the page the browser is on, so do it before navigating away"""
+        with self.phase("reset"):
+            if "storage" in reset:
+                try:
+                    self.handler.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+                except WebDriverException:
+                    pass # storage isn't reachable from every page (about:blank, error pages)
+            if "cookies" in reset:
+                self.handler.delete_all_cookies()
+            if "navigate" in reset:
+                self.handler.get(self.initial_url)
+        self.log(f"Info {self.browse} browser state reset ({', '.join(reset)})")
+
+
+    def log(self, message):
+        """Time-stamp a log line, keep it in this browser's report and queue it for the run's log, tagged
+        with the browser's and the current step's ids so the run's log keeps each browser's lines together"""
+        self.report.append(f"{datetime.now(tz=None)} {message}")
+        if self.run_log is not None:
+            step = self.current_step or {}
+            self.run_log.info(self.report[-1], browser=self.browse, browser_id=self.log_id, step_id=step.get("id"))
+        self.emit({"type": "log", "message": self.report[-1]})
+
+
+    def emit(self, event):
+        """Pass a progress event to the on_event callback. A failing listener never breaks the run"""
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(dict(event, browser=self.browse))
+        except Exception:
+            pass
+
+
+    def begin_step(self, name):
+        """Start timing a step. Every begin_step is closed by an end_step"""
+        self.current_step = {"name": name, "id": correlation_id(), "started_at": datetime.now(timezone.utc),
+                             "start": time.monotonic()}
+
+
+    def end_step(self, status="pass", error=""):
+        """Record the step's status, duration, the URL the browser was on, and the error if it failed"""
+        step = self.current_step
+        if step is None:
+            return
+        try:
+            url = self.handler.current_url if self.handler is not None else ""
+        except Exception: # the session may already be gone
+            url = ""
+        self.steps.append({
+            "name": step["name"],
+            "status": status,
+            "started_at": step["started_at"],
+            "duration": time.monotonic() - step["start"],
+            "url": url,
+            "error": error,
+        })
+        self.current_step = None
+        self.emit(dict(self.steps[-1], type="step"))
+
+
+    def url_reached(self, url=None, timeout=None):
+        """Wait for the browser to land on url (default: results_url). False if it never does"""
+        try:
+            self.waiter.url_is(url or self.results_url, timeout=timeout)
+            return True
+        except TimeoutException:
+            return False
+
+
+    def attempt(self, step, *args, **kwargs):
+        """Run a step method, trying it again (after a backoff) while it raises StepFailed.
+        A WebDriverException escaping the step counts as a failure too. Raises StepFailed when out of tries"""
+        for attempt in range(self.step_retries + 1):
+            try:
+                return step(*args, **kwargs)
+            except (StepFailed, WebDriverException) as exc:
+                if not isinstance(exc, StepFailed): # the step didn't get to record its own failure
+                    self.log(f"Fail {self.browse} {exc!r}")
+                    self.end_step("fail", repr(exc))
+                    exc = StepFailed(f"{self.browse} {exc!r}")
+                if attempt == self.step_retries:
+                    raise exc # out of tries: no retry to fail over for
+                if self.remote and not self.fail_over() and self.handler is None:
+                    raise exc # the node dropped and no other node could take over
+                if self.steps and self.steps[-1]["status"] == "fail":
+                    self.steps[-1]["status"] = "retried" # not the final word on this step
+                delay = self.retry_backoff * 2 ** attempt
+                self.log(f"Info {self.browse} retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+    def fail_over(self):
+        """A remote step failed: if that's because the session's node dropped, move to a fresh session on another
+        node and reload the start page so the step can be retried there. False if we stayed where we were"""
+        node = getattr(self.handler, "node", None)
+        if node is None or remote_nodes.check(node):
+            return False # not remote, or the node is fine and the step failed on its own
+        self.log(f"Warning {self.browse} remote node {node.url} dropped, failing over to another node")
+        dead, self.handler = self.handler, None
+        with self.phase("teardown"): # quitting frees the dead session's slot, though the node can't answer
+            if self.use_pool:
+                handler_pool.checkin(self, dead) # it fails the reset, so the pool quits it rather than parking it
+            else:
+                HandlerPool._quit(dead)
+        with self.phase("driver_launch"):
+            self.handler = handler_pool.checkout(self) if self.use_pool else self.launch_handler()
+        if self.handler is None:
+            return False
+        try:
+            with self.phase("page_load"):
+                self.handler.get(self.initial_url)
+        except WebDriverException as exc: # the retry will find out whether the new node is any better
+            self.log(f"Warning {self.browse} start page didn't load after failing over: {exc.msg}")
+        return True
+
+
+    def launch_handler(self):
+        """Start a browser with this page's backend (see backends/): its own, or Remote when a remote node serves it"""
+        name = "Remote" if self.remote else self.browse
+        try:
+            backend = browser_backends.get(name) # imported the first time any page launches it
+        except LookupError as exc:
+            self.log(f"Warning {self.browse} {exc}")
+            return None
+        return backend.launch(self)
+
+
+class PooledHandler():
+    """A launched browser handler plus the bookkeeping the pool needs to decide when to retire it"""
+    def __init__(self, handler):
+        self.handler = handler
+        self.launched = time.monotonic()
+        self.last_used = self.launched
+        self.uses = 0
+
+
+class HandlerPool():
+    """ Process-wide pool of launched browser handlers, keyed by MainInterfacer.pool_key().
+    Launching the driver and browser is the biggest fixed cost of a run, so instead of quitting a handler
+    at tear down we reset it (cookies, storage, blank page) and park it here for the next run.
+    * Idle handlers older than max_idle seconds, or used max_uses times, are quit instead of reused
+    * Every checkout is health-checked; a crashed session is quit and replaced with a fresh launch
+    * A reaper thread, started with the first checkin, evicts stale idle handlers even when no request comes
+    """
+    def __init__(self, max_idle=300, max_uses=20):
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.idle = {}  # pool_key -> list of PooledHandler
+        self.in_use = {}  # id(handler) -> PooledHandler
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def configure(self, max_idle=None, max_uses=None):
+        if max_idle is not None:
+            self.max_idle = max_idle
+        if max_uses is not None:
+            self.max_uses = max_uses
+
+    def checkout(self, interfacer):
+        """Hand out a healthy idle handler for this interfacer's key, or launch a new one"""
+        key = interfacer.pool_key()
+        while True:
+            with self.lock:
+                stale = self._evict_stale()
+                entry = self.idle.get(key, []).pop() if self.idle.get(key) else None
+            for old in stale: # quit in the background, so this checkout isn't held up by them
+                threading.Thread(target=self._quit, args=(old.handler,), daemon=True).start()
+            if entry is None:
+                break
+            if self._healthy(entry.handler):
+                interfacer.log(f"Info {interfacer.browse} Reusing warm browser handler (use {entry.uses + 1})")
+                return self._lend(entry)
+            interfacer.log(f"Warning {interfacer.browse} Pooled browser handler crashed, replacing it")
+            self._quit(entry.handler)
+        handler = interfacer.launch_handler() # Cold launch
+        return None if handler is None else self._lend(PooledHandler(handler))
+
+    def checkin(self, interfacer, handler):
+        """Take a handler back. It's reset and parked unless it has crashed or reached max_uses"""
+        with self.lock:
+            entry = self.in_use.pop(id(handler), None) or PooledHandler(handler)
+        if entry.uses >= self.max_uses or not self._reset(handler):
+            self._quit(handler)
+            return
+        entry.last_used = time.monotonic()
+        with self.lock:
+            stale = self._evict_stale()
+            self.idle.setdefault(interfacer.pool_key(), []).append(entry)
+        for old in stale:
+            self._quit(old.handler)
+        self.start_reaper()
+
+    def start_reaper(self):
+        """Evict stale idle handlers every quarter of max_idle, in the background, until the process exits"""
+        with self.lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(target=self._reap, daemon=True, name="pool-reaper")
+        self.reaper.start()
+
+    def evict_idle(self):
+        """Quit the idle handlers that have been idle longer than max_idle. Returns how many"""
+        with self.lock:
+            stale = self._evict_stale()
+        for entry in stale:
+            self._quit(entry.handler)
+        return len(stale)
+
+    def prewarm(self, interfacer_factory, count=1):
+        """Launch count handlers ahead of time. interfacer_factory() returns a pooled MainInterfacer"""
+        for _ in range(count):
+            interfacer = interfacer_factory()
+            if interfacer.handler is not None:
+                interfacer.release_handler()
+
+    def clear(self):
+        """Quit every idle handler (e.g. at process exit)"""
+        with self.lock:
+            entries = [entry for entries in self.idle.values() for entry in entries]
+            self.idle = {}
+        for entry in entries:
+            self._quit(entry.handler)
+
+    def _lend(self, entry):
+        entry.uses += 1
+        with self.lock:
+            self.in_use[id(entry.handler)] = entry
+        return entry.handler
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1, self.max_idle / 4))
+            self.evict_idle()
+
+    def _evict_stale(self):
+        """Called with the lock held. Drops idle handlers past max_idle and returns them, to be quit outside the lock"""
+        now = time.monotonic()
+        evicted = []
+        for key, entries in self.idle.items():
+            stale = [entry for entry in entries if now - entry.last_used > self.max_idle]
+            if stale:
+                self.idle[key] = [entry for entry in entries if entry not in stale]
+                evicted += stale
+        return evicted
+
+    @staticmethod
+    def _healthy(handler):
+        try:
+            handler.current_url # any round trip to the driver will do
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(handler):
+        """Back to a clean state: no storage, no cookies, blank page. False if the session is gone"""
+        try:
+            try:
+                handler.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except WebDriverException:
+                pass  # storage isn't reachable from every page (about:blank, error pages)
+            handler.delete_all_cookies()
+            handler.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(handler):
+        try:
+            handler.quit()
+        except Exception:
+            pass
+
+
+handler_pool = HandlerPool() # One pool per process, shared by every view and worker thread
+
+
+
+BLOCKABLE = { # resource types a scenario can block, as the URL patterns DevTools blocks them by
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*"],
+    "stylesheet": ["*.css*"],
+}
+PAGE_LOAD_STRATEGIES = ("normal", "eager", "none")
+
+# Bytes transferred and number of requests for the current page, from Navigation and Resource Timing
+PAGE_WEIGHT_SCRIPT = """
+if (!window.performance || !performance.getEntriesByType) return null;
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+var bytes = 0;
+for (var i = 0; i < entries.length; i++) bytes += entries[i].transferSize || 0;
+return {bytes: bytes, requests: entries.length};
+"""
+
+# The site's own timings for the current page: Navigation Timing (Level 2, or the old performance.timing),
+# plus Resource Timing summed per initiator type ([count, bytes, longest]) and the five slowest resources
+TIMING_SCRIPT = """
+var p = window.performance;
+if (!p) return null;
+var nav = p.getEntriesByType ? p.getEntriesByType('navigation')[0] : null;
+var o = nav || p.timing, start = nav ? nav.startTime : p.timing.navigationStart;
+if (!o) return null;
+var timing = {
+    dns: o.domainLookupEnd - o.domainLookupStart,
+    connect: o.connectEnd - o.connectStart,
+    tls: o.secureConnectionStart > 0 ? o.connectEnd - o.secureConnectionStart : 0,
+    ttfb: o.responseStart - start,
+    response: o.responseEnd - o.responseStart,
+    dom_interactive: o.domInteractive - start,
+    dom_content_loaded: o.domContentLoadedEventEnd > 0 ? o.domContentLoadedEventEnd - start : null,
+    load: o.loadEventEnd > 0 ? o.loadEventEnd - start : null,
+    bytes: nav ? nav.transferSize || 0 : 0
+};
+var entries = p.getEntriesByType ? p.getEntriesByType('resource') : [], types = {}, slowest = [];
+for (var i = 0; i < entries.length; i++) {
+    var kind = entries[i].initiatorType || 'other';
+    var total = types[kind] || (types[kind] = [0, 0, 0]);
+    total[0] += 1;
+    total[1] += entries[i].transferSize || 0;
+    total[2] = Math.max(total[2], entries[i].duration);
+    slowest.push([entries[i].name.slice(0, 120), entries[i].duration]);
+}
+slowest.sort(function (a, b) { return b[1] - a[1]; });
+timing.resources = types;
+timing.slowest = slowest.slice(0, 5);
+return timing;
+"""
+
+# Notes the first keydown and the moment the list at xpath (arguments[0]) first has items after it
+SUGGESTION_WATCH_SCRIPT = """
+if (!document.evaluate || !window.MutationObserver) return false;
+var xpath = arguments[0];
+window.__keystrokeAt = null;
+window.__suggestionsAt = null;
+document.addEventListener('keydown', function () {
+    if (window.__keystrokeAt === null) window.__keystrokeAt = performance.now();
+}, true);
+new MutationObserver(function () {
+    if (window.__keystrokeAt === null || window.__suggestionsAt !== null) return;
+    var list = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (list && list.children.length) window.__suggestionsAt = performance.now();
+}).observe(document, {subtree: true, childList: true});
+return true;
+"""
+
+
+def block_patterns(resources):
+    """Every URL pattern the resources config blocks: its resource types' patterns plus block_urls"""
+    patterns = []
+    for resource_type in resources.get("block", ()):
+        patterns += BLOCKABLE[resource_type]
+    return patterns + list(resources.get("block_urls", ()))
+
+
+def unblocked(resources):
+    """resources without its blocking: what a baseline load uses, keeping the page-load strategy it's compared under"""
+    return {key: value for key, value in resources.items() if key == "page_load_strategy"}
+
+
+def unsupported(page, block=(), block_urls=False, page_load_strategy=False):
+    """Log whatever page.resources asks for that a backend can't do (block: the resource types it can block;
+    block_urls, page_load_strategy: whether it can), so a run that loads them anyway says so. Returns the list"""
+    missing = [f"{kind} blocking" for kind in page.resources.get("block", ()) if kind not in block]
+    if page.resources.get("block_urls") and not block_urls:
+        missing.append("block_urls")
+    strategy = page.resources.get("page_load_strategy", "normal")
+    if strategy != "normal" and not page_load_strategy:
+        missing.append(f"the {strategy} page-load strategy")
+    if missing:
+        page.log(f"Warning {page.browse} can't do {', '.join(missing)}; this run loads the page without them")
+    return missing
+
+
+class LoadBaselines():
+    """ Weight and load time of unblocked page loads, per (browser, initial_url, page-load strategy), so a blocked
+    load can report what blocking saved against a load that differs only in what it blocked. The first run of a
+    blocking scenario on each browser loads unblocked to measure the baseline, and after that a sample of runs
+    (SELENIUM_RESOURCE_BASELINE_SAMPLE) does, to keep it current."""
+    def __init__(self, sample=0.05, pending_for=600):
+        self.sample = sample
+        self.pending_for = pending_for # seconds before a baseline run that never reported is given up on
+        self.entries = {} # key -> (bytes, seconds), a moving average
+        self.pending = {} # key -> when a baseline run was handed out
+        self.lock = threading.Lock()
+
+    def wanted(self, key):
+        """Should this run load unblocked to measure the baseline?"""
+        with self.lock:
+            if key not in self.entries and time.monotonic() - self.pending.get(key, -self.pending_for) >= self.pending_for:
+                self.pending[key] = time.monotonic()
+                return True
+        return random.random() < self.sample
+
+    def update(self, key, page_bytes, seconds):
+        with self.lock:
+            self.pending.pop(key, None)
+            previous = self.entries.get(key)
+            self.entries[key] = (page_bytes, seconds) if previous is None else (
+                0.8 * previous[0] + 0.2 * page_bytes, 0.8 * previous[1] + 0.2 * seconds)
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def forget(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+
+load_baselines = LoadBaselines()
+
+
+DRIVER_FILES = { # the driver each built-in browser backend launches, per platform
+    "Chrome": {"Windows": "chromedriver.exe", "default": "chromedriver"},
+    "Firefox": {"Windows": "geckodriver.exe", "default": "geckodriver"},
+    "Edge": {"default": "msedgedriver.exe"},
+    "IE": {"default": "IEDriverServer.exe"},
+    "Safari": {"default": "safaridriver"},
+}
+
+
+class BrowserCapabilities():
+    """ Which browsers can actually be launched here, and their browser and driver versions.
+    probe() fills it in once (at startup, and again on refresh); after that a run skips any browser
+    known to be unavailable instead of waiting for its launch to fail. A browser nobody has probed
+    is learned from its first real launch. Failures are forgotten after retry_after seconds so a
+    newly installed driver gets picked up without a restart."""
+    def __init__(self, retry_after=3600):
+        self.retry_after = retry_after
+        self.entries = {} # capability_key -> dict(browser, available, reason, versions, probed_at)
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """The entry for key, or None if we don't know (never probed, or a failure that's gone stale)"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and not entry["available"] and time.time() - entry["checked"] > self.retry_after:
+            return None
+        return entry
+
+    def learn(self, interfacer, reason=None):
+        """Record the outcome of interfacer's launch"""
+        entry = self._entry(interfacer, reason)
+        with self.lock:
+            self.entries[interfacer.capability_key()] = entry
+        return entry
+
+    def probe(self, config, browsers):
+        """Check each browser: is its driver where we'll look for it, and does it launch?
+        config is a MainInterfacer config; the URLs and keyword in it aren't used"""
+        found = self._probe(config, browsers)
+        with self.lock:
+            self.entries.update(found)
+
+    def refresh(self, config, browsers):
+        """Probe again and then replace everything we knew with the outcome in one go, so runs that start
+        while the (slow) probe goes on still see the old entries instead of an empty registry"""
+        found = self._probe(config, browsers)
+        with self.lock:
+            self.entries = found
+
+    def _probe(self, config, browsers):
+        """{capability_key: entry} of each browser's launch, without touching self.entries"""
+        found = {}
+        for browse in browsers:
+            missing = None if remote_nodes.serves(browse) else driver_missing(browse, config["running_platform"],
+                                                                                config["handler_path"])
+            interfacer = MainInterfacer(dict(config, probe=True, use_pool=False), browse, launch=not missing)
+            found[interfacer.capability_key()] = self._entry(interfacer, f"driver not found at {missing}" if missing else None)
+            interfacer.release_handler()
+        return found
+
+    def _entry(self, interfacer, reason):
+        entry = {"browser": interfacer.browse, "available": interfacer.handler is not None,
+                 "reason": "" if interfacer.handler is not None else
+                           reason or "browser handler not found or failed to launch",
+                 "browser_version": "", "driver_version": "",
+                 "probed_at": datetime.now(timezone.utc).isoformat(), "checked": time.time()}
+        if interfacer.handler is not None:
+            entry.update(self._versions(interfacer.handler))
+        return entry
+
+    def as_list(self):
+        with self.lock:
+            return [dict(entry, key=list(key)) for key, entry in self.entries.items()]
+
+    @staticmethod
+    def _versions(handler):
+        capabilities = getattr(handler, "capabilities", None) or {}
+        driver = (capabilities.get("moz:geckodriverVersion")
+                  or (capabilities.get("chrome") or {}).get("chromedriverVersion")
+                  or (capabilities.get("msedge") or {}).get("msedgedriverVersion") or "")
+        return {"browser_version": capabilities.get("browserVersion") or capabilities.get("version") or "",
+                "driver_version": driver.split(" ")[0]}
+
+
+def driver_missing(browse, running_platform, handler_path):
+    """The driver file's path if it isn't where backends/<browse> will look for it, else None.
+    Backends from elsewhere find their own drivers, so they're never reported missing here"""
+    files = DRIVER_FILES.get(browse)
+    if files is None:
+        return None
+    path = Path(handler_path + files.get(running_platform, files["default"]))
+    return None if path.exists() else str(path)
+
+
+browser_capabilities = BrowserCapabilities() # One registry per process
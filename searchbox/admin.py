@@ -1,3 +1,40 @@
 from django.contrib import admin
 
+from searchbox.models import Run, BrowserSession, StepResult, QueuedJob, Worker
+
 # Register your models here.
+
+
+class BrowserSessionInline(admin.TabularInline):
+    model = BrowserSession
+    extra = 0
+
+
+class StepResultInline(admin.TabularInline):
+    model = StepResult
+    extra = 0
+
+
+@admin.register(Run)
+class RunAdmin(admin.ModelAdmin):
+    list_display = ("scenario", "started_at", "status", "duration")
+    list_filter = ("scenario", "status")
+    inlines = [BrowserSessionInline]
+
+
+@admin.register(BrowserSession)
+class BrowserSessionAdmin(admin.ModelAdmin):
+    list_display = ("scenario", "browser", "started_at", "status", "duration")
+    list_filter = ("scenario", "browser", "status")
+    inlines = [StepResultInline]
+
+
+@admin.register(QueuedJob)
+class QueuedJobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "scenario", "status", "created_at", "worker", "attempts")
+    list_filter = ("kind", "scenario", "status", "worker")
+
+
+@admin.register(Worker)
+class WorkerAdmin(admin.ModelAdmin):
+    list_display = ("name", "host", "running_platform", "heartbeat_at")
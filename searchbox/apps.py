@@ -1,5 +1,88 @@
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from importlib import import_module
+
 from django.apps import AppConfig
+from django.conf import settings
+
+# Big imports that only running a browser (or an HTTP check) needs; serving pages shouldn't have to load them
+HEAVY_MODULES = ("selenium.webdriver", "requests", "urllib3", "msedge")
+startup = {}  # what the app's startup cost, for /capabilities (see SearchboxConfig.ready)
 
 
 class SearchboxConfig(AppConfig):
+    default_auto_field = 'django.db.models.AutoField'  # what the existing migrations already created
     name = 'searchbox'
+
+    def ready(self):
+        started = time.perf_counter()
+        from searchbox.runlog import log_pipeline, stop_pipeline
+        log_pipeline()  # every log line from here on is queued for the writer thread (see searchbox.runlog)
+        atexit.register(stop_pipeline)  # registered first so it runs last: whatever else logs at exit still gets written
+        from backends import browser_backends
+        from backends.remote import remote_nodes
+        from maininterfacer import handler_pool, browser_capabilities, load_baselines
+        for name, target in getattr(settings, "SELENIUM_BROWSER_BACKENDS", {}).items():
+            browser_backends.register(name, target, source="settings")  # imported when first launched, like ours
+        from searchbox.scenarios import compile_all
+        compile_all()  # validate every scenario now, so a bad definition fails at startup and not mid-request
+        handler_pool.configure(max_idle=getattr(settings, "SELENIUM_POOL_MAX_IDLE", None),
+                               max_uses=getattr(settings, "SELENIUM_POOL_MAX_USES", None))
+        browser_capabilities.retry_after = getattr(settings, "SELENIUM_PROBE_RETRY_AFTER", 3600)
+        load_baselines.sample = getattr(settings, "SELENIUM_RESOURCE_BASELINE_SAMPLE", 0.05)
+        remote_nodes.configure(nodes=getattr(settings, "SELENIUM_REMOTE_NODES", []),
+                               retry_after=getattr(settings, "SELENIUM_REMOTE_RETRY_AFTER", None),
+                               slot_wait=getattr(settings, "SELENIUM_REMOTE_SLOT_WAIT", None))
+        atexit.register(handler_pool.clear)  # don't leave pooled browsers running after the process exits
+        startup["ready_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if serving():
+            self.measure_urls()
+            # launch in the background so startup isn't held up by the browsers
+            threading.Thread(target=self.warm_up, daemon=True).start()
+            if getattr(settings, "SELENIUM_SCHEDULE_IN_PROCESS", False) and getattr(settings, "SELENIUM_SCHEDULE", []):
+                self.schedule()
+
+    @staticmethod
+    def schedule():
+        """Run the schedule in this process, unless another one (a sibling worker, or `run_scheduler`) already does"""
+        from searchbox.scheduler import claim_schedule, scheduler_from_settings
+        if not claim_schedule():
+            logging.info(f"{datetime.now(tz=None)} Info startup: another process runs the schedule, not starting it here")
+            return
+        scheduler_from_settings().start()
+
+    @staticmethod
+    def measure_urls():
+        """Import the URLconf (every view and what they import) now, timed, instead of on the first request,
+        and note which of the heavy modules that pulled in. Nothing in HEAVY_MODULES should be among them"""
+        started = time.perf_counter()
+        import_module(settings.ROOT_URLCONF)
+        startup["urls_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        startup["heavy_modules_loaded"] = [name for name in HEAVY_MODULES if name in sys.modules]
+        logging.info(f"{datetime.now(tz=None)} Info startup: app ready in {startup['ready_ms']}ms, URLs imported in "
+                     f"{startup['urls_ms']}ms, heavy modules loaded: {', '.join(startup['heavy_modules_loaded']) or 'none'}")
+
+    @staticmethod
+    def warm_up():
+        """Find out which browsers launch, then pre-launch the pooled ones"""
+        from searchbox.runner import prewarm_pool, probe_browsers
+        if getattr(settings, "SELENIUM_PROBE_AT_STARTUP", True):
+            probe_browsers()
+        prewarm = getattr(settings, "SELENIUM_POOL_PREWARM", [])
+        if prewarm:
+            prewarm_pool(prewarm)
+
+
+def serving():
+    """False for manage.py commands other than runserver (migrate, shell...), which shouldn't launch browsers.
+    runserver's autoreloader sets Django up in a parent process that only watches the files while a child
+    (RUN_MAIN=true) serves, so only the child counts, unless there's no reloader (--noreload)"""
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if not sys.argv[0].endswith("manage.py"):
+        return True
+    return command == "runserver" and (os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv)
@@ -0,0 +1,99 @@
+"""Live progress of runs, pushed to browsers as Server-Sent Events.
+
+Runs happen on worker threads and publish every log line and step result to a channel named after
+the scenario. Viewers connect to /events/<scenario> on the ASGI entry point (SeleniumTests/asgi.py);
+each viewer is an asyncio task with its own bounded queue, so a thousand viewers cost a thousand
+small queues on one event loop rather than a thousand threads. Runs must execute in the same process
+as the ASGI server for their events to reach it.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+QUEUE_SIZE = 500  # events a slow viewer may fall behind before the oldest are dropped
+REPLAY_SIZE = 200  # events of the current run replayed to a viewer who connects mid-run
+KEEPALIVE = 15  # seconds of silence before we send a comment to keep proxies from closing the stream
+
+
+class EventBus():
+    """Thread-safe publish, asyncio subscribe"""
+    def __init__(self):
+        self.subscribers = {}  # channel -> set of (loop, queue)
+        self.replay = {}  # channel -> deque of recent events
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event):
+        """Called from any thread. Never blocks: a viewer whose queue is full loses its oldest event"""
+        event = dict(event, channel=channel, time=time.time())
+        with self.lock:
+            if event.get("type") == "run_started":
+                self.replay[channel] = deque(maxlen=REPLAY_SIZE)
+            self.replay.setdefault(channel, deque(maxlen=REPLAY_SIZE)).append(event)
+            subscribers = list(self.subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_dropping_oldest, queue, event)
+            except RuntimeError:  # that viewer's loop has closed
+                pass
+
+    def subscribe(self, channel):
+        """Register a queue on the running loop, pre-filled with the current run's events so far.
+        Call from a coroutine"""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self.lock:
+            for event in self.replay.get(channel, ()):
+                _put_dropping_oldest(queue, event)
+            self.subscribers.setdefault(channel, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self.lock:
+            self.subscribers[channel] = {(loop, q) for loop, q in self.subscribers.get(channel, ()) if q is not queue}
+
+
+def _put_dropping_oldest(queue, event):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+event_bus = EventBus()
+
+
+def publisher(channel):
+    """The on_event callback a MainInterfacer config takes: publishes each event to channel"""
+    return lambda event: event_bus.publish(channel, event)
+
+
+async def sse_application(scope, receive, send):
+    """ASGI app for /events/<channel>: streams that channel as text/event-stream until the viewer leaves"""
+    channel = scope["path"].rstrip("/").rsplit("/", 1)[-1]
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+    queue = event_bus.subscribe(channel)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while not disconnected.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                event = getter.result()
+                body = f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+            else:
+                getter.cancel()
+                body = ": keepalive\n\n"
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": body.encode(), "more_body": True})
+    finally:
+        event_bus.unsubscribe(channel, queue)
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
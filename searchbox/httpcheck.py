@@ -0,0 +1,129 @@
+"""HTTP-only fast path for the search checks.
+
+Launching browsers every few minutes just to learn that the search form still works is expensive.
+http_check() does the same check over plain HTTP with a pooled requests.Session: it finds the
+#search-6 form on the landing page, submits the keyword the way the browser would, checks the
+results URL and page markers, and hits the suggestion endpoint directly. The views only escalate
+to a full browser run when this fails, or for a sampled fraction of passing checks.
+"""
+import threading
+import time
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlencode, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """One keep-alive connection pool per process, shared by every check"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+class SearchFormParser(HTMLParser):
+    """Finds the first form inside the element with id=widget_id, and its text input's name"""
+    def __init__(self, widget_id="search-6"):
+        super().__init__()
+        self.widget_id = widget_id
+        self.depth = 0  # how deep we are inside the widget; 0 means outside
+        self.in_form = False
+        self.action = None
+        self.method = "get"
+        self.input_name = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.depth:
+            if tag not in VOID_TAGS:  # void elements never close
+                self.depth += 1
+        elif attrs.get("id") == self.widget_id:
+            self.depth = 1
+            return
+        if not self.depth or self.input_name:
+            return
+        if tag == "form" and self.action is None:
+            self.in_form = True
+            self.action = attrs.get("action") or ""
+            self.method = (attrs.get("method") or "get").lower()
+        elif tag == "input" and self.in_form and attrs.get("type", "text") in ("text", "search"):
+            self.input_name = attrs.get("name")
+
+    def handle_endtag(self, tag):
+        if self.depth and tag not in VOID_TAGS:
+            self.depth -= 1
+            if tag == "form":
+                self.in_form = False
+
+
+class CheckResult():
+    def __init__(self):
+        self.passed = True
+        self.report = []  # log lines, in the same format as the browser runs
+        self.phases = []  # (phase, seconds), folded into /metrics under browser "http"
+
+    def log(self, message):
+        self.report.append(f"{datetime.now(tz=None)} {message}")
+
+    def fail(self, message):
+        self.passed = False
+        self.log(f"Fail HTTP {message}")
+
+
+def http_check(initial_url, results_url, keyword, suggest_url=None, markers=('id="search-6"',), timeout=10):
+    """Check the search widget over HTTP. suggest_url may contain {keyword}; leave it out to skip that step"""
+    result = CheckResult()
+    session = http_session()
+
+    def timed_get(phase, url, **kwargs):
+        start = time.monotonic()
+        try:
+            return session.get(url, timeout=timeout, **kwargs)
+        finally:
+            result.phases.append((phase, time.monotonic() - start))
+
+    try:
+        result.log(f"Info HTTP Looking for URL {initial_url}")
+        landing = timed_get("http_landing", initial_url)
+        if landing.status_code != 200:
+            result.fail(f"URL {initial_url} returned {landing.status_code}")
+            return result
+        form = SearchFormParser()
+        form.feed(landing.text)
+        if form.action is None or not form.input_name or form.method != "get":
+            result.fail("search form not found on the landing page")
+            return result
+        result.log(f"Info HTTP search form found (action {form.action or initial_url}, input {form.input_name})")
+
+        action = urljoin(landing.url, form.action)
+        results = timed_get("http_submit", action + ("&" if "?" in action else "?") + urlencode({form.input_name: keyword}))
+        if results.url != results_url:
+            result.fail(f"with {results.url} not equal to the expected url: {results_url}")
+        elif results.status_code != 200 or not all(marker in results.text for marker in markers):
+            result.fail(f"results page {results.url} returned {results.status_code} or is missing its markers")
+        else:
+            result.log(f"Info HTTP results URL {results.url} found")
+
+        if suggest_url:
+            suggestions = timed_get("http_suggest", suggest_url.format(keyword=quote(keyword)))
+            if suggestions.status_code != 200 or not suggestions.content.strip():
+                result.fail(f"suggestions {suggestions.url} returned {suggestions.status_code} or nothing")
+            else:
+                result.log("Info HTTP suggestions found")
+    except requests.RequestException as exc:
+        result.fail(f"request failed: {exc}")
+    if result.passed:
+        result.log("HTTP Pass")
+    return result
@@ -0,0 +1,180 @@
+"""In-process background job queue for Selenium runs.
+
+A full run takes tens of seconds, far too long to hold a WSGI worker for. submit() queues the run
+on a small, bounded pool of worker threads and returns a Job straight away; the caller polls
+the job's status and fetches the result once it's done.
+
+Identical runs are single-flight: while a scenario is queued or running, every further submit
+attaches to that same job, and once it's done its result is served from cache for result_ttl
+seconds (or until invalidate()). However many viewers refresh, one scenario launches one set of browsers.
+
+submit_job() is the one way in for the views and the scheduler alike: it picks this queue or the
+database one (searchbox.workqueue) by SELENIUM_JOB_BACKEND.
+"""
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job():
+    """One submitted run of a named scenario"""
+    _counter = itertools.count(1)
+
+    def __init__(self, scenario):
+        self.id = uuid.uuid4().hex
+        self.number = next(self._counter)  # order of submission, handy in logs
+        self.scenario = scenario
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.attached = 1  # how many submits share this job (single-flight)
+        self.finished_event = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job is done or failed"""
+        return self.finished_event.wait(timeout)
+
+    def as_dict(self):
+        return {
+            "job_id": self.id,
+            "scenario": self.scenario,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "attached": self.attached,
+        }
+
+
+class JobQueue():
+    """ Runs submitted jobs on at most max_workers threads, so a burst of requests can't launch an
+    unbounded number of browsers. The most recent keep_finished jobs are remembered for polling."""
+    def __init__(self, max_workers=2, keep_finished=100, result_ttl=60):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.keep_finished = keep_finished
+        self.result_ttl = result_ttl
+        self.jobs = OrderedDict()
+        self.in_flight = {}  # key -> the queued or running job for that key
+        self.cache = {}  # key -> the last job for that key that finished successfully
+        self.lock = threading.Lock()
+
+    def submit(self, scenario, func, *args, key=None):
+        """Queue func(*args) under a new job and return the job without waiting for it.
+        If an identical run (same key, by default the scenario name) is in flight, or finished less
+        than result_ttl seconds ago, that job is returned instead and nothing new is started."""
+        key = key or scenario
+        with self.lock:
+            job = self.in_flight.get(key) or self._cached(key)
+            if job is not None:
+                job.attached += 1
+                return job
+            job = Job(scenario)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            self._forget_old()
+        self.executor.submit(self._run, job, key, func, args)
+        return job
+
+    def invalidate(self, key=None):
+        """Forget cached results for key (or for every key), so the next submit starts a fresh run"""
+        with self.lock:
+            if key is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(key, None)
+
+    def invalidate_scenario(self, scenario):
+        """Forget every cached result that covers scenario: its browser and HTTP runs, keyword matrices and batches"""
+        with self.lock:
+            for key in [key for key in self.cache if key_covers(key, scenario)]:
+                del self.cache[key]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _cached(self, key):
+        """Called with the lock held. The cached job for key, if it's still fresh"""
+        job = self.cache.get(key)
+        if job is not None and time.time() - job.finished < self.result_ttl:
+            return job
+        self.cache.pop(key, None)
+        return None
+
+    def _run(self, job, key, func, args):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            job.result = func(*args)
+            job.status = DONE
+        except BaseException:  # whatever goes wrong in a run must not kill the worker thread
+            job.error = traceback.format_exc(limit=5)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            with self.lock:
+                self.in_flight.pop(key, None)
+                if job.status == DONE and self.result_ttl > 0:
+                    self.cache[key] = job
+            job.finished_event.set()
+
+    def _forget_old(self):
+        """Called with the lock held. Drops the oldest finished jobs beyond keep_finished"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+
+def key_covers(key, scenario):
+    """Whether a job key (scenario, scenario:http, scenario:keywords:..., batch:a,b) includes a run of scenario"""
+    name, _, rest = key.partition(":")
+    return name == scenario or (name == "batch" and scenario in rest.split(","))
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def job_queue():
+    """The process-wide queue, created on first use so its size comes from settings"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(max_workers=getattr(settings, "SELENIUM_JOB_WORKERS", 2),
+                                  keep_finished=getattr(settings, "SELENIUM_JOB_KEEP_FINISHED", 100),
+                                  result_ttl=getattr(settings, "SELENIUM_RESULT_TTL", 60))
+        return _job_queue
+
+
+def submit_job(kind, scenario, extra=None, key=None):
+    """Queue a run of kind browser, http, batch (extra: the scenario names) or keywords (extra: the keywords).
+    With SELENIUM_JOB_BACKEND = "db" it goes in the database queue for run_worker processes, else in ours"""
+    from searchbox import workqueue
+    from searchbox.runner import run_scenario, run_fast_path, run_batch, run_keyword_matrix
+    if getattr(settings, "SELENIUM_JOB_BACKEND", "memory") == "db":
+        return workqueue.enqueue(kind, scenario, [] if extra is None else [extra], key=key)
+    if kind == "http":
+        return job_queue().submit(scenario, run_fast_path, scenario, key=key)
+    if kind == "batch":
+        return job_queue().submit(scenario, run_batch, extra, key=key)
+    if kind == "keywords":
+        return job_queue().submit(scenario, run_keyword_matrix, scenario, extra, key=key)
+    return job_queue().submit(scenario, run_scenario, scenario, key=key)
+
+
+def get_job(job_id):
+    """The job from whichever queue holds it: numeric ids are the database queue's"""
+    from searchbox import workqueue
+    return workqueue.get(job_id) or job_queue().get(job_id)
@@ -0,0 +1,182 @@
+"""HTTP load generator for the search endpoint, driven by the same config as the browser runs.
+
+Where a browser run checks that search works, this checks how much search the site can take:
+`users` virtual users each search for the config's keywords (config["keywords"], else its one
+keyword) in a loop, against results_url_pattern (or results_url). They start ramp_up seconds apart
+in total, share an optional global rate limit (requests per second), and stop after `duration`.
+
+Everything runs on one asyncio event loop, requests included: each user holds one keep-alive
+HTTP/1.1 connection on asyncio streams (HttpConnection), so a thousand users are a thousand sockets
+and coroutines, not a thousand threads. The client is deliberately small (GET, Content-Length or
+chunked bodies, no redirects: a 3xx counts as an answer) since there is no async HTTP client among
+our dependencies and a search results page needs nothing more.
+"""
+import asyncio
+import time
+from urllib.parse import quote_plus, urlsplit
+
+from searchbox.metrics import Histogram, percentile
+
+LOAD_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+
+
+class RateLimiter():
+    """Spaces requests out to at most rate per second across every user (no limit if rate is falsy)"""
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LoadReport():
+    """What the virtual users saw"""
+    def __init__(self):
+        self.latencies = []  # seconds, successful requests only
+        self.errors = {}  # "HTTP 503" / exception name -> count
+        self.histogram = Histogram(LOAD_BUCKETS)
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def record(self, seconds, error=None):
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        else:
+            self.latencies.append(seconds)
+            self.histogram.observe(seconds)
+
+    def as_dict(self):
+        total = len(self.latencies) + sum(self.errors.values())
+        return {
+            "requests": total,
+            "seconds": round(self.elapsed, 2),
+            "throughput": round(total / self.elapsed, 2) if self.elapsed else 0.0,  # requests per second
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "errors": self.errors,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+            "p99": percentile(self.latencies, 99),
+            "histogram": [[bound, count] for bound, count in
+                          zip(list(self.histogram.buckets) + ["+Inf"], self.histogram.counts)],
+        }
+
+
+def search_urls(config):
+    """The URL each keyword searches, from the config the browser runs use"""
+    keywords = config.get("keywords") or [config["keyword"]]
+    pattern = config.get("results_url_pattern")
+    if not pattern:
+        return [config["results_url"]]
+    return [pattern.format(keyword=quote_plus(keyword)) for keyword in keywords]
+
+
+class HttpConnection():
+    """One virtual user's keep-alive connection. Reconnects when the server closes it or the URL's origin changes"""
+    def __init__(self):
+        self.origin = None
+        self.reader = self.writer = None
+
+    async def get(self, url):
+        """GET url and read the whole body. Returns the status code"""
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        if self.writer is None or origin != self.origin:
+            await self.close()
+            self.reader, self.writer = await asyncio.open_connection(origin[1], origin[2], ssl=https or None)
+            self.origin = origin
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.writer.write(f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: */*\r\n"
+                          f"User-Agent: searchbox-loadgen\r\n\r\n".encode("latin-1"))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("the server closed the connection")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        # HTTP/1.1 keeps the connection unless told otherwise, HTTP/1.0 only when asked to
+        keep_alive = headers.get("connection") == "keep-alive" or (version == b"HTTP/1.1" and headers.get("connection") != "close")
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while await self.reader.readline() not in (b"\r\n", b"\n", b""):  # trailers
+                        pass
+                    break
+                await self.reader.readexactly(size + 2)  # the chunk and its CRLF
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:  # the body runs to the end of the connection
+            await self.reader.read()
+            keep_alive = False
+        if not keep_alive:
+            await self.close()
+        return int(status)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, asyncio.CancelledError):
+                pass
+        self.reader = self.writer = None
+
+
+async def run_load(config, users=10, duration=30, ramp_up=0, rate=None, timeout=10):
+    """Drive users virtual users against the config's search URLs for duration seconds. Returns a LoadReport"""
+    urls = search_urls(config)
+    report = LoadReport()
+    limiter = RateLimiter(rate)
+    deadline = time.monotonic() + duration
+
+    async def fetch(connection, url):
+        start = time.monotonic()
+        try:
+            status = await asyncio.wait_for(connection.get(url), timeout)
+            error = f"HTTP {status}" if status >= 400 else None
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as exc:
+            await connection.close()  # a half-read response leaves the connection unusable
+            error = type(exc).__name__
+        return time.monotonic() - start, error
+
+    async def virtual_user(number):
+        await asyncio.sleep(ramp_up * number / users)  # users join evenly over the ramp-up
+        position = number  # users start on different keywords
+        connection = HttpConnection()
+        try:
+            while time.monotonic() < deadline:
+                await limiter.acquire()
+                if time.monotonic() >= deadline:
+                    break
+                seconds, error = await fetch(connection, urls[position % len(urls)])
+                report.record(seconds, error)
+                position += 1
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*[virtual_user(number) for number in range(users)])
+    report.elapsed = time.monotonic() - report.started
+    return report
+
+
+def load_test(config, **options):
+    """run_load() for callers outside an event loop (management commands, job workers)"""
+    return asyncio.run(run_load(config, **options))
@@ -0,0 +1,208 @@
+"""Offset-indexed access to the scenario log files.
+
+The logs are only ever appended to, so instead of reading the whole file on every request we note
+the byte offsets where each run starts and ends in a small sidecar index (<log>.idx, one JSON line
+per run). Showing a run then costs one seek and that run's bytes, however long the history gets.
+
+The logs are JSON lines (one record per line, see searchbox.runlog); iter_messages turns a run's
+bytes back into the plain text lines the pages show.
+
+Each entry also remembers the log file's identity (device and inode), so after the log is rotated
+(t5search.log -> t5search.log.1 ...) an old run is still found in whichever file now holds it.
+"""
+import codecs
+import json
+import os
+import threading
+from pathlib import Path
+
+CHUNK_SIZE = 64 * 1024
+MAX_ROTATIONS = 10  # how many rotated files (log.1 ... log.N) to look through for an old run
+
+_index_lock = threading.Lock()
+_indexes = {}  # scenario name -> its LogIndex, made on first use
+
+
+class LogIndex():
+    """The run boundaries of one log file"""
+    def __init__(self, log_path):
+        self.log_path = Path(log_path)
+        self.index_path = Path(str(log_path) + ".idx")
+
+    def add(self, run_key, start, end, file_id):
+        """Record that run_key's output is bytes start..end of the log file with identity file_id (the log
+        writer calls this once the run's block is on disk)"""
+        entry = {"run": run_key, "start": start, "end": end, "file": file_id}
+        with _index_lock, open(self.index_path, "a") as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+        return run_key
+
+    def find(self, run_key):
+        """The index entry for run_key, or None. Recent runs are the ones asked for, so the index is read
+        backwards from its end, a block at a time, and only the matching line is parsed"""
+        wanted = f'"run": "{run_key}"'.encode("utf-8")
+        for line in self._lines_from_end():
+            if wanted in line:
+                entry = json.loads(line)
+                if entry["run"] == run_key:
+                    return entry
+        return None
+
+    def last(self):
+        """The most recent run's entry, read from the end of the index without scanning it all"""
+        for line in self._lines_from_end():
+            return json.loads(line)
+        return None
+
+    def prune(self):
+        """Drop the entries of runs whose log file has been rotated out of existence, so the index only
+        ever covers the files still on disk. The log writer calls this after rotating the log. The fresh
+        log can get the inode of the file rotated out, so an entry reaching past its file's end goes too"""
+        with _index_lock:
+            if not self.index_path.exists():
+                return 0
+            kept, dropped = [], 0
+            sizes = self._file_sizes()
+            with open(self.index_path, "rb") as index_file:
+                for line in index_file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry["end"] <= sizes.get(tuple(entry["file"]), -1):
+                        kept.append(line)
+                    else:
+                        dropped += 1
+            if dropped:
+                partial = Path(f"{self.index_path}.tmp")
+                with open(partial, "wb") as index_file:
+                    index_file.writelines(kept)
+                os.replace(partial, self.index_path)
+            return dropped
+
+    def stream_run(self, entry):
+        """Yield the bytes of one run, a chunk at a time"""
+        path = self._path_for(entry["file"])
+        if path is None or not _holds(path, entry):  # rotated out of existence
+            return
+        yield from _read_range(path, entry["start"], entry["end"])
+
+    def stream_tail(self, nbytes):
+        """Yield the last nbytes of the current log"""
+        if not self.log_path.exists():
+            return
+        size = self.log_path.stat().st_size
+        yield from _read_range(self.log_path, max(0, size - nbytes), size)
+
+    def _lines_from_end(self):
+        """The index's non-blank lines, last first"""
+        try:
+            index_file = open(self.index_path, "rb")
+        except FileNotFoundError:
+            return
+        with index_file:
+            position = index_file.seek(0, os.SEEK_END)
+            partial = b""
+            while position > 0:
+                step = min(CHUNK_SIZE, position)
+                position -= step
+                index_file.seek(position)
+                lines = (index_file.read(step) + partial).split(b"\n")
+                partial = lines.pop(0)  # may be the tail of a line that starts in the block before
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line
+            if partial.strip():
+                yield partial
+
+    def _file_sizes(self):
+        """(device, inode) -> size of the log and each of its rotated files"""
+        sizes = {}
+        for path in self._candidates():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            sizes[(stat.st_dev, stat.st_ino)] = stat.st_size
+        return sizes
+
+    def _candidates(self):
+        yield self.log_path
+        for number in range(1, MAX_ROTATIONS + 1):
+            yield Path(f"{self.log_path}.{number}")
+
+    def _path_for(self, file_id):
+        for path in self._candidates():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if [stat.st_dev, stat.st_ino] == file_id:
+                return path
+        return None
+
+
+def log_index(scenario):
+    """The offset index of the scenario's log (<scenario>.log)"""
+    with _index_lock:
+        if scenario not in _indexes:
+            _indexes[scenario] = LogIndex(f"{scenario}.log")
+        return _indexes[scenario]
+
+
+def _holds(path, entry):
+    """Whether entry's run really starts at its offset in path. A rotated-out file's inode can be reused by a
+    newer log, so a JSON record there must carry the entry's run id (older plain-text logs can't be checked)"""
+    with open(path, "rb") as log_file:
+        log_file.seek(entry["start"])
+        line = log_file.readline(CHUNK_SIZE)
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return True
+    return not isinstance(record, dict) or record.get("run_id", entry["run"]) == entry["run"]
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as log_file:
+        log_file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = log_file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def iter_text(chunks, encoding="utf-8"):
+    """Decode a stream of byte chunks without breaking characters that straddle two chunks"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_messages(chunks):
+    """Plain text of a stream of JSON-lines log chunks: each record's message, one per line.
+    Lines that aren't JSON (logs written before the pipeline) pass through as they are"""
+    pending = ""
+    for text in iter_text(chunks):
+        *lines, pending = (pending + text).split("\n")
+        if lines:
+            yield "".join(_message(line) for line in lines)
+    if pending:
+        yield _message(pending)
+
+
+def _message(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return line + "\n"
+    if not isinstance(record, dict) or "message" not in record:
+        return line + "\n"
+    return record["message"].rstrip("\n") + "\n"
@@ -0,0 +1,125 @@
+"""Benchmark the runner itself against a local replica of the search page (see searchbox/replica.py).
+
+    python manage.py bench_search --scenario t5search --concurrency 1,2,4 --runs 6 --latency 0.2
+
+At each concurrency level it starts that many scenario runs at a time until --runs have finished,
+then reports runs/min, p50/p95 run latency and the peak memory of the browser and driver processes
+per browser session. Memory needs the optional psutil package. Nothing is saved to the run history,
+and the runs are logged to bench_search.log, never to the scenario's own log and its index.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maininterfacer import handler_pool
+from searchbox.metrics import percentile
+from searchbox.replica import ReplicaServer
+from searchbox.runlog import open_run
+from searchbox.runner import run_scenario
+from searchbox.scenarios import get_plan, plan_names
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BENCH_LOG = "bench_search"  # the log (bench_search.log) every benchmark run goes to
+
+
+def bench_run(name, **overrides):
+    """One run of the named scenario, logged to BENCH_LOG instead of <name>.log"""
+    run_log = open_run(BENCH_LOG)
+    try:
+        return run_scenario(name, run_log=run_log, **overrides)
+    finally:
+        run_log.close()
+
+
+class Command(BaseCommand):
+    help = "Benchmark t5search/t6search-style runs against a local replica of the search page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default="t5search", choices=plan_names())
+        parser.add_argument("--concurrency", default="1,2,4", help="comma separated levels, e.g. 1,2,4")
+        parser.add_argument("--runs", type=int, default=4, help="runs per concurrency level")
+        parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replica response")
+        parser.add_argument("--browsers", default="", help="comma separated browser_set (default: the platform's)")
+        parser.add_argument("--cold", action="store_true", help="launch a fresh browser per run (no handler pool)")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency takes a comma separated list of numbers")
+        name = options["scenario"]
+        keyword = get_plan(name).keyword  # the replica suggests and redirects for any keyword
+
+        def run(**overrides):
+            return bench_run(name, **overrides)
+
+        with ReplicaServer(latency=options["latency"]) as replica:
+            overrides = {"initial_url": replica.url, "results_url": f"{replica.url}?s={keyword}",
+                         "keyword": keyword, "record": False, "use_pool": not options["cold"],
+                         "on_event": None}
+            if options["browsers"]:
+                overrides["browser_set"] = options["browsers"].split(",")
+            self.stdout.write(f"Replica at {replica.url} with {options['latency']}s latency")
+            self.stdout.write(f"{'concurrency':>11} {'runs/min':>9} {'p50 s':>7} {'p95 s':>7} {'MB/session':>10}")
+            for level in levels:
+                self.report(level, *self.bench(run, overrides, level, options["runs"]))
+        handler_pool.clear()
+
+    def bench(self, run, overrides, level, runs):
+        """Run the scenario runs times, level at a time. Returns (elapsed, latencies, peak MB per session)"""
+        latencies = []
+        sampler = MemorySampler()
+        sampler.start()
+
+        def timed_run():
+            start = time.monotonic()
+            run(**overrides)
+            latencies.append(time.monotonic() - start)
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            for future in [pool.submit(timed_run) for _ in range(runs)]:
+                future.result()
+        elapsed = time.monotonic() - start
+        sampler.stop()
+        peak = sampler.peak / sampler.sessions / 2 ** 20 if sampler.sessions else None
+        return elapsed, latencies, peak
+
+    def report(self, level, elapsed, latencies, peak):
+        self.stdout.write(f"{level:>11} {len(latencies) / elapsed * 60:>9.1f} {percentile(latencies, 50):>7.2f} "
+                          f"{percentile(latencies, 95):>7.2f} {'n/a' if peak is None else f'{peak:.0f}':>10}")
+
+
+class MemorySampler():
+    """Samples the RSS of every child process (drivers and the browsers they launch) on a thread.
+    Each driver is a direct child of ours and serves one session, so they count the sessions"""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak = 0
+        self.sessions = 0  # drivers alive when the peak was measured
+        self.stopped = threading.Event()
+
+    def start(self):
+        if psutil is not None:
+            threading.Thread(target=self._sample, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _sample(self):
+        me = psutil.Process()
+        while not self.stopped.wait(self.interval):
+            total = 0
+            for child in me.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:  # exited between listing and measuring
+                    pass
+            if total > self.peak:
+                self.peak, self.sessions = total, len(me.children(recursive=False))
@@ -0,0 +1,60 @@
+"""Measure what a cold start of the web app imports, and how long each top-level import takes.
+
+    python manage.py import_cost
+    python manage.py import_cost --top 25 --backend Chrome --backend Firefox
+
+Runs a fresh interpreter with -X importtime that sets Django up and imports the URLconf, the way a
+web worker starts, and prints the slowest top-level imports. --backend also launches nothing but
+imports that browser backend afterwards, to show what a first run adds.
+"""
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from searchbox.apps import HEAVY_MODULES
+
+# argv says manage.py so the app doesn't think it's serving (no probe, no prewarm) while we measure
+STARTUP_SCRIPT = """
+import sys
+sys.argv = ["manage.py", "import_cost"]
+import django
+django.setup()
+from importlib import import_module
+import_module({urlconf!r})
+from backends import browser_backends
+for name in {backends!r}:
+    browser_backends.get(name)
+"""
+
+
+class Command(BaseCommand):
+    help = "Break down the import time of a cold start of the web app"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="how many of the slowest imports to list")
+        parser.add_argument("--backend", action="append", default=[], help="also import this browser backend")
+
+    def handle(self, *args, **options):
+        script = STARTUP_SCRIPT.format(urlconf=settings.ROOT_URLCONF, backends=options["backend"])
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "SeleniumTests.settings"))
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", script], env=env,
+                                   capture_output=True, text=True, cwd=settings.BASE_DIR)
+        if completed.returncode:
+            raise CommandError(f"the measured start failed:\n{completed.stderr[-2000:]}")
+
+        imports = []  # (cumulative microseconds, module) of the imports nothing else triggered
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if not name.startswith("  "):  # nested imports are indented under the one that triggered them
+                imports.append((int(cumulative), name.strip()))
+        total = sum(micros for micros, name in imports)
+        self.stdout.write(f"{len(imports)} top-level imports, {total / 1000:.0f}ms in all")
+        for micros, name in sorted(imports, reverse=True)[:options["top"]]:
+            self.stdout.write(f"{micros / 1000:>9.1f}ms  {name}")
+        loaded = [name for micros, name in imports if name in HEAVY_MODULES or name.split(".")[0] in HEAVY_MODULES]
+        self.stdout.write(f"heavy modules imported: {', '.join(loaded) or 'none'}")
@@ -0,0 +1,55 @@
+"""Time the search widget's suggestions and results for a list of keywords, one browser session each.
+
+    python manage.py keyword_matrix --scenario t5search --keywords-file keywords.txt
+    python manage.py keyword_matrix --keywords "seo,site search,solo_search" --browsers Chrome
+
+Each browser types every keyword into the scenario's search box, and we report p50/p95/p99 time from
+the first keystroke to the suggestion dropdown and from ENTER to the results URL. The run is saved to
+the history like any other (--no-record to skip that).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from searchbox.runner import run_scenario, read_keywords
+from searchbox.scenarios import get_plan, plan_names, run_keyword_page
+
+
+class Command(BaseCommand):
+    help = "Time suggestions and results for a list of keywords, reusing one session per browser"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default="t5search", choices=plan_names())
+        parser.add_argument("--keywords", default="", help="comma separated keywords")
+        parser.add_argument("--keywords-file", default="", help="one keyword per line")
+        parser.add_argument("--browsers", default="", help="comma separated browser_set (default: the platform's)")
+        parser.add_argument("--no-record", action="store_true", help="don't save the run to the history")
+
+    def handle(self, *args, **options):
+        plan = get_plan(options["scenario"])
+        if plan.search_box is None or not plan.results_url_pattern:
+            raise CommandError(f"{plan.name} has no search box step or no results_url_pattern")
+        keywords = [keyword.strip() for keyword in options["keywords"].split(",") if keyword.strip()]
+        if options["keywords_file"]:
+            keywords += read_keywords(options["keywords_file"])
+        if not keywords:
+            raise CommandError("give --keywords or --keywords-file")
+        overrides = {"keywords": keywords, "record": not options["no_record"], "on_event": None}
+        if options["browsers"]:
+            overrides["browser_set"] = options["browsers"].split(",")
+
+        pages = []
+
+        def collect(config, browse):  # run_keyword_page, keeping the pages for the table below
+            page = run_keyword_page(config, browse)
+            pages.append(page)
+            return page
+
+        run_key = run_scenario(plan.name, collect, **overrides)
+        self.stdout.write(f"{len(keywords)} keywords; log at logs/{plan.name}?run={run_key}")
+        self.stdout.write(f"{'browser':>8} {'measure':>20} {'count':>5} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+        for page in pages:
+            summary = page.timing.get("keywords", {}).get("summary", {})
+            if not summary:
+                self.stdout.write(f"{page.browse:>8} {'no measurements':>20}")
+            for name, values in summary.items():
+                self.stdout.write(f"{page.browse:>8} {name:>20} {values['count']:>5} {values['p50']:>7} "
+                                  f"{values['p95']:>7} {values['p99']:>7}")
@@ -0,0 +1,65 @@
+"""Load-test the search endpoint over HTTP with the config a scenario's browser runs use.
+
+    python manage.py load_search --scenario t5search --users 20 --duration 60 --ramp-up 10 --rate 50
+    python manage.py load_search --keywords-file keywords.txt --users 50 --replica
+
+Reports throughput, error rate, p50/p95/p99 latency and a latency histogram. --replica points the
+load at the local replica of the search page (searchbox/replica.py) instead of the real site.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from searchbox.loadgen import load_test
+from searchbox.replica import ReplicaServer
+from searchbox.runner import scenario_config, read_keywords
+from searchbox.scenarios import get_plan, plan_names
+
+
+class Command(BaseCommand):
+    help = "Drive concurrent virtual users against a scenario's search URL and report throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default="t5search", choices=plan_names())
+        parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=30, help="seconds to keep the load on")
+        parser.add_argument("--ramp-up", type=float, default=0, help="seconds over which the users join")
+        parser.add_argument("--rate", type=float, default=0, help="requests per second for all users together (0: no limit)")
+        parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as an error")
+        parser.add_argument("--keywords", default="", help="comma separated keywords (default: the scenario's)")
+        parser.add_argument("--keywords-file", default="", help="one keyword per line")
+        parser.add_argument("--replica", action="store_true", help="load the local replica instead of the site")
+        parser.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["duration"] <= 0:
+            raise CommandError("--users and --duration must be positive")
+        keywords = [keyword.strip() for keyword in options["keywords"].split(",") if keyword.strip()]
+        if options["keywords_file"]:
+            keywords += read_keywords(options["keywords_file"])
+        config = scenario_config(get_plan(options["scenario"]), on_event=None)
+        if keywords:
+            config["keywords"] = keywords
+        run_options = {"users": options["users"], "duration": options["duration"], "ramp_up": options["ramp_up"],
+                       "rate": options["rate"] or None, "timeout": options["timeout"]}
+
+        if options["replica"]:
+            with ReplicaServer() as replica:
+                config.update(initial_url=replica.url, results_url=f"{replica.url}?s={config['keyword']}",
+                              results_url_pattern=replica.url + "?s={keyword}")
+                report = load_test(config, **run_options).as_dict()
+        else:
+            report = load_test(config, **run_options).as_dict()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['requests']} requests in {report['seconds']}s: {report['throughput']} req/s, "
+                          f"{report['error_rate']:.2%} errors {report['errors'] or ''}")
+        if report["p50"] is not None:
+            self.stdout.write(f"latency p50 {report['p50'] * 1000:.0f}ms, p95 {report['p95'] * 1000:.0f}ms, "
+                              f"p99 {report['p99'] * 1000:.0f}ms")
+        peak = max(count for bound, count in report["histogram"]) or 1
+        for bound, count in report["histogram"]:
+            label = f"<= {bound}s" if bound != "+Inf" else f"> {report['histogram'][-2][0]}s"
+            self.stdout.write(f"{label:>10} {count:>7} {'#' * round(40 * count / peak)}")
@@ -0,0 +1,64 @@
+"""Check the remote WebDriver nodes, and try the remote backend out against local standalone drivers.
+
+    python manage.py remote_nodes
+    python manage.py remote_nodes --local Chrome,Firefox --run t5search --runs 3
+
+Without --local it checks settings.SELENIUM_REMOTE_NODES and prints each node's health and slots.
+--local starts a standalone driver per browser (from this platform's driver folder) on a free port
+and uses those as the nodes instead; --run then runs a scenario that many times through them and
+prints how the sessions were spread.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from backends import browser_backends
+from backends.remote import remote_nodes
+from maininterfacer import handler_pool
+from searchbox.runner import start_local_nodes, run_scenario
+from searchbox.scenarios import plan_names
+
+
+class Command(BaseCommand):
+    help = "Check the remote WebDriver nodes, or run a scenario through local standalone drivers as nodes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--local", default="", help="comma separated browsers to start standalone drivers for")
+        parser.add_argument("--slots", type=int, default=None, help="sessions per local node (default: 1 for Firefox, 2 otherwise)")
+        parser.add_argument("--run", default=None, choices=plan_names(), help="scenario to run through the nodes")
+        parser.add_argument("--runs", type=int, default=1)
+
+    def handle(self, *args, **options):
+        services = []
+        local = [browse.strip() for browse in options["local"].split(",") if browse.strip()]
+        unknown = [browse for browse in local if not hasattr(self.backend(browse), "SERVICE")]
+        if unknown:
+            raise CommandError(f"no standalone driver for {', '.join(unknown)} (try Chrome, Firefox or Edge)")
+        try:
+            if local:
+                services, nodes = start_local_nodes(local, options["slots"])
+                remote_nodes.configure(nodes=nodes)
+            if not remote_nodes.nodes:
+                raise CommandError("no remote nodes: set SELENIUM_REMOTE_NODES or pass --local")
+            self.show(remote_nodes.check_all())
+            if options["run"]:
+                for number in range(options["runs"]):
+                    run_key = run_scenario(options["run"], record=False)
+                    self.stdout.write(f"run {number + 1}: {options['run']} log {run_key}")
+                handler_pool.clear()  # quit the pooled sessions so their slots show as free
+                self.show(remote_nodes.as_list())
+        finally:
+            handler_pool.clear()
+            for service in services:
+                service.stop()
+
+    @staticmethod
+    def backend(browse):
+        try:
+            return browser_backends.get(browse)
+        except LookupError:
+            return None
+
+    def show(self, nodes):
+        for node in nodes:
+            state = "up" if node["healthy"] else f"DOWN ({node['last_error']})"
+            self.stdout.write(f"{node['url']} {state}: {node['sessions']}/{node['slots']} slots in use, "
+                              f"{node['launched']} sessions started, browsers {', '.join(node['browsers'] or ['any'])}")
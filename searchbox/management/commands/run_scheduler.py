@@ -0,0 +1,57 @@
+"""Run the checks in settings.SELENIUM_SCHEDULE on their intervals (see searchbox/scheduler.py).
+
+    python manage.py run_scheduler
+    python manage.py run_scheduler --check t5search:300 --check t6search:600:http --for 3600
+
+--check name:every[:mode[:on_overlap]] replaces the settings' schedule. Stop with Ctrl-C; each
+check's runs, skips and schedule lag are printed on the way out. It refuses to start while another
+process on this host (a web process with SELENIUM_SCHEDULE_IN_PROCESS, say) runs the schedule.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maininterfacer import handler_pool
+from searchbox.scheduler import claim_schedule, scheduler_from_settings
+
+
+class Command(BaseCommand):
+    help = "Run scheduled checks with jitter, concurrency limits and overlap protection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="append", default=[],
+                            help="name:every[:mode[:on_overlap]], repeatable (default: SELENIUM_SCHEDULE)")
+        parser.add_argument("--jitter", type=float, default=0.1, help="jitter for --check entries, as a fraction of every")
+        parser.add_argument("--for", dest="duration", type=float, default=None, help="stop after this many seconds")
+
+    def handle(self, *args, **options):
+        entries = None
+        if options["check"]:
+            entries = []
+            for spec in options["check"]:
+                parts = spec.split(":")
+                try:
+                    entry = {"check": parts[0], "every": float(parts[1]), "jitter": float(parts[1]) * options["jitter"]}
+                except (IndexError, ValueError):
+                    raise CommandError(f"--check {spec}: expected name:every[:mode[:on_overlap]]")
+                entry.update(zip(("mode", "on_overlap"), parts[2:4]))
+                entries.append(entry)
+        try:
+            scheduler = scheduler_from_settings(entries)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not scheduler.checks:
+            raise CommandError("nothing to schedule: set SELENIUM_SCHEDULE or pass --check")
+        if not claim_schedule():
+            raise CommandError("another process on this host already runs the schedule (it holds SELENIUM_SCHEDULE_LOCK)")
+
+        self.stdout.write(f"Scheduling {', '.join(f'{check.name} every {check.every:g}s' for check in scheduler.checks)}")
+        try:
+            scheduler.loop(until=None if options["duration"] is None else time.monotonic() + options["duration"])
+        except KeyboardInterrupt:
+            pass
+        scheduler.stop()
+        handler_pool.clear()
+        for status in scheduler.status():
+            lag = "-" if status["lag_p50"] is None else f"{status['lag_p50']:.2f}s p50, {status['lag_max']:.2f}s max"
+            self.stdout.write(f"{status['check']}: {status['runs']} runs, {status['skipped']} skipped, lag {lag}")
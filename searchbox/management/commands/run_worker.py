@@ -0,0 +1,42 @@
+"""Run queued jobs from the shared database queue (SELENIUM_JOB_BACKEND = "db", see searchbox/workqueue.py).
+
+    python manage.py run_worker
+    python manage.py run_worker --name ci-linux-1 --concurrency 2 --browsers Firefox,Chrome
+
+Start one per runner host, all pointed at the same database. Without --browsers the worker probes
+this platform's browsers and advertises the ones that launch. Stop with Ctrl-C; a job it was
+running when killed is requeued once its lease runs out.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maininterfacer import handler_pool
+from searchbox.workqueue import QueueWorker
+
+
+class Command(BaseCommand):
+    help = "Claim and run jobs from the shared database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", default=None, help="worker name (default: host:pid)")
+        parser.add_argument("--concurrency", type=int, default=1, help="jobs to run at the same time")
+        parser.add_argument("--browsers", default=None, help="comma separated browsers to advertise (default: probe)")
+        parser.add_argument("--poll", type=float, default=2.0, help="seconds between looks at an empty queue")
+        parser.add_argument("--for", dest="duration", type=float, default=None, help="stop after this many seconds")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        browsers = None
+        if options["browsers"] is not None:
+            browsers = [browse.strip() for browse in options["browsers"].split(",") if browse.strip()]
+        worker = QueueWorker(name=options["name"], browsers=browsers, concurrency=options["concurrency"],
+                             poll=options["poll"])
+        self.stdout.write(f"Worker {worker.name} polling the job queue every {worker.poll:g}s")
+        try:
+            worker.run(until=None if options["duration"] is None else time.monotonic() + options["duration"])
+        except KeyboardInterrupt:
+            worker.stop()
+        handler_pool.clear()
+        self.stdout.write(f"Worker {worker.name} stopped")
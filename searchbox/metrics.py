@@ -0,0 +1,105 @@
+"""Per-phase timing histograms, exposed in the Prometheus text format at /metrics.
+
+Each page records how long its phases took (driver launch, the requests.get pre-check, page load,
+element lookups, the verification wait, teardown; see MainInterfacer.phase). After a run the
+views hand the pages to observe_run(), which folds them into histograms labelled by scenario,
+browser and phase. Values are per process and reset when it restarts, as Prometheus expects.
+"""
+import bisect
+import math
+import threading
+
+from searchbox.models import BrowserSession
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)  # seconds
+
+
+class Histogram():
+    """Cumulative-bucket histogram of one label set"""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry():
+    def __init__(self):
+        self.phases = {}  # (scenario, browser, phase) -> Histogram
+        self.runs = {}  # (scenario, browser, status) -> count
+        self.savings = {}  # (scenario, browser) -> [bytes, seconds] resource blocking saved
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Forget everything observed so far"""
+        with self.lock:
+            self.phases, self.runs, self.savings = {}, {}, {}
+
+    def observe(self, scenario, browser, phase, seconds):
+        with self.lock:
+            self.phases.setdefault((scenario, browser, phase), Histogram()).observe(seconds)
+
+    def count_run(self, scenario, browser, status):
+        with self.lock:
+            key = (scenario, browser, status)
+            self.runs[key] = self.runs.get(key, 0) + 1
+
+    def add_savings(self, scenario, browser, saved_bytes, seconds):
+        with self.lock:
+            total = self.savings.setdefault((scenario, browser), [0, 0.0])
+            total[0] += saved_bytes
+            total[1] += seconds
+
+    def render(self):
+        """Everything in the Prometheus text exposition format (version 0.0.4)"""
+        lines = ["# HELP selenium_phase_seconds Time spent in each phase of a browser run.",
+                 "# TYPE selenium_phase_seconds histogram"]
+        with self.lock:
+            for (scenario, browser, phase), histogram in sorted(self.phases.items()):
+                labels = f'scenario="{scenario}",browser="{browser}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'selenium_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"selenium_phase_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"selenium_phase_seconds_count{{{labels}}} {histogram.count}")
+            lines += ["# HELP selenium_browser_runs_total Browser runs by outcome.",
+                      "# TYPE selenium_browser_runs_total counter"]
+            for (scenario, browser, status), count in sorted(self.runs.items()):
+                lines.append(f'selenium_browser_runs_total{{scenario="{scenario}",browser="{browser}",'
+                             f'status="{status}"}} {count}')
+            lines += ["# HELP selenium_blocked_bytes_total Page bytes resource blocking saved, against unblocked loads.",
+                      "# TYPE selenium_blocked_bytes_total counter"]
+            lines += [f'selenium_blocked_bytes_total{{scenario="{scenario}",browser="{browser}"}} {saved_bytes}'
+                      for (scenario, browser), (saved_bytes, seconds) in sorted(self.savings.items())]
+            lines += ["# HELP selenium_block_seconds_saved_total Page load seconds resource blocking saved.",
+                      "# TYPE selenium_block_seconds_saved_total counter"]
+            lines += [f'selenium_block_seconds_saved_total{{scenario="{scenario}",browser="{browser}"}} {seconds}'
+                      for (scenario, browser), (saved_bytes, seconds) in sorted(self.savings.items())]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (p from 0 to 100) of values; None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def observe_run(scenario, pages):
+    """Fold a finished run's phase timings and outcomes into the registry"""
+    for page in pages:
+        for phase, seconds in page.phases:
+            registry.observe(scenario, page.browse, phase, seconds)
+        registry.count_run(scenario, page.browse, BrowserSession.status_of(page))
+        if page.resource_savings:
+            registry.add_savings(scenario, page.browse, page.resource_savings["bytes"], page.resource_savings["seconds"])
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrowserSession',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scenario', models.CharField(max_length=50)),
+                ('browser', models.CharField(max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('duration', models.FloatField(help_text='seconds')),
+                ('status', models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable')], max_length=12)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Run',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scenario', models.CharField(max_length=50)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('duration', models.FloatField(help_text='seconds')),
+                ('status', models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable')], max_length=12)),
+                ('running_platform', models.CharField(blank=True, max_length=20)),
+                ('selenium_ver', models.CharField(blank=True, max_length=10)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StepResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable')], max_length=12)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField(help_text='seconds')),
+                ('url', models.URLField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='searchbox.browsersession')),
+            ],
+            options={
+                'ordering': ['session', 'position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['scenario', 'started_at'], name='searchbox_r_scenari_51216b_idx'),
+        ),
+        migrations.AddField(
+            model_name='browsersession',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='searchbox.run'),
+        ),
+        migrations.AddIndex(
+            model_name='browsersession',
+            index=models.Index(fields=['scenario', 'browser', 'started_at'], name='searchbox_b_scenari_bf4958_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchbox', '0001_run_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='browsersession',
+            name='status',
+            field=models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable'), ('retried', 'Failed, then retried')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='run',
+            name='status',
+            field=models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable'), ('retried', 'Failed, then retried')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='stepresult',
+            name='status',
+            field=models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('unavailable', 'Browser unavailable'), ('retried', 'Failed, then retried')], max_length=12),
+        ),
+    ]
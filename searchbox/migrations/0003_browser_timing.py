@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchbox', '0002_step_retried'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='browsersession',
+            name='timing',
+            field=models.JSONField(blank=True, default=dict, help_text="the site's Navigation/Resource Timing, in ms"),
+        ),
+    ]
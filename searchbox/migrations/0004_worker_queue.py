@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchbox', '0003_browser_timing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='identical runs share a key (single-flight)', max_length=200)),
+                ('kind', models.CharField(max_length=20)),
+                ('scenario', models.CharField(max_length=50)),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('browsers', models.JSONField(blank=True, default=list, help_text='browsers the run needs; empty for any')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Worker',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('host', models.CharField(max_length=100)),
+                ('running_platform', models.CharField(blank=True, max_length=20)),
+                ('browsers', models.JSONField(blank=True, default=list)),
+                ('started_at', models.DateTimeField()),
+                ('heartbeat_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='queuedjob',
+            index=models.Index(fields=['status', 'created_at'], name='searchbox_q_status_4ef2d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedjob',
+            index=models.Index(fields=['status', 'lease_expires'], name='searchbox_q_status_9c6b47_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedjob',
+            index=models.Index(fields=['key', 'status'], name='searchbox_q_key_bfc1c9_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchbox', '0004_worker_queue'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='queuedjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='one_job_in_flight_per_key'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchbox', '0005_one_job_in_flight_per_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,182 @@
-from django.db import models
+import time
+
+from django.db import models, transaction
 
 # Create your models here.
+
+PASS, FAIL, UNAVAILABLE, RETRIED = "pass", "fail", "unavailable", "retried"
+STATUS_CHOICES = [(PASS, "Pass"), (FAIL, "Fail"), (UNAVAILABLE, "Browser unavailable"),
+                  (RETRIED, "Failed, then retried")]
+
+
+class Run(models.Model):
+    """One run of a scenario (t5search, t6search, ...) across a browser_set"""
+    scenario = models.CharField(max_length=50)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    duration = models.FloatField(help_text="seconds")
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES)
+    running_platform = models.CharField(max_length=20, blank=True)
+    selenium_ver = models.CharField(max_length=10, blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [models.Index(fields=["scenario", "started_at"])]
+
+    def __str__(self):
+        return f"{self.scenario} {self.started_at:%Y-%m-%d %H:%M:%S} {self.status}"
+
+    @classmethod
+    def record(cls, scenario, config, pages, started_at, finished_at):
+        """Save a finished run in one transaction: the run, a session per browser, then every step in bulk.
+        pages are the MainInterfacer objects the run used, with started_at/finished_at set by the runner"""
+        sessions = [(page, BrowserSession.status_of(page)) for page in pages]
+        statuses = {status for page, status in sessions}
+        with transaction.atomic():
+            run = cls.objects.create(
+                scenario=scenario, started_at=started_at, finished_at=finished_at,
+                duration=(finished_at - started_at).total_seconds(),
+                status=FAIL if FAIL in statuses else PASS if PASS in statuses else UNAVAILABLE,
+                running_platform=config.get("running_platform", ""), selenium_ver=config.get("selenium_ver", ""))
+            steps = []
+            for page, status in sessions:
+                failed = [step for step in page.steps if step["status"] == FAIL]
+                session = BrowserSession.objects.create(
+                    run=run, scenario=scenario, browser=page.browse, status=status,
+                    started_at=page.started_at, finished_at=page.finished_at,
+                    duration=(page.finished_at - page.started_at).total_seconds(),
+                    error=failed[0]["error"] if failed else "", timing=page.timing)
+                steps += [StepResult(session=session, position=position, name=step["name"], status=step["status"],
+                                     started_at=step["started_at"], duration=step["duration"],
+                                     url=step["url"], error=step["error"])
+                          for position, step in enumerate(page.steps)]
+            StepResult.objects.bulk_create(steps)
+        return run
+
+
+class BrowserSession(models.Model):
+    """One browser's part of a run"""
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name="sessions")
+    scenario = models.CharField(max_length=50)  # copied from the run so history lookups stay on one index
+    browser = models.CharField(max_length=20)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    duration = models.FloatField(help_text="seconds")
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    timing = models.JSONField(default=dict, blank=True, help_text="the site's Navigation/Resource Timing, in ms")
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [models.Index(fields=["scenario", "browser", "started_at"])]
+
+    def __str__(self):
+        return f"{self.scenario} {self.browser} {self.started_at:%Y-%m-%d %H:%M:%S} {self.status}"
+
+    @staticmethod
+    def status_of(page):
+        if not page.launched:
+            return UNAVAILABLE
+        if not page.steps or any(step["status"] == FAIL for step in page.steps):
+            return FAIL
+        return PASS
+
+
+class StepResult(models.Model):
+    """One step (load the page, find the search box, check the results URL...) of a browser session"""
+    session = models.ForeignKey(BrowserSession, on_delete=models.CASCADE, related_name="steps")
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=100)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES)
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text="seconds")
+    url = models.URLField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["session", "position"]
+
+    def __str__(self):
+        return f"{self.name} {self.status}"
+
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"  # as in searchbox.jobs
+JOB_STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+
+class QueuedJob(models.Model):
+    """A run waiting for (or claimed by) a worker process on any host. See searchbox.workqueue"""
+    key = models.CharField(max_length=200, help_text="identical runs share a key (single-flight)")
+    kind = models.CharField(max_length=20)  # browser, http, batch or keywords
+    scenario = models.CharField(max_length=50)
+    args = models.JSONField(default=list, blank=True)
+    browsers = models.JSONField(default=list, blank=True, help_text="browsers the run needs; empty for any")
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default=QUEUED)
+    created_at = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "created_at"]), models.Index(fields=["status", "lease_expires"]),
+                   models.Index(fields=["key", "status"])]
+        # single-flight across hosts comes from enqueue locking the key's JobKey row; where the database has
+        # partial indexes (PostgreSQL, SQLite) this backs it up. MySQL and MariaDB ignore the condition
+        constraints = [models.UniqueConstraint(fields=["key"], condition=models.Q(status__in=[QUEUED, RUNNING]),
+                                               name="one_job_in_flight_per_key")]
+
+    def __str__(self):
+        return f"{self.kind} {self.scenario} {self.status}"
+
+    def as_dict(self):
+        return {
+            "job_id": str(self.id),
+            "scenario": self.scenario,
+            "status": self.status,
+            "submitted": self.created_at.timestamp(),
+            "started": self.started_at.timestamp() if self.started_at else None,
+            "finished": self.finished_at.timestamp() if self.finished_at else None,
+            "error": self.error or None,
+            "worker": self.worker,
+            "attempts": self.attempts,
+        }
+
+    def wait(self, timeout=None, poll=1.0):
+        """Block until a worker has finished the job (polling the table)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.status not in (DONE, FAILED):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(poll)
+            self.refresh_from_db()
+        return True
+
+
+class JobKey(models.Model):
+    """One row per job key, for enqueue to lock (select_for_update) while it looks for the job in flight and queues one.
+    A row lock is what every database supports, where a conditional unique constraint isn't"""
+    key = models.CharField(max_length=200, unique=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Worker(models.Model):
+    """A `manage.py run_worker` process and the browsers it can run"""
+    name = models.CharField(max_length=100, unique=True)
+    host = models.CharField(max_length=100)
+    running_platform = models.CharField(max_length=20, blank=True)
+    browsers = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField()
+    heartbeat_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} ({', '.join(self.browsers)})"
@@ -0,0 +1,94 @@
+"""A local stand-in for the solosegment.com search widget, for benchmarking the runner offline.
+
+It serves just enough of the real page for the t5search/t6search steps to find what they look for:
+  /              the #search-6 form: form/label/input (search box), form/input (search icon),
+                 form/div/ul (suggestion dropdown, filled in as you type)
+  /search?s=kw   the form's target; redirects to /?s=kw like the real site's results URL
+  /suggest?q=kw  the suggestions the dropdown shows, as JSON
+Every response can be delayed by `latency` seconds to mimic a slow site.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+from django.utils.html import escape
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="UTF-8"><title>Search replica</title></head>
+<body>
+<aside id="search-6" class="widget widget_search">
+  <form role="search" method="get" action="/search">
+    <label><input type="search" name="s" value="{query}" autocomplete="off"></label>
+    <input type="submit" value="Search">
+    <div class="suggestions"><ul>{suggestions}</ul></div>
+  </form>
+</aside>
+<main>{results}</main>
+<script>
+  var box = document.querySelector('#search-6 input[name=s]');
+  box.addEventListener('input', function () {{
+    fetch('/suggest?q=' + encodeURIComponent(box.value)).then(function (r) {{ return r.json(); }}).then(function (words) {{
+      document.querySelector('#search-6 ul').innerHTML = words.map(function (w) {{ return '<li>' + w + '</li>'; }}).join('');
+    }});
+  }});
+</script>
+</body>
+</html>
+"""
+
+WORDS = ["solo", "solosegment", "search", "segment", "site search", "solo_search", "support", "services"]
+
+
+def suggestions_for(query):
+    return [word for word in WORDS if word.startswith(query.lower())][:5] if query else []
+
+
+class ReplicaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/search":
+            self.send_response(302)
+            self.send_header("Location", "/?s=" + quote(params.get("s", [""])[0]))
+            self.end_headers()
+        elif url.path == "/suggest":
+            self._send(json.dumps(suggestions_for(params.get("q", [""])[0])), "application/json")
+        elif url.path == "/":
+            query = params.get("s", [""])[0]
+            items = "".join(f"<li>{escape(word)}</li>" for word in suggestions_for(query))
+            results = f"<h1>Results for {escape(query)}</h1>" if "s" in params else ""
+            self._send(PAGE.format(query=escape(query), suggestions=items, results=results), "text/html")
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # keep the benchmark output readable
+        pass
+
+
+class ReplicaServer():
+    """Runs the replica on a background thread. Use as a context manager; url is the initial_url"""
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), ReplicaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,274 @@
+"""The logging pipeline: structured JSON-lines records, written by one background thread.
+
+Nothing that runs a scenario writes to disk itself. Log calls (RunLog.info, and plain logging.info
+anywhere in the process) go through a logging.handlers.QueueHandler onto an in-memory queue and
+return at once; the LogWriter thread takes them off in batches. Every record is one JSON line:
+
+    {"time": ..., "level": "INFO", "scenario": "t5search", "run_id": ..., "browser": "Chrome",
+     "browser_id": ..., "step_id": ..., "message": "..."}
+
+run_id, browser_id and step_id are correlation ids: one per run (also the run's key in the log
+index), one per browser within it, one per step. A run's records are held until the run closes,
+then written to <scenario>.log as one block, with each browser's lines together. Parallel runs
+never interleave, and the log index (searchbox.logviewer) gets the block's byte range. Everything
+finished in a batch goes out in one write and one flush per file. A scenario's log is rotated
+(.log -> .log.1 ...) before a block would take it over SELENIUM_LOG_MAX_BYTES. Records that belong
+to no run (the scheduler, the worker queue, Django) go to SELENIUM_LOG_FILE the same way.
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+from pathlib import Path
+
+from django.conf import settings
+
+from searchbox.logviewer import log_index, MAX_ROTATIONS
+
+RUN_LOGGER = "searchbox.runs"
+BATCH = 1000  # most records the writer takes off the queue per batch
+TRACEBACKS = logging.Formatter()  # renders exc_info/stack_info the way logging always has
+
+
+class RunLog():
+    """One run's log. Hand it to the pages (config["run_log"]); close() it when the run is over"""
+    def __init__(self, scenario, pipeline):
+        self.scenario = scenario
+        self.key = uuid.uuid4().hex  # the run's correlation id, and its key in the log index
+        self.pipeline = pipeline
+        self.logger = logging.getLogger(RUN_LOGGER)
+        self.flushed = threading.Event()
+
+    def log(self, level, message, browser=None, browser_id=None, step_id=None):
+        self.logger.log(level, message, extra={"scenario": self.scenario, "run_id": self.key, "browser": browser,
+                                               "browser_id": browser_id, "step_id": step_id})
+
+    def info(self, message, **ids):
+        self.log(logging.INFO, message, **ids)
+
+    def warning(self, message, **ids):
+        self.log(logging.WARNING, message, **ids)
+
+    def close(self, timeout=10):
+        """End the run and wait (on this worker thread, never a request's) for its block to reach the log and
+        the index, so the viewer can find it. Returns the run's key"""
+        self.pipeline.put(RunEnd(self))
+        if not self.flushed.wait(timeout):
+            logging.warning(f"{datetime.now(tz=None)} Warning {self.scenario} run {self.key} not written "
+                            f"to the log within {timeout}s")
+        return self.key
+
+
+class RunEnd():
+    """Queued after a run's last record: its block can be written"""
+    def __init__(self, run):
+        self.run = run
+
+
+def as_json(record):
+    return json.dumps({
+        "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+        "level": record.levelname,
+        "scenario": getattr(record, "scenario", None),
+        "run_id": getattr(record, "run_id", None),
+        "browser": getattr(record, "browser", None),
+        "browser_id": getattr(record, "browser_id", None),
+        "step_id": getattr(record, "step_id", None),
+        "logger": record.name,
+        "message": record.getMessage(),
+    }) + "\n"
+
+
+class LogFile():
+    """An append-only log file we write whole blocks to, rotating it before it outgrows max_bytes.
+    index is the file's LogIndex, if it has one; it's pruned of the runs each rotation drops"""
+    def __init__(self, path, max_bytes, backups, index=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = min(backups, MAX_ROTATIONS)  # the viewer looks no further back than that
+        self.index = index
+        self.file = None
+
+    def write(self, data):
+        """Append data with one write. Returns (offset where it starts, offset where it ends, file id)"""
+        self._open()
+        self.file.flush()  # fstat only sees what has left our buffer (a no-op when the writer has flushed)
+        size = os.fstat(self.file.fileno()).st_size
+        if self.max_bytes and size and size + len(data) > self.max_bytes:
+            self._rotate()
+        self.file.write(data)
+        end = self.file.tell()  # O_APPEND: just past our data, even if another process appended meanwhile
+        stat = os.fstat(self.file.fileno())
+        return end - len(data), end, [stat.st_dev, stat.st_ino]
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _open(self):
+        """(Re)open the file if we haven't yet or if someone else rotated it away from under us"""
+        if self.file is not None:
+            try:
+                current = self.path.stat()
+                mine = os.fstat(self.file.fileno())
+                if (current.st_dev, current.st_ino) == (mine.st_dev, mine.st_ino):
+                    return
+            except OSError:
+                pass
+            self.close()
+        self.file = open(self.path, "ab")
+
+    def _rotate(self):
+        self.close()
+        for number in range(self.backups - 1, 0, -1):
+            older = Path(f"{self.path}.{number}")
+            if older.exists():
+                os.replace(older, f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            self.path.unlink()
+        self.file = open(self.path, "ab")
+        if self.index is not None:
+            self.index.prune()
+
+
+class LogWriter():
+    """ The background thread that owns every log file: it drains the queue in batches, holds each run's
+    records until the run ends, and writes whatever is ready with one write and one flush per file"""
+    def __init__(self, general_path="searchbox.log", max_bytes=10 * 1024 * 1024, backups=5):
+        self.queue = queue.SimpleQueue()
+        self.general_path = general_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.files = {}  # path -> LogFile
+        self.runs = {}  # run_id -> OrderedDict of group -> [lines], group being a browser_id or run:<n>
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True, name="log-writer")
+        self.thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def loop(self):
+        while not self.stopped.is_set() or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < BATCH:  # whatever piled up while we were writing goes in this batch too
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write_batch(batch)
+            except Exception as exc:  # a full disk mustn't kill the writer; the runs waiting on it are released
+                for item in batch:
+                    if isinstance(item, RunEnd):
+                        item.run.flushed.set()
+                sys.stderr.write(f"{datetime.now(tz=None)} Warning log writer: {exc!r}\n")  # not to the log it can't write
+
+    def write_batch(self, batch):
+        blocks = {}  # path -> [(data, run or None)]
+        general = []
+        for item in batch:
+            if isinstance(item, RunEnd):
+                lines = self.runs.pop(item.run.key, {})
+                data = "".join(line for group in lines.values() for line in group).encode("utf-8")
+                blocks.setdefault(str(log_index(item.run.scenario).log_path), []).append((data, item.run))
+            elif getattr(item, "run_id", None):
+                groups = self.runs.setdefault(item.run_id, OrderedDict())
+                # each browser's lines together; the run's own lines stay where they fell between the browsers'
+                group = item.browser_id
+                if group is None:
+                    last = next(reversed(groups), None)
+                    group = last if last is not None and last.startswith("run:") else f"run:{len(groups)}"
+                groups.setdefault(group, []).append(as_json(item))
+            else:
+                general.append(as_json(item))
+        if general:
+            blocks.setdefault(self.general_path, []).append(("".join(general).encode("utf-8"), None))
+
+        written = []
+        for path, pieces in blocks.items():
+            if path not in self.files:
+                run = pieces[0][1]  # a scenario's log holds nothing but runs; the general log has no index
+                self.files[path] = LogFile(path, self.max_bytes, self.backups,
+                                           index=None if run is None else log_index(run.scenario))
+            log_file = self.files[path]
+            start, end, file_id = log_file.write(b"".join(data for data, run in pieces))  # one write per file
+            log_file.flush()
+            for data, run in pieces:
+                if run is not None:
+                    log_index(run.scenario).add(run.key, start, start + len(data), file_id)
+                    written.append(run)
+                start += len(data)
+        for run in written:  # only once the whole batch is out, so whatever was logged before close() is on disk too
+            run.flushed.set()
+
+    def stop(self, timeout=5):
+        """Write out what's queued (at exit) and stop"""
+        self.stopped.set()
+        self.thread.join(timeout)
+        for log_file in self.files.values():
+            log_file.close()
+
+
+class RunQueueHandler(QueueHandler):
+    """QueueHandler that keeps the record's correlation ids and leaves the formatting to the writer.
+    A traceback (logging.exception, Django's request errors) is rendered into the message now, since
+    the exception itself can't wait in the queue"""
+    def prepare(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{TRACEBACKS.formatException(record.exc_info)}"
+        if record.stack_info:
+            message = f"{message}\n{TRACEBACKS.formatStack(record.stack_info)}"
+        record.msg, record.args, record.exc_info, record.exc_text, record.stack_info = message, None, None, None, None
+        return record
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def log_pipeline():
+    """The process's LogWriter, started (and wired to the loggers) on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogWriter(general_path=getattr(settings, "SELENIUM_LOG_FILE", "searchbox.log"),
+                                  max_bytes=getattr(settings, "SELENIUM_LOG_MAX_BYTES", 10 * 1024 * 1024),
+                                  backups=getattr(settings, "SELENIUM_LOG_BACKUPS", 5))
+            handler = RunQueueHandler(_pipeline.queue)
+            run_logger = logging.getLogger(RUN_LOGGER)
+            run_logger.addHandler(handler)
+            run_logger.setLevel(logging.INFO)
+            run_logger.propagate = False  # run records only go to their scenario's log
+            root = logging.getLogger()
+            root.addHandler(handler)  # and everything else to the general log, off the calling thread too
+            if root.level > logging.INFO or root.level == logging.NOTSET:
+                root.setLevel(logging.INFO)
+        return _pipeline
+
+
+def open_run(scenario):
+    """A new RunLog for a run of scenario"""
+    return RunLog(scenario, log_pipeline())
+
+
+def stop_pipeline():
+    if _pipeline is not None:
+        _pipeline.stop()
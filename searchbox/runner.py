@@ -0,0 +1,275 @@
+"""Runs one scenario across every browser in a browser_set.
+
+A scenario is any callable taking (config, browse) that drives a single browser and returns
+the MainInterfacer page it used, whose report (log lines) and steps are collected afterwards. In parallel mode each browser gets its own worker,
+so a request costs roughly the slowest browser instead of the sum of all of them.
+"""
+import logging
+import platform
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+import selenium  # just its version; the webdriver bindings load with the browser backends
+
+from backends import browser_backends
+from maininterfacer import MainInterfacer, handler_pool, browser_capabilities, correlation_id, DRIVER_FILES
+
+HANDLER_PATHS = {  # where each platform keeps its browser drivers
+    "Windows": "selenium_deps_windows/drivers/",
+    "Darwin": "selenium_deps_mac/drivers/",  # Darwin is a mac
+    "Linux": "selenium_deps_linux/drivers/",
+}
+BATCH_CHANNEL = "batch"  # a batch job's scenario, so the events channel its waiting page listens on
+
+
+def platform_browsers(running_platform=None):
+    """Every browser we know how to drive on the platform (this one by default): the registry's backends for it,
+    built-in or not (see backends.PLATFORMS)"""
+    return browser_backends.for_platform(running_platform or platform.system())
+
+
+def run_browser_set(scenario, config):
+    """Run scenario for each browser in config["browser_set"] and return the pages in browser_set order"""
+    browser_set = config["browser_set"]
+    parallel = config.get("parallel", getattr(settings, "SELENIUM_PARALLEL", True))
+    max_workers = config.get("max_workers", getattr(settings, "SELENIUM_MAX_WORKERS", None)) or len(browser_set)
+    on_event = config.get("on_event") or (lambda event: None)
+
+    on_event({"type": "run_started", "browser_set": browser_set})
+    if not parallel or len(browser_set) < 2:  # the original one-browser-after-another mode
+        pages = [_timed(scenario, config, browse) for browse in browser_set]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(browser_set)), thread_name_prefix="browser") as pool:
+            futures = [pool.submit(_timed, scenario, config, browse) for browse in browser_set]  # one worker per browser
+            pages = [future.result() for future in futures]  # collected in submission order, not finish order
+    on_event({"type": "run_finished"})
+    return pages
+
+
+def _timed(scenario, config, browse):
+    """Run the scenario for one browser and stamp the page with when that browser started and finished.
+    If the scenario raises, the browser gets a failed page instead, so the other browsers' results still count"""
+    started_at = timezone.now()
+    try:
+        page = scenario(config, browse)
+    except Exception as exc:
+        page = failed_page(config, browse, exc)
+    if not isinstance(page, list):  # a batch returns one page per scenario and stamps each itself
+        page.started_at, page.finished_at = started_at, timezone.now()
+    return page
+
+
+def failed_page(config, browse, exc):
+    """Stand-in for the page of a browser whose run raised instead of returning: one failed step saying why"""
+    page = MainInterfacer(dict(config, use_pool=False), browse, launch=False)
+    page.plan = config.get("plan")
+    page.begin_step("run")
+    page.log(f"Fail {browse} run stopped: {exc!r}")
+    page.end_step("fail", repr(exc))
+    return page
+
+
+def save_run(scenario_name, config, pages, started_at):
+    """Persist the run's structured results (see searchbox.models). A database problem is logged, not raised,
+    so it never costs us the run itself"""
+    from searchbox.models import Run
+    try:
+        return Run.record(scenario_name, config, pages, started_at, timezone.now())
+    except DatabaseError as exc:
+        config["run_log"].warning(f"{datetime.now(tz=None)} Warning {scenario_name} results not saved: {exc}")
+        return None
+
+
+def scenario_config(plan, **overrides):
+    """The MainInterfacer config for running a compiled plan (see searchbox.scenarios) on this platform"""
+    from searchbox.events import publisher
+    running_platform = platform.system()  # Which OS are we running on?
+    config = {
+        **plan.target(),  # initial_url, results_url and keyword
+        "plan": plan,
+        "resources": plan.resources,  # what the browsers block, and their page-load strategy
+        "results_url_pattern": plan.results_url_pattern,  # the keyword matrix's results_url for any keyword
+        "reset": plan.reset,  # how a batch cleans a shared handler before this plan (see run_batch)
+        "browser_set": plan.browser_set(running_platform),  # browser_set depends on which OS is runnng
+        "running_platform": running_platform,
+        "selenium_ver": selenium.__version__[0],  # detect the version of selenium
+        "handler_path": HANDLER_PATHS.get(running_platform, ""),
+        "use_pool": getattr(settings, "SELENIUM_POOL", True),  # reuse warm browser handlers between requests
+        "on_event": publisher(plan.name),  # live progress for /events/<scenario>
+        "waits": getattr(settings, "SELENIUM_WAITS", {}),  # polling, timeouts and run budget for the Waiter
+        "step_retries": getattr(settings, "SELENIUM_STEP_RETRIES", 1),  # extra tries for a failing step
+        "retry_backoff": getattr(settings, "SELENIUM_RETRY_BACKOFF", 1.0)  # seconds before the first retry, doubling
+    }
+    config.update(overrides)
+    return config
+
+
+def run_scenario(name, scenario=None, **overrides):
+    """Run the named scenario on every browser and return the run's key in the log index. Called from a job worker.
+    overrides replace config entries (the benchmark points initial_url at a local replica and sets record=False).
+    scenario is what drives each browser, by default the plan's steps (scenarios.run_page).
+    A run_log override logs into a run that's already open (the fast path's escalation) and leaves closing it to its owner"""
+    from searchbox.metrics import observe_run
+    from searchbox.runlog import open_run
+    from searchbox.scenarios import get_plan, run_page
+    outer = overrides.pop("run_log", None)
+    run = outer or open_run(name)  # every line of the run goes through here, off this thread, into <name>.log
+    config = scenario_config(get_plan(name), run_log=run, **overrides)
+
+    run.info(f"{datetime.now(tz=None)} Info Selenium Version: {config['selenium_ver']}")
+    run.info(f"{datetime.now(tz=None)} Info Platform Running: {config['running_platform']}")
+
+    started_at = timezone.now()
+    try:
+        pages = run_browser_set(scenario or run_page, config)  # every browser at once; each logs as it goes, tagged with its id
+        if config.get("record", True):
+            save_run(name, config, pages, started_at)  # structured results for the history view
+            observe_run(name, pages)  # phase timings for /metrics
+    finally:  # the log writer holds a run's lines until it's closed, so it's closed whatever happened
+        # the run's key in the log index; the viewer streams just this run. close() waits for it to be written
+        key = run.key if outer else run.close()
+    return key
+
+
+def run_fast_path(scenario):
+    """HTTP-only check of the scenario's target. Escalates to the full browser run when the check fails,
+    or for SELENIUM_ESCALATION_SAMPLE of the checks that pass. Returns the run's key in the log index"""
+    from searchbox.httpcheck import http_check
+    from searchbox.metrics import registry
+    from searchbox.runlog import open_run
+    from searchbox.scenarios import get_plan
+    run = open_run(scenario)
+    check_id = correlation_id()  # the HTTP check's lines are grouped like a browser's
+    result = http_check(**get_plan(scenario).target(),
+                        suggest_url=getattr(settings, "SELENIUM_SUGGEST_URLS", {}).get(scenario))
+    for line in result.report:
+        run.info(line, browser="http", browser_id=check_id)
+    for phase, seconds in result.phases:
+        registry.observe(scenario, "http", phase, seconds)
+    if not result.passed or random.random() < getattr(settings, "SELENIUM_ESCALATION_SAMPLE", 0.1):
+        run.info(f"{datetime.now(tz=None)} Info Escalating to a full browser run"
+                 f"{'' if not result.passed else ' (sampled)'}")
+        run_scenario(scenario, run_log=run)  # one run in the log: the check, then the browsers
+    return run.close()
+
+
+def run_keyword_matrix(name, keywords, **overrides):
+    """Search for every keyword with the named scenario's search box, one session per browser, and report
+    time to dropdown and time to results URL percentiles per browser. Returns the run's key in the log index"""
+    from searchbox.scenarios import run_keyword_page
+    return run_scenario(name, run_keyword_page, keywords=list(keywords), **overrides)
+
+
+def read_keywords(path):
+    """One keyword per line; blank lines and lines starting with # are skipped"""
+    with open(path, encoding="utf-8") as keywords_file:
+        return [line.strip() for line in keywords_file if line.strip() and not line.startswith("#")]
+
+
+def fan_out(*listeners):
+    """One on_event callback that passes each event to every listener given (None ones are skipped)"""
+    listeners = [listener for listener in listeners if listener is not None]
+
+    def publish(event):
+        for listener in listeners:
+            listener(event)
+    return publish
+
+
+def run_batch(names, **overrides):
+    """Run several scenarios back to back on one handler per browser, so one launch per browser covers them all.
+    Each scenario is still logged, saved and reported as its own run. Returns {scenario: key in its log index}"""
+    from searchbox.events import publisher
+    from searchbox.metrics import observe_run
+    from searchbox.runlog import open_run
+    from searchbox.scenarios import get_plan, run_batch_pages
+    configs = [scenario_config(get_plan(name), run_log=open_run(name), **overrides) for name in names]
+    for name, config in zip(names, configs):  # each scenario is its own run in its own log
+        config["run_log"].info(f"{datetime.now(tz=None)} Info Selenium Version: {config['selenium_ver']}")
+        config["run_log"].info(f"{datetime.now(tz=None)} Info Platform Running: {config['running_platform']}")
+        config["run_log"].info(f"{datetime.now(tz=None)} Info Batch: {', '.join(names)}")
+    browser_set = []  # every browser any of the scenarios wants, in the order they first ask for it
+    for config in configs:
+        browser_set += [browse for browse in config["browser_set"] if browse not in browser_set]
+
+    # Each page's events go to its scenario's viewers and to the batch's own page, which listens on "batch"
+    listeners = [config.get("on_event") for config in configs]
+    batch_channel = publisher(BATCH_CHANNEL)
+    for config, listener in zip(configs, listeners):
+        config["on_event"] = fan_out(listener, batch_channel)
+
+    def on_event(event):  # run_started/run_finished go to every scenario's listeners, and to the batch's once
+        fan_out(*listeners, batch_channel)(event)
+
+    def batch(config, browse):
+        wanted = [config for config in configs if browse in config["browser_set"]]
+        try:
+            return run_batch_pages(wanted, browse)
+        except Exception as exc:  # one browser's crash fails that browser's share of the batch, not the batch
+            return [failed_page(config, browse, exc) for config in wanted]
+
+    started_at = timezone.now()
+    run_keys = {}
+    try:
+        by_browser = run_browser_set(batch, dict(configs[0], browser_set=browser_set, on_event=on_event))
+        for name, config in zip(names, configs):
+            pages = [page for pages in by_browser for page in pages if page.plan.name == name]
+            if config.get("record", True):
+                save_run(name, config, pages, started_at)
+                observe_run(name, pages)
+            run_keys[name] = config["run_log"].close()
+    finally:
+        for name, config in zip(names, configs):
+            if name not in run_keys:
+                config["run_log"].close()
+    return run_keys
+
+
+def launch_config():
+    """A MainInterfacer config good enough to launch (not drive) this platform's browsers"""
+    running_platform = platform.system()
+    return {
+        "initial_url": "", "results_url": "", "keyword": "",  # not needed just to launch a browser
+        "running_platform": running_platform,
+        "selenium_ver": selenium.__version__[0],
+        "handler_path": HANDLER_PATHS.get(running_platform, ""),
+        "use_pool": True,
+    }
+
+
+def prewarm_pool(browsers):
+    """Launch a pooled handler for each browser ahead of the first request (see SELENIUM_POOL_PREWARM)"""
+    config = launch_config()
+    for browse in browsers:
+        handler_pool.prewarm(lambda: MainInterfacer(config, browse))
+
+
+def start_local_nodes(browsers, slots=None):
+    """Start a standalone driver process (chromedriver, geckodriver...) for each browser from this platform's
+    handler_path, on a free port. Returns the services (stop() them when done) and the node definitions to hand
+    to remote_nodes.configure, so the remote backend can be exercised without a Grid"""
+    running_platform = platform.system()
+    services, nodes = [], []
+    for browse in browsers:
+        files = DRIVER_FILES[browse]
+        service = browser_backends.get(browse).SERVICE(HANDLER_PATHS.get(running_platform, "") +
+                                                      files.get(running_platform, files["default"]))
+        service.start()
+        services.append(service)
+        # geckodriver runs one session at a time; chromedriver and msedgedriver take several
+        nodes.append({"url": service.service_url, "slots": slots or (1 if browse == "Firefox" else 2),
+                      "browsers": [browse]})
+    return services, nodes
+
+
+def probe_browsers():
+    """(Re)probe which of this platform's browsers can launch, and their versions"""
+    browser_capabilities.refresh(launch_config(), platform_browsers())
+    for entry in browser_capabilities.as_list():
+        logging.info(f"{datetime.now(tz=None)} Info {entry['browser']} "
+                     f"{'available ' + entry['browser_version'] if entry['available'] else 'unavailable: ' + entry['reason']}")
+    return browser_capabilities.as_list()
@@ -0,0 +1,477 @@
+"""Declarative monitoring scenarios.
+
+A scenario is data: the page to open, the keyword to type, the URL search should land on, which
+browsers to use on each platform, and a list of steps. Each step names a locator (an xpath on the
+page), an action to perform on what it finds, and an expectation that decides whether the step
+passed. For example, t5search types "s" into the search box, checks the suggestion dropdown
+appears, and expects to land on ?s=s. A step can also require its element to be visible, or its
+text to contain something.
+
+Definitions are validated and compiled once, when the app loads, into Plans. A Plan holds
+ready-to-run steps and is shared by every request, so adding a check means adding a definition
+here (or to settings.SELENIUM_SCENARIOS), not another view or a class built per request.
+Consecutive steps that only look for elements are compiled into one ProbeGroup, which checks all
+their locators in a single round trip to the driver (see waits.Waiter.all_present).
+"""
+import time
+from urllib.parse import quote_plus
+
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from selenium.common.exceptions import WebDriverException
+
+from backends import browser_backends
+from maininterfacer import MainInterfacer, StepFailed, BLOCKABLE, PAGE_LOAD_STRATEGIES, correlation_id
+from waits import Probe
+from searchbox.metrics import percentile
+
+SEARCH_BOX = '//*[@id="search-6"]/form/label/input'
+SUGGESTIONS = {"locator": '//*[@id="search-6"]/form/div/ul', "timeout": 3}
+# A scenario opts in to resource blocking with "resources". The checks below don't: they measure the page as
+# visitors get it. SEARCH_ONLY is ready for a scenario that only touches the #search-6 widget and can skip the rest
+SEARCH_ONLY = {
+    "block": ["image", "font", "media"],
+    "block_urls": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*"],
+    "page_load_strategy": "eager",  # don't wait for every subresource; the steps wait for what they need
+}
+
+DEFINITIONS = {
+    "t5search": {
+        # 1. Simulate a keyword entry ('s'), 2. Locate the dropdown, 3. Find a search suggestion in the dropdown
+        "template": "display_log5.html",
+        "initial_url": "https://solosegment.com/",
+        "results_url": "https://solosegment.com/?s=s",
+        "keyword": "s",
+        "results_url_pattern": "https://solosegment.com/?s={keyword}",  # for the keyword matrix
+        "suggestions": SUGGESTIONS,
+        "browser_set": {
+            "Windows": ["Firefox", "IE", "Edge", "Chrome"],
+            "Darwin": ["Firefox", "Safari", "Chrome"],
+            "Linux": ["Firefox", "Chrome"],
+        },
+        "steps": [
+            {"name": "search box", "locator": SEARCH_BOX, "action": "type_enter"},
+            # these two are looked for together, in one probe of the page per poll
+            {"name": "search suggestion dropdown", "locator": '//*[@id="search-6"]/form/div'},
+            {"name": "search suggestions", "locator": '//*[@id="search-6"]/form/div/ul'},
+            {"name": "results URL", "expect": "url"},
+        ],
+    },
+    "t6search": {
+        # Search by pressing ENTER, then search again from the results page by clicking the search icon
+        "template": "display_log6.html",
+        "initial_url": "https://solosegment.com/",
+        "results_url": "https://solosegment.com/?s=solo_search",
+        "keyword": "solo_search",
+        "results_url_pattern": "https://solosegment.com/?s={keyword}",
+        "suggestions": SUGGESTIONS,
+        "browser_set": {
+            "Windows": ["Firefox", "Chrome", "IE", "Edge"],
+            "Darwin": ["Firefox", "Safari", "Chrome"],
+            "Linux": ["Firefox", "Chrome"],
+        },
+        "steps": [
+            {"name": "search box for ENTER simulation", "locator": SEARCH_BOX, "action": "type_enter"},
+            # We are running this on the search results page, so clear the text box first
+            {"name": "search box for ICON simulation", "locator": SEARCH_BOX, "action": "clear_type"},
+            {"name": "search icon", "locator": '//*[@id="search-6"]/form/input', "action": "click"},
+            {"name": "results URL", "expect": "url"},
+        ],
+    },
+}
+
+
+###################################################
+# ACTIONS: what a step does with the element its locator found
+###################################################
+def find(page, elem):
+    """Nothing: finding the element was the point"""
+
+
+def type_enter(page, elem):
+    from selenium.webdriver.common.keys import Keys  # The Keys class lets you emulate the stroke of keyboard keys
+    suggestions = page.plan.suggestions
+    watching = suggestions and "keystroke_to_dropdown" not in page.timing and page.watch_suggestions(suggestions["locator"])
+    elem.send_keys(page.keyword)
+    if watching:  # time the dropdown before ENTER takes us to the results page
+        page.timing["keystroke_to_dropdown"] = page.suggestions_shown(suggestions.get("timeout", 3))
+    elem.send_keys(Keys.ENTER)
+
+
+def clear_type(page, elem):
+    elem.clear()
+    elem.send_keys(page.keyword)
+
+
+def click(page, elem):
+    from selenium.webdriver.common.action_chains import ActionChains
+    ActionChains(page.handler).move_to_element(elem).perform()  # perform moves the mouse now
+    elem.click()
+
+
+ACTIONS = {"find": find, "type_enter": type_enter, "clear_type": clear_type, "click": click}
+EXPECTATIONS = ("present", "url")  # the locator's element exists / the browser landed on the URL
+RESETS = ("storage", "cookies", "navigate")  # see MainInterfacer.reset_state
+
+
+###################################################
+# COMPILED PLANS
+###################################################
+class Step():
+    """One compiled step, ready to run on any page"""
+    def __init__(self, name, locator=None, action="find", expect="present", url=None, visible=False, text=None):
+        self.name = name
+        self.probe = Probe(locator, visible, text) if locator else None
+        self.action = ACTIONS[action]
+        self.expect = expect
+        self.url = url
+
+    def run(self, page):
+        if self.expect == "url":
+            return page.verify_url(self.name, self.url or page.results_url)
+        page.log(f"Info {page.browse} Looking for {self.name}")
+        page.begin_step(self.name)
+        try:
+            result, = page.waiter.all_present([self.probe], self.name)  # We are looking inside the home session
+            page.log(f"Info {page.browse} {self.name} found")
+        except Exception as exc:
+            page.log(f"Fail {page.browse} {self.name} not found")
+            page.end_step("fail", f"{self.probe.xpath} not found ({exc!r})")
+            raise StepFailed(f"{page.browse} {self.name} not found")  # recorded above; the runner moves on
+        self.action(page, result["element"])
+        page.end_step()
+
+
+class ProbeGroup():
+    """Consecutive steps that only look for elements, compiled into one wait that probes all their
+    locators in a single execute_script per poll. Each step is still recorded under its own name"""
+    def __init__(self, steps):
+        self.steps = steps
+        self.name = " and ".join(step.name for step in steps)
+
+    def run(self, page):
+        for step in self.steps:
+            page.log(f"Info {page.browse} Looking for {step.name}")
+        page.begin_step(self.steps[0].name)
+        started = page.current_step
+        try:
+            page.waiter.all_present([step.probe for step in self.steps], self.name)
+        except Exception as exc:
+            page.log(f"Fail {page.browse} {self.name} not found")
+            page.end_step("fail", f"not found ({exc!r})")  # one failure, so a retry marks just it as retried
+            raise StepFailed(f"{page.browse} {self.name} not found")
+        for step in self.steps:  # they were all found by the same wait, so they share its timing, but not their ids
+            page.current_step = dict(started, name=step.name, id=correlation_id())
+            page.log(f"Info {page.browse} {step.name} found")
+            page.end_step()
+
+
+def compile_steps(definitions):
+    """Steps for a plan, with each run of two or more look-only steps merged into a ProbeGroup"""
+    compiled, lookups = [], []
+    for step in [Step(**definition) for definition in definitions] + [None]:
+        if step is not None and step.expect == "present" and step.action is find:
+            lookups.append(step)
+            continue
+        compiled += [ProbeGroup(lookups)] if len(lookups) > 1 else lookups
+        lookups = []
+        if step is not None:
+            compiled.append(step)
+    return compiled
+
+
+class Plan():
+    """A validated scenario with its steps compiled"""
+    def __init__(self, name, definition):
+        self.name = name
+        self.template = definition.get("template", "display_log.html")
+        self.initial_url = definition["initial_url"]
+        self.results_url = definition["results_url"]
+        self.keyword = definition["keyword"]
+        self.browser_sets = definition["browser_set"]
+        self.reset = tuple(definition.get("reset", RESETS))  # how to clean a shared handler before this plan runs
+        self.resources = definition.get("resources", {})  # resource blocking and page-load strategy for launches
+        self.suggestions = definition.get("suggestions")  # the list typing fills in; timed from the first keystroke
+        self.results_url_pattern = definition.get("results_url_pattern")  # results_url with {keyword} in it
+        self.steps = compile_steps(definition["steps"])
+        typing = [step for step in self.steps if isinstance(step, Step) and step.action is type_enter]
+        self.search_box = typing[0].probe if typing else None  # where the keyword matrix types
+
+    def target(self):
+        """What the scenario checks; the HTTP fast path checks the same thing"""
+        return {"initial_url": self.initial_url, "results_url": self.results_url, "keyword": self.keyword}
+
+    def browser_set(self, running_platform):
+        return self.browser_sets.get(running_platform, [])
+
+
+class ScenarioPage(MainInterfacer):
+    """Runs a Plan on one browser. Defined once, for every scenario"""
+    def __init__(self, config, browse, launch=True):
+        super().__init__(config, browse, launch)
+        self.plan = config["plan"]
+        self.results_url_pattern = config.get("results_url_pattern")
+        self.log(f"Info {self.browse} Looking for browser handler")
+
+    def __repr__(self):
+        return f"Initial URL is {self.initial_url}\nLanding URL is {self.results_url}"
+
+    def start_the_session(self):  # This is where we load the website into the browser
+        """See if the website is up and then get the session"""
+        import requests  # loaded with the first run, not with the app
+        self.begin_step("start session")
+        try:
+            with self.phase("precheck"):
+                resp = requests.get(self.initial_url)  # First make sure the URL exists and is obtainable
+            self.log(f"Info {self.browse} Looking for URL {self.initial_url}")
+            if resp.status_code == 200:
+                with self.phase("page_load"):
+                    self.handler.get(self.initial_url)  # Now load the website
+                self.measure_page_load(self.phases[-1][1])  # weight, and what resource blocking saved
+                self.capture_timing("landing")  # the site's own Navigation and Resource Timing
+                self.log(f"Info {self.browse} URL {self.initial_url} found")
+                self.log(f"Info {self.browse} Session Initialized")
+                self.end_step()
+            else:
+                self.log(f"Fail {self.browse} URL {self.initial_url} returned {resp.status_code}")
+                self.end_step("fail", f"{self.initial_url} returned {resp.status_code}")
+                raise StepFailed(f"{self.browse} URL {self.initial_url} returned {resp.status_code}")
+        except StepFailed:
+            raise
+        except Exception as exc:
+            self.log(f"Fail {self.browse} URL {self.initial_url} not found")
+            self.end_step("fail", repr(exc))
+            raise StepFailed(f"{self.browse} URL {self.initial_url} not found")  # recorded above; the runner moves on
+
+    def verify_url(self, name, url):
+        """Check we landed on url. A wrong URL is a failed check, not a broken step, so it isn't retried"""
+        self.begin_step(name)
+        self.log(f"Info {self.browse} Checking the results URL")
+        if self.url_reached(url):  # polls instead of a fixed sleep; Firefox and Safari redirect late
+            self.log(f"{self.browse} Pass")
+            self.end_step()
+            self.capture_timing("results")
+        else:
+            self.log(f"{self.browse} Fail with {self.handler.current_url} not equal to the expected ur: {url}")
+            self.end_step("fail", f"expected {url}")
+
+    def run_plan(self):
+        """Every step in order, each retried on failure; a step that still fails ends this browser's run"""
+        try:
+            self.attempt(self.start_the_session)  # start the session we want to test
+            for step in self.plan.steps:
+                self.attempt(step.run, self)
+        except StepFailed:
+            pass  # already recorded as a failed step
+
+    def run_keywords(self, keywords):
+        """Keyword matrix: search for each keyword in turn in this one session, timing keystroke to dropdown and
+        ENTER to results URL. Each keyword is a step; the timings and their percentiles go in timing["keywords"]"""
+        from selenium.webdriver.common.keys import Keys
+        measured = []  # [keyword, dropdown ms, results ms], None where it never happened
+        for position, keyword in enumerate(keywords):
+            self.begin_step(f"keyword {keyword}")
+            url = self.results_url_pattern.format(keyword=quote_plus(keyword))
+            try:
+                if position:  # the first keyword starts from the page start_the_session loaded
+                    with self.phase("page_load"):
+                        self.handler.get(self.initial_url)
+                box, = self.waiter.all_present([self.plan.search_box], "search box")
+                watching = self.plan.suggestions and self.watch_suggestions(self.plan.suggestions["locator"])
+                box["element"].send_keys(keyword)
+                dropdown = self.suggestions_shown(self.plan.suggestions.get("timeout", 3)) if watching else None
+                box["element"].send_keys(Keys.ENTER)
+                start = time.monotonic()
+                reached = self.url_reached(url)
+                results = round((time.monotonic() - start) * 1000) if reached else None
+            except Exception as exc:
+                self.log(f"Fail {self.browse} keyword {keyword}: {exc!r}")
+                self.end_step("fail", repr(exc))
+                measured.append([keyword, None, None])
+                continue
+            measured.append([keyword, dropdown, results])
+            if reached:
+                self.log(f"Info {self.browse} keyword {keyword}: dropdown "
+                         f"{'-' if dropdown is None else f'{dropdown}ms'}, results URL {results}ms")
+                self.end_step()
+            else:
+                try:
+                    landed = self.handler.current_url
+                except WebDriverException:  # the session died while we waited
+                    landed = "no page"
+                self.log(f"{self.browse} Fail with {landed} not equal to the expected ur: {url}")
+                self.end_step("fail", f"expected {url}")
+        self.timing["keywords"] = {"measured": measured, "summary": keyword_summary(measured)}
+        for name, summary in self.timing["keywords"]["summary"].items():
+            self.log(f"Info {self.browse} {name} over {summary['count']} keywords: p50 {summary['p50']}ms, "
+                     f"p95 {summary['p95']}ms, p99 {summary['p99']}ms")
+
+    def tear_down(self):
+        """Hand the handler back however the run went. A crashed session (or none, after a failed failover)
+        is still released, so the pool and the remote node's slot aren't left holding it"""
+        if self.handler is None:
+            return
+        try:
+            self.handler.set_page_load_timeout(20)  # This helps prevent Error reading broker pipe
+        except WebDriverException:
+            pass  # the session is gone; checkin finds that out too and quits it instead of parking it
+        finally:
+            self.release_handler()  # back to the warm pool (or quit, if pooling is off)
+
+
+def run_page(config, browse):
+    """The scenario callable run_browser_set takes: one browser through config["plan"]"""
+    page = ScenarioPage(config, browse)  # we are instantiating a new object each time we start a new browser
+    if page.handler is None:  # If the browser handler isn't found, go on to the next browser
+        return page
+    try:
+        page.run_plan()
+    finally:
+        page.tear_down()  # the handler goes back to the pool either way
+    return page
+
+
+def keyword_summary(measured):
+    """p50/p95/p99 (ms) of time to dropdown and time to results URL over the keywords that got there"""
+    summary = {}
+    for name, column in (("time to dropdown", 1), ("time to results URL", 2)):
+        values = [row[column] for row in measured if row[column] is not None]
+        if values:
+            summary[name] = {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                             "p99": percentile(values, 99)}
+    return summary
+
+
+def run_keyword_page(config, browse):
+    """The keyword matrix on one browser: one session, every keyword in config["keywords"]"""
+    page = ScenarioPage(config, browse)
+    if page.handler is None:
+        return page
+    try:
+        page.attempt(page.start_the_session)
+        if page.handler is not None:  # None when its remote node dropped and no other node could take over
+            page.run_keywords(config["keywords"])
+    except StepFailed:
+        pass  # already recorded as a failed step
+    finally:
+        page.tear_down()
+    return page
+
+
+def run_batch_pages(configs, browse):
+    """Run several plans back to back on one handler for this browser: one launch covers the whole batch.
+    Each plan gets its own page (its own report, steps and timings), and the browser state is reset
+    between plans (config["reset"]: clear storage and cookies, then navigate to its initial_url).
+    Returns the pages in configs order"""
+    pages = []
+    lead = None  # the page that launched the handler; it also gives it back
+    try:
+        for config in configs:
+            started_at = timezone.now()
+            if lead is None:
+                page = lead = ScenarioPage(config, browse)
+                if lead.handler is not None:
+                    lead.run_plan()
+            else:
+                page = ScenarioPage(config, browse, launch=False)
+                if lead.handler is None:
+                    page.log(f"Warning {browse} skipped: no browser handler for the batch")
+                else:
+                    page.handler, page.launched = lead.handler, True  # borrowed, not launched
+                    page.resources, page.baseline_run = lead.resources, lead.baseline_run  # it was launched with these
+                    if reset_between(page, config.get("reset", RESETS)):
+                        page.run_plan()
+                    page.handler = None  # so nothing but the lead hands it back
+            page.started_at, page.finished_at = started_at, timezone.now()
+            pages.append(page)
+    finally:
+        if lead is not None and lead.handler is not None:
+            lead.tear_down()  # the handler goes back to the pool either way
+    return pages
+
+
+def reset_between(page, reset):
+    """Reset the shared handler as a step of page's run. False if that failed (the session is likely gone)"""
+    page.begin_step("reset state")
+    try:
+        page.reset_state(reset)
+        page.end_step()
+        return True
+    except Exception as exc:
+        page.log(f"Fail {page.browse} could not reset the browser state: {exc!r}")
+        page.end_step("fail", repr(exc))
+        return False
+
+
+###################################################
+# VALIDATION AND THE PLAN CACHE
+###################################################
+def validate(name, definition):
+    """Raise ImproperlyConfigured describing the first thing wrong with a definition"""
+    def problem(message):
+        return ImproperlyConfigured(f"Scenario {name}: {message}")
+
+    for key in ("initial_url", "results_url", "keyword", "browser_set", "steps"):
+        if key not in definition:
+            raise problem(f"missing {key}")
+    if not isinstance(definition["browser_set"], dict):
+        raise problem("browser_set maps a platform (Windows, Darwin, Linux) to a list of browsers")
+    for running_platform, browsers in definition["browser_set"].items():
+        unknown = set(browsers) - set(browser_backends.names())  # ours, and any registered or installed
+        if unknown:
+            raise problem(f"unknown browsers for {running_platform}: {', '.join(sorted(unknown))}")
+    resources = definition.get("resources", {})
+    if set(resources) - {"block", "block_urls", "page_load_strategy"}:
+        raise problem("resources takes block, block_urls and page_load_strategy")
+    if set(resources.get("block", ())) - set(BLOCKABLE):
+        raise problem(f"resources can block {', '.join(BLOCKABLE)}")
+    if resources.get("page_load_strategy", "normal") not in PAGE_LOAD_STRATEGIES:
+        raise problem(f"page_load_strategy is one of {', '.join(PAGE_LOAD_STRATEGIES)}")
+    if "results_url_pattern" in definition and "{keyword}" not in definition["results_url_pattern"]:
+        raise problem("results_url_pattern needs a {keyword} placeholder")
+    if "suggestions" in definition and not definition["suggestions"].get("locator"):
+        raise problem("suggestions needs the locator of the list typing fills in")
+    if set(definition.get("reset", RESETS)) - set(RESETS):
+        raise problem(f"reset takes any of {', '.join(RESETS)}")
+    if not definition["steps"]:
+        raise problem("no steps")
+    for position, step in enumerate(definition["steps"], 1):
+        unknown = set(step) - {"name", "locator", "action", "expect", "url", "visible", "text"}
+        if unknown or "name" not in step:
+            raise problem(f"step {position} needs a name and takes only locator, action, expect, url, visible and text")
+        if step.get("action", "find") not in ACTIONS:
+            raise problem(f"step {position} has unknown action {step['action']}")
+        if step.get("expect", "present") not in EXPECTATIONS:
+            raise problem(f"step {position} has unknown expectation {step['expect']}")
+        if step.get("expect", "present") == "present" and not step.get("locator"):
+            raise problem(f"step {position} needs a locator to find")
+
+
+_plans = {}
+
+
+def compile_all():
+    """Validate and compile every definition (ours plus settings.SELENIUM_SCENARIOS). Called once at startup"""
+    definitions = dict(DEFINITIONS, **getattr(settings, "SELENIUM_SCENARIOS", {}))
+    plans = {}
+    for name, definition in definitions.items():
+        validate(name, definition)
+        plans[name] = Plan(name, definition)
+    _plans.clear()
+    _plans.update(plans)
+    return plans
+
+
+def get_plan(name):
+    """The compiled plan, or None for an unknown scenario"""
+    if not _plans:
+        compile_all()
+    return _plans.get(name)
+
+
+def plan_names():
+    if not _plans:
+        compile_all()
+    return sorted(_plans)
@@ -0,0 +1,226 @@
+"""Scheduled monitoring: run named checks on intervals, with jitter and bounded load.
+
+Each entry of settings.SELENIUM_SCHEDULE names a check (a scenario) and how often to run it:
+
+    {"check": "t5search", "every": 300, "jitter": 30, "mode": "browser", "on_overlap": "skip"}
+
+mode is "browser" (run_scenario) or "http" (run_fast_path, escalating to browsers when it fails).
+Due times keep to the check's own cadence (due + every +/- jitter), so the checks don't drift into
+step with each other and hit the runner all at once. A run only starts while fewer than
+SELENIUM_SCHEDULE_MAX_RUNS are going and while every browser it needs is under its limit in
+SELENIUM_SCHEDULE_BROWSER_LIMITS. When a run is due but the previous one is still going (or a limit
+is reached), on_overlap decides: "skip" drops it, "queue" starts it as soon as it can (at most one
+waits). How late each run started against its due time (the schedule lag) is logged, kept per
+check, and exported on /metrics as the "schedule_lag" phase of browser "scheduler".
+
+A check goes through the same job layer as a run started from a page (jobs.submit_job): it shares
+single-flight and the cached result with them, and with SELENIUM_JOB_BACKEND = "db" it is queued
+for the run_worker processes. Only one process per host runs the schedule: whoever holds the lock
+file SELENIUM_SCHEDULE_LOCK (see claim_schedule).
+"""
+import logging
+import os
+import platform
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from searchbox.jobs import submit_job, FAILED
+from searchbox.metrics import registry, percentile
+from searchbox.scenarios import get_plan
+
+MODES = ("browser", "http")
+OVERLAP = ("skip", "queue")
+
+
+class ScheduledCheck():
+    """One entry of the schedule and what has happened to it"""
+    def __init__(self, check, every, jitter=0, mode="browser", on_overlap="skip"):
+        self.name = check
+        self.every = every
+        self.jitter = min(jitter, every / 2)  # never so much that two runs swap places
+        self.mode = mode
+        self.on_overlap = on_overlap
+        self.next_due = time.monotonic() + random.uniform(0, self.jitter)  # spread the first runs out too
+        self.running = False
+        self.queued = None  # due time of the run waiting to start
+        self.runs = 0
+        self.skipped = 0
+        self.lags = deque(maxlen=100)  # seconds late, of the latest runs
+
+    def browsers(self):
+        """The browsers a run holds while it goes; an HTTP check only borrows them if it escalates"""
+        return [] if self.mode == "http" else get_plan(self.name).browser_set(platform.system())
+
+    def status(self):
+        return {"check": self.name, "every": self.every, "mode": self.mode, "running": self.running,
+                "queued": self.queued is not None, "runs": self.runs, "skipped": self.skipped,
+                "lag_p50": percentile(list(self.lags), 50), "lag_max": max(self.lags) if self.lags else None}
+
+
+def run_check(check, timeout=None):
+    """Submit the check's run as the views would and wait for it, at most timeout seconds (default: its interval).
+    A run still going after that keeps going; the check's next run attaches to it rather than starting another"""
+    if check.mode == "http":
+        job = submit_job("http", check.name, key=f"{check.name}:http")
+    else:
+        job = submit_job("browser", check.name)
+    timeout = check.every if timeout is None else timeout
+    if not job.wait(timeout):
+        logging.info(f"{datetime.now(tz=None)} Info scheduler {check.name} still {job.status} after {timeout:g}s, "
+                     f"leaving it to finish on its own")
+        return None
+    if job.status == FAILED:
+        raise RuntimeError(f"job {job.as_dict()['job_id']} failed: {job.error}")
+    return job.result
+
+
+class Scheduler():
+    def __init__(self, checks, max_runs=2, browser_limits=None, run=run_check):
+        self.checks = checks
+        self.max_runs = max_runs
+        self.browser_limits = browser_limits or {}
+        self.run = run
+        self.active = 0
+        self.in_use = {}  # browser -> runs holding it
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=max_runs, thread_name_prefix="scheduled")
+
+    def start(self):
+        """Run the schedule on a background thread"""
+        threading.Thread(target=self.loop, daemon=True, name="scheduler").start()
+
+    def stop(self, wait=True):
+        self.stopped.set()
+        self.pool.shutdown(wait=wait)
+
+    def loop(self, until=None):
+        """Start checks as they fall due, until stop() (or until the monotonic time until)"""
+        while not self.stopped.is_set() and (until is None or time.monotonic() < until):
+            now = time.monotonic()
+            for check in self.checks:
+                self.tick(check, now)
+            next_due = min([check.next_due for check in self.checks] + [now + 1])
+            self.stopped.wait(max(0.05, min(next_due - time.monotonic(), 1.0)))  # wake at least every second for the queue
+
+    def tick(self, check, now):
+        if check.queued is not None and not check.running:
+            self.dispatch(check, check.queued)
+        if now < check.next_due:
+            return
+        due = check.next_due
+        check.next_due = self.following(check, due, now)
+        if check.running or check.queued is not None:
+            self.overlap(check, due, "the previous run is still going")
+        elif not self.dispatch(check, due):
+            self.overlap(check, due, "the concurrency limit is reached")
+
+    @staticmethod
+    def following(check, due, now):
+        """The next due time after due, on the check's own cadence; runs missed while we were busy are dropped"""
+        following = due + check.every
+        while following <= now:
+            following += check.every
+        return following + random.uniform(-check.jitter, check.jitter)
+
+    def overlap(self, check, due, reason):
+        if check.on_overlap == "queue" and check.queued is None:
+            check.queued = due
+            logging.info(f"{datetime.now(tz=None)} Info scheduler {check.name} queued: {reason}")
+        else:
+            check.skipped += 1
+            logging.info(f"{datetime.now(tz=None)} Info scheduler {check.name} skipped: {reason}")
+
+    def dispatch(self, check, due):
+        """Start check if the global and per-browser limits allow. False if they don't"""
+        browsers = check.browsers()
+        with self.lock:
+            if self.active >= self.max_runs or any(
+                    self.in_use.get(browse, 0) >= self.browser_limits[browse]
+                    for browse in browsers if browse in self.browser_limits):
+                return False
+            self.active += 1
+            for browse in browsers:
+                self.in_use[browse] = self.in_use.get(browse, 0) + 1
+            check.running, check.queued = True, None
+        lag = max(0.0, time.monotonic() - due)
+        check.lags.append(lag)
+        registry.observe(check.name, "scheduler", "schedule_lag", lag)
+        logging.info(f"{datetime.now(tz=None)} Info scheduler {check.name} started {lag:.2f}s after it was due")
+        self.pool.submit(self.work, check, browsers)
+        return True
+
+    def work(self, check, browsers):
+        try:
+            self.run(check)
+            check.runs += 1
+        except Exception as exc:  # one broken run mustn't stop the schedule
+            logging.warning(f"{datetime.now(tz=None)} Warning scheduler {check.name} failed: {exc!r}")
+        finally:
+            with self.lock:
+                self.active -= 1
+                for browse in browsers:
+                    self.in_use[browse] -= 1
+            check.running = False
+            close_old_connections()  # the database queue's polling opened one on this thread
+
+    def status(self):
+        return [check.status() for check in self.checks]
+
+
+def validate_schedule(entries):
+    """ScheduledChecks for the SELENIUM_SCHEDULE entries; ValueError describing the first bad one"""
+    checks = []
+    for entry in entries:
+        name = entry.get("check")
+        if get_plan(name) is None:
+            raise ValueError(f"schedule: unknown check {name}")
+        if not entry.get("every", 0) > 0:
+            raise ValueError(f"schedule: {name} needs every (seconds) above 0")
+        if entry.get("mode", "browser") not in MODES or entry.get("on_overlap", "skip") not in OVERLAP:
+            raise ValueError(f"schedule: {name} mode is one of {MODES} and on_overlap one of {OVERLAP}")
+        checks.append(ScheduledCheck(**entry))
+    return checks
+
+
+def scheduler_from_settings(entries=None):
+    return Scheduler(validate_schedule(getattr(settings, "SELENIUM_SCHEDULE", []) if entries is None else entries),
+                     max_runs=getattr(settings, "SELENIUM_SCHEDULE_MAX_RUNS", 2),
+                     browser_limits=getattr(settings, "SELENIUM_SCHEDULE_BROWSER_LIMITS", {}))
+
+
+def lock_file(path):
+    """path, opened and locked without waiting; None if another process holds it. The lock lasts while the
+    file stays open, and goes with the process however it ends, so a crashed scheduler leaves nothing to clean up"""
+    handle = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+_schedule_lock = None
+
+
+def claim_schedule():
+    """Whether this process runs the schedule: True once it holds SELENIUM_SCHEDULE_LOCK, False while another
+    process on this host does. Several hosts sharing one database should run `run_scheduler` on just one of them"""
+    global _schedule_lock
+    if _schedule_lock is None:
+        _schedule_lock = lock_file(getattr(settings, "SELENIUM_SCHEDULE_LOCK", "scheduler.lock"))
+    return _schedule_lock is not None
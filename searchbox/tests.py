@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import quote_plus
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+from importlib.metadata import EntryPoint
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import (NoSuchElementException, StaleElementReferenceException, TimeoutException,
+                                        WebDriverException)
+
+from backends import BUILTIN, ENTRY_POINT_GROUP, PLATFORMS, BackendRegistry, browser_backends, firefox, safari
+from backends.remote import RemoteNodes, remote_nodes
+from maininterfacer import (SUGGESTION_WATCH_SCRIPT, TIMING_SCRIPT, BrowserCapabilities, HandlerPool, LoadBaselines, MainInterfacer, StepFailed,
+                            handler_pool, unsupported)
+from searchbox.jobs import JobQueue, DONE, FAILED, key_covers, submit_job
+from searchbox.loadgen import run_load, search_urls
+from searchbox.logviewer import LogIndex, iter_messages, log_index
+from searchbox.management.commands.bench_search import BENCH_LOG, bench_run
+from searchbox.models import BrowserSession, JobKey, QueuedJob, Run, Worker, RUNNING as JOB_RUNNING, DONE as JOB_DONE, FAILED as JOB_FAILED
+from searchbox.apps import SearchboxConfig, serving
+from searchbox.events import QUEUE_SIZE, event_bus, sse_application
+from searchbox.metrics import observe_run, percentile, registry
+from searchbox.replica import ReplicaServer
+from searchbox.runner import BATCH_CHANNEL, platform_browsers, run_batch, run_browser_set, run_scenario, scenario_config
+from searchbox.runlog import LogFile, open_run
+from searchbox.scenarios import (DEFINITIONS, SEARCH_BOX, SEARCH_ONLY, ScenarioPage, compile_all, get_plan, keyword_summary,
+                                 plan_names, run_keyword_page, run_page, validate)
+from searchbox.scheduler import Scheduler, ScheduledCheck, lock_file, run_check
+from searchbox import views, workqueue
+from waits import PAGE_LOADED_SCRIPT, PROBE_SCRIPT, Probe, Waiter
+
+
+###################################################
+# FAKES: stand-ins for the browser drivers, so nothing here launches a browser
+###################################################
+class FakeHandler():
+    """Answers like a WebDriver session until crash() is called, then raises like one whose browser died"""
+    def __init__(self):
+        self.alive = True
+        self.quit_called = False
+        self.current_page = "about:blank"
+
+    def crash(self):
+        self.alive = False
+
+    def check(self):
+        if not self.alive:
+            raise WebDriverException("session deleted because of page crash")
+
+    @property
+    def current_url(self):
+        self.check()
+        return self.current_page
+
+    def get(self, url):
+        self.check()
+        self.current_page = url
+
+    def execute_script(self, script, *args):
+        self.check()
+        return None
+
+    def delete_all_cookies(self):
+        self.check()
+
+    def set_page_load_timeout(self, seconds):
+        self.check()
+
+    def quit(self):
+        self.quit_called = True
+
+
+def fake_backend(crashed=False):
+    """A browser backend whose launches hand out FakeHandlers (already crashed ones if crashed)"""
+    launched = []
+
+    def launch(page):
+        handler = FakeHandler()
+        if crashed:
+            handler.crash()
+        launched.append(handler)
+        return handler
+    return SimpleNamespace(launch=launch, launched=launched)
+
+
+_scratch = {}  # where the whole module runs, so the log writer (started in ready()) never writes into the project
+
+
+def setUpModule():
+    _scratch["cwd"], _scratch["directory"] = os.getcwd(), tempfile.TemporaryDirectory()
+    os.chdir(_scratch["directory"].name)
+
+
+def tearDownModule():
+    os.chdir(_scratch["cwd"])
+    _scratch["directory"].cleanup()
+
+
+class InTempDirectory():
+    """Mixin: run each test in a scratch directory of its own, so it only sees the logs it wrote, and with
+    empty /metrics, so nothing a test observes is left behind in the process's registry"""
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.directory.name)
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+
+class FakeInterfacer():
+    """What HandlerPool needs of a MainInterfacer: a pool key, a log and a way to launch"""
+    def __init__(self, browse="Chrome"):
+        self.browse = browse
+        self.report = []
+        self.launched = []
+
+    def pool_key(self):
+        return (self.browse,)
+
+    def log(self, message):
+        self.report.append(message)
+
+    def launch_handler(self):
+        handler = FakeHandler()
+        self.launched.append(handler)
+        return handler
+
+
+###################################################
+# The wait engine
+###################################################
+def waiting_page(handler=None):
+    """What a Waiter needs of a MainInterfacer page"""
+    report = []
+    return SimpleNamespace(handler=handler or FakeHandler(), browse="Fake", phases=[], report=report, log=report.append)
+
+
+class WaiterTests(SimpleTestCase):
+    def test_polling_backs_off_up_to_its_ceiling(self):
+        answers = iter([False, False, False, False, "ready"])
+        waiter = Waiter(waiting_page(), poll=0.1, backoff=2, max_poll=0.3)
+        with mock.patch("waits.time.sleep") as sleep:
+            self.assertEqual(waiter.until(lambda handler: next(answers), "ready"), "ready")
+        self.assertEqual([round(call.args[0], 3) for call in sleep.call_args_list], [0.1, 0.2, 0.3, 0.3])
+
+    def test_a_wait_that_times_out_is_recorded_and_raises(self):
+        page = waiting_page()
+        waiter = Waiter(page, poll=0.01)
+        with self.assertRaisesRegex(TimeoutException, "for results URL"):
+            waiter.until(lambda handler: False, "results URL", timeout=0.05, phase="verify_wait")
+        (description, seconds, satisfied), = waiter.timings
+        self.assertEqual((description, satisfied), ("results URL", False))
+        self.assertGreaterEqual(seconds, 0.05)
+        self.assertEqual(page.phases[0][0], "verify_wait")
+        self.assertIn("(gave up)", page.report[0])
+
+    def test_the_run_budget_cuts_every_wait_short(self):
+        waiter = Waiter(waiting_page(), poll=0.01, run_budget=0.05)
+        started = time.monotonic()
+        with self.assertRaises(TimeoutException):
+            waiter.until(lambda handler: False, "search box", timeout=10)
+        self.assertLess(time.monotonic() - started, 1)
+        with self.assertRaises(TimeoutException):  # the budget is spent: the next wait gives up at once
+            waiter.until(lambda handler: False, "dropdown", timeout=10)
+        self.assertLess(waiter.timings[1][1], 0.05)
+        self.assertAlmostEqual(waiter.spent(), sum(seconds for _, seconds, _ in waiter.timings))
+
+    def test_missing_and_stale_elements_are_polled_through(self):
+        errors = iter([NoSuchElementException("not yet"), StaleElementReferenceException("replaced")])
+
+        def condition(handler):
+            error = next(errors, None)
+            if error is not None:
+                raise error
+            return True
+        self.assertTrue(Waiter(waiting_page(), poll=0.01).until(condition, "search box"))
+
+
+class ProbingHandler(FakeHandler):
+    """Answers PROBE_SCRIPT from a page of xpath -> (visible, text), as it stands at each call; IE-like (no
+    document.evaluate, so the driver is asked one locator at a time) if xpath_in_dom is False"""
+    def __init__(self, pages, xpath_in_dom=True):
+        super().__init__()
+        self.pages = iter(pages)
+        self.page = {}
+        self.xpath_in_dom = xpath_in_dom
+        self.scripts = 0
+        self.lookups = 0
+
+    def execute_script(self, script, *args):
+        self.check()
+        self.scripts += 1
+        self.page = next(self.pages, self.page)
+        if not self.xpath_in_dom:
+            return None
+        return [{"found": xpath in self.page, "visible": self.page.get(xpath, (False,))[0],
+                 "text": self.page.get(xpath, (False, ""))[1], "element": xpath if xpath in self.page else None}
+                for xpath in args[0]]
+
+    def find_elements(self, by, xpath):
+        self.lookups += 1
+        if xpath not in self.page:
+            return []
+        visible, text = self.page[xpath]
+        return [SimpleNamespace(is_displayed=lambda: visible, text=text, get_attribute=lambda name: "")]
+
+
+class ProbeTests(SimpleTestCase):
+    BOX, LIST = "//input[@name='s']", "//ul[@class='suggestions']"
+
+    def test_every_locator_is_checked_in_one_round_trip_per_poll(self):
+        handler = ProbingHandler([{self.BOX: (True, "")}, {self.BOX: (True, ""), self.LIST: (True, "solo search")}])
+        waiter = Waiter(waiting_page(handler), poll=0.01)
+        box, suggestions = waiter.all_present([Probe(self.BOX, visible=True), Probe(self.LIST, text="solo")], "search box")
+        self.assertEqual(handler.scripts, 2)  # two polls, one execute_script each, for both locators
+        self.assertEqual(suggestions["text"], "solo search")
+        self.assertEqual(box["element"], self.BOX)
+
+    def test_a_timeout_says_which_probes_were_never_satisfied(self):
+        handler = ProbingHandler([{self.BOX: (False, ""), self.LIST: (True, "support")}])
+        waiter = Waiter(waiting_page(handler), poll=0.01)
+        with self.assertRaises(TimeoutException) as raised:
+            waiter.all_present([Probe(self.BOX, visible=True), Probe(self.LIST, text="solo"), Probe("//missing")],
+                               "search box", timeout=0.05)
+        self.assertIn(f"{self.BOX} not visible", raised.exception.msg)
+        self.assertIn(f"{self.LIST} text 'support' does not contain 'solo'", raised.exception.msg)
+        self.assertIn("//missing not found", raised.exception.msg)
+
+    def test_browsers_without_xpath_in_the_dom_fall_back_to_the_driver(self):
+        handler = ProbingHandler([{self.BOX: (True, ""), self.LIST: (True, "solo")}], xpath_in_dom=False)
+        waiter = Waiter(waiting_page(handler), poll=0.01)
+        results = waiter.all_present([Probe(self.BOX, visible=True), Probe(self.LIST, text="solo")], "search box")
+        self.assertEqual(handler.lookups, 2)
+        self.assertEqual([result["found"] for result in results], [True, True])
+        self.assertEqual(results[1]["text"], "solo")
+
+
+###################################################
+# Declarative scenarios, compiled once
+###################################################
+class ScenarioCompileTests(SimpleTestCase):
+    def definition(self, **changes):
+        return dict(DEFINITIONS["t5search"], **changes)
+
+    def test_look_only_steps_in_a_row_become_one_probe_group(self):
+        kinds = [type(step).__name__ for step in get_plan("t5search").steps]
+        self.assertEqual(kinds, ["Step", "ProbeGroup", "Step"])
+        group = get_plan("t5search").steps[1]
+        self.assertEqual(group.name, "search suggestion dropdown and search suggestions")
+        self.assertEqual([type(step).__name__ for step in get_plan("t6search").steps], ["Step"] * 4)  # each one acts
+        self.assertEqual(get_plan("t5search").search_box.xpath, SEARCH_BOX)
+
+    def test_plans_are_compiled_once_and_settings_add_scenarios(self):
+        self.assertIs(get_plan("t5search"), get_plan("t5search"))
+        self.addCleanup(compile_all)
+        with override_settings(SELENIUM_SCENARIOS={"t7search": self.definition(keyword="solo")}):
+            compile_all()
+        self.assertEqual(get_plan("t7search").target()["keyword"], "solo")
+        self.assertIn("t7search", plan_names())
+        self.assertIsNone(get_plan("nothing"))
+
+    def test_bad_definitions_are_refused_saying_what_is_wrong(self):
+        steps = DEFINITIONS["t5search"]["steps"]
+        for definition, message in [
+            ({key: value for key, value in self.definition().items() if key != "keyword"}, "missing keyword"),
+            (self.definition(browser_set=["Firefox"]), "browser_set maps a platform"),
+            (self.definition(steps=[]), "no steps"),
+            (self.definition(steps=[{"name": "box", "locator": SEARCH_BOX, "action": "hover"}]), "unknown action hover"),
+            (self.definition(steps=[{"name": "box", "expect": "title"}]), "unknown expectation title"),
+            (self.definition(steps=[{"name": "box"}]), "step 1 needs a locator"),
+            (self.definition(steps=steps + [{"locator": SEARCH_BOX}]), "step 5 needs a name"),
+            (self.definition(results_url_pattern="https://solosegment.com/?s="), "needs a {keyword} placeholder"),
+            (self.definition(resources={"block": ["scripts"]}), "resources can block"),
+            (self.definition(reset=["everything"]), "reset takes any of"),
+        ]:
+            with self.subTest(message), self.assertRaisesRegex(ImproperlyConfigured, f"Scenario bad: .*{re.escape(message)}"):
+                validate("bad", definition)
+
+
+class ProbeGroupTests(SimpleTestCase):
+    DROPDOWN, LIST = '//*[@id="search-6"]/form/div', '//*[@id="search-6"]/form/div/ul'
+
+    def page(self, handler):
+        page = MainInterfacer({"initial_url": "http://site/", "results_url": "", "keyword": "", "running_platform": "Linux",
+                               "selenium_ver": "4", "handler_path": "", "waits": {"timeout": 0.05, "poll": 0.01}},
+                              "FakeProbing", launch=False)
+        page.handler = handler
+        return page
+
+    def test_each_step_of_a_group_is_recorded_under_its_own_name(self):
+        handler = ProbingHandler([{self.DROPDOWN: (True, "")}, {self.DROPDOWN: (True, ""), self.LIST: (True, "solo")}])
+        page = self.page(handler)
+        get_plan("t5search").steps[1].run(page)
+        self.assertEqual(handler.scripts, 2)  # both found by the same polls
+        self.assertEqual([(step["name"], step["status"]) for step in page.steps],
+                         [("search suggestion dropdown", "pass"), ("search suggestions", "pass")])
+        self.assertEqual(page.steps[0]["started_at"], page.steps[1]["started_at"])  # timed by the one wait
+
+    def test_a_group_that_is_not_found_fails_as_one_step(self):
+        page = self.page(ProbingHandler([{self.DROPDOWN: (True, "")}]))
+        with self.assertRaises(StepFailed):
+            get_plan("t5search").steps[1].run(page)
+        failed, = page.steps
+        self.assertEqual((failed["name"], failed["status"]), ("search suggestion dropdown", "fail"))
+        self.assertIn(f"{self.LIST} not found", failed["error"])
+
+
+###################################################
+# The warm handler pool
+###################################################
+class HandlerPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = HandlerPool(max_idle=300, max_uses=3)
+
+    def test_checked_in_handler_is_reused(self):
+        page = FakeInterfacer()
+        handler = self.pool.checkout(page)
+        self.pool.checkin(page, handler)
+        self.assertIs(self.pool.checkout(page), handler)
+        self.assertEqual(len(page.launched), 1)
+
+    def test_crashed_idle_handler_is_replaced(self):
+        page = FakeInterfacer()
+        handler = self.pool.checkout(page)
+        self.pool.checkin(page, handler)
+        handler.crash()
+        replacement = self.pool.checkout(page)
+        self.assertIsNot(replacement, handler)
+        self.assertTrue(handler.quit_called)
+        self.assertEqual(len(page.launched), 2)
+
+    def test_handler_is_quit_after_max_uses(self):
+        page = FakeInterfacer()
+        for _ in range(3):
+            handler = self.pool.checkout(page)
+            self.pool.checkin(page, handler)
+        self.assertTrue(handler.quit_called)
+        self.assertEqual(self.pool.idle[page.pool_key()], [])
+
+    def test_handlers_with_other_keys_are_not_lent(self):
+        chrome, firefox = FakeInterfacer("Chrome"), FakeInterfacer("Firefox")
+        self.pool.checkin(chrome, self.pool.checkout(chrome))
+        self.assertIsNot(self.pool.checkout(firefox), chrome.launched[0])
+
+    def test_stale_idle_handlers_are_evicted_without_a_checkout(self):
+        page = FakeInterfacer()
+        handler = self.pool.checkout(page)
+        self.pool.checkin(page, handler)
+        self.pool.idle[page.pool_key()][0].last_used = time.monotonic() - 301
+        self.assertEqual(self.pool.evict_idle(), 1)
+        self.assertTrue(handler.quit_called)
+        self.assertEqual(self.pool.idle[page.pool_key()], [])
+
+
+###################################################
+# Browser backends: imported on first use, and found in installed distributions
+###################################################
+LAZY_BACKEND = "def launch(page):\n    return None\n"
+
+
+class BackendRegistryTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        with open("lazy_backend.py", "w", encoding="utf-8") as module:  # a backend nothing has imported yet
+            module.write(LAZY_BACKEND)
+        sys.path.insert(0, os.getcwd())
+        self.addCleanup(sys.path.remove, os.getcwd())
+        self.addCleanup(sys.modules.pop, "lazy_backend", None)
+
+    def test_a_backend_is_imported_on_first_use(self):
+        registry = BackendRegistry({"Lazy": "lazy_backend:launch"})
+        self.assertEqual(registry.as_list()[0]["loaded"], False)
+        self.assertNotIn("lazy_backend", sys.modules)
+        launch = registry.get("Lazy")
+        self.assertIs(launch, sys.modules["lazy_backend"].launch)
+        self.assertIs(registry.get("Lazy"), launch)
+        listed, = registry.as_list()
+        self.assertEqual((listed["loaded"], listed["source"]), (True, "builtin"))
+        self.assertIsNotNone(listed["import_ms"])
+        with self.assertRaisesRegex(LookupError, "no browser backend called Missing"):
+            registry.get("Missing")
+
+    def test_installed_distributions_add_backends_by_entry_point(self):
+        def entry_points():
+            found = [EntryPoint(name="Lazy", value="lazy_backend", group=ENTRY_POINT_GROUP)]
+            return SimpleNamespace(select=lambda group: [entry for entry in found if entry.group == group])
+        registry = BackendRegistry()
+        with mock.patch("importlib.metadata.entry_points", side_effect=entry_points):
+            self.assertEqual(registry.names(), ["Lazy"])
+            self.assertNotIn("lazy_backend", sys.modules)  # only the name is read
+            self.assertIs(registry.get("Lazy"), sys.modules["lazy_backend"])
+        self.assertEqual(registry.as_list()[0]["source"], "entry point")
+
+    def test_scenarios_may_list_any_registered_backend(self):
+        definition = dict(DEFINITIONS["t5search"], browser_set={"Linux": ["Firefox", "Lazy"]})
+        with self.assertRaisesRegex(ImproperlyConfigured, "unknown browsers for Linux: Lazy"):
+            validate("custom", definition)
+        browser_backends.register("Lazy", "lazy_backend")
+        self.addCleanup(browser_backends.targets.pop, "Lazy", None)
+        validate("custom", definition)
+        self.assertNotIn("lazy_backend", sys.modules)
+
+    def test_the_probe_covers_every_backend_for_the_platform(self):
+        registry = BackendRegistry(BUILTIN, PLATFORMS)
+        registry.entry_points_read = True  # just ours and the one registered here
+        with mock.patch("searchbox.runner.browser_backends", registry):
+            self.assertEqual(platform_browsers("Linux"), ["Chrome", "Firefox"])
+            self.assertEqual(sorted(platform_browsers("Windows")), ["Chrome", "Edge", "Firefox", "IE"])
+            registry.register("Lazy", "lazy_backend")
+            self.assertEqual(platform_browsers("Darwin"), ["Chrome", "Firefox", "Safari", "Lazy"])  # never Remote
+
+
+###################################################
+# Single-flight runs and the result cache
+###################################################
+class JobQueueTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = JobQueue(max_workers=2, result_ttl=60)
+        self.release = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.executor.shutdown(wait=True)
+
+    def run_once(self, name):
+        self.calls.append(name)
+        self.release.wait(5)
+        return f"{name} result"
+
+    def test_identical_submits_share_one_job(self):
+        first = self.queue.submit("t5search", self.run_once, "t5search")
+        second = self.queue.submit("t5search", self.run_once, "t5search")
+        self.assertIs(first, second)
+        self.assertEqual(first.attached, 2)
+        self.release.set()
+        first.wait(5)
+        self.assertEqual(self.calls, ["t5search"])
+        self.assertEqual(first.result, "t5search result")
+
+    def test_other_keys_run_separately(self):
+        browser = self.queue.submit("t5search", self.run_once, "t5search")
+        http = self.queue.submit("t5search", self.run_once, "t5search http", key="t5search:http")
+        self.assertIsNot(browser, http)
+
+    def test_finished_result_is_served_from_cache_until_invalidated(self):
+        self.release.set()
+        job = self.queue.submit("t5search", self.run_once, "t5search")
+        job.wait(5)
+        self.assertIs(self.queue.submit("t5search", self.run_once, "t5search"), job)
+        self.queue.invalidate("t5search")
+        fresh = self.queue.submit("t5search", self.run_once, "t5search")
+        self.assertIsNot(fresh, job)
+        fresh.wait(5)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_cached_result_expires_after_the_ttl(self):
+        self.release.set()
+        job = self.queue.submit("t5search", self.run_once, "t5search")
+        job.wait(5)
+        job.finished -= 61
+        self.assertIsNot(self.queue.submit("t5search", self.run_once, "t5search"), job)
+
+    def test_failed_run_is_not_cached(self):
+        def broken():
+            raise RuntimeError("no browser")
+        job = self.queue.submit("t5search", broken)
+        job.wait(5)
+        self.assertEqual(job.status, FAILED)
+        self.assertIn("no browser", job.error)
+        self.release.set()
+        retry = self.queue.submit("t5search", self.run_once, "t5search")
+        self.assertIsNot(retry, job)
+        retry.wait(5)
+        self.assertEqual(retry.status, DONE)
+
+
+@override_settings(SELENIUM_API_TOKENS=["dashboard-token"])
+class ApiAccessTests(InTempDirectory, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_runs_are_only_dropped_by_a_post(self):
+        for url in ("/runs/t5search/invalidate", "/runs/t5search/submit", "/runs/batch/submit"):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer dashboard-token").status_code, 405)
+
+    def test_anonymous_and_wrong_token_callers_are_refused(self):
+        self.assertEqual(self.client.post("/runs/t5search/invalidate").status_code, 403)
+        self.assertEqual(self.client.post("/runs/t5search/invalidate", HTTP_AUTHORIZATION="Bearer guess").status_code, 403)
+        self.assertEqual(self.client.post("/run/t5search/keywords", "seo", content_type="text/plain").status_code, 403)
+
+    def test_a_token_caller_needs_no_csrf_token(self):
+        response = self.client.post("/runs/t5search/invalidate", HTTP_AUTHORIZATION="Bearer dashboard-token")
+        self.assertEqual(response.json(), {"scenario": "t5search", "invalidated": True})
+
+    def test_a_signed_in_user_must_send_the_csrf_token(self):
+        self.client.force_login(User.objects.create_user("monitor"))
+        self.assertEqual(self.client.post("/runs/t5search/invalidate").status_code, 403)
+        self.client.cookies["csrftoken"] = "a" * 64
+        response = self.client.post("/runs/t5search/invalidate", HTTP_X_CSRFTOKEN="a" * 64)
+        self.assertEqual(response.status_code, 200)
+
+
+###################################################
+# The keyword matrix
+###################################################
+class KeywordHandler(FakeHandler):
+    """The search page: typing a keyword fills the suggestion list dropdown_ms[keyword] ms after the first
+    keystroke, and ENTER lands on its results URL, except for the keywords in stuck"""
+    def __init__(self, dropdown_ms, stuck=()):
+        super().__init__()
+        self.dropdown_ms = dropdown_ms
+        self.stuck = stuck
+        self.typed = ""
+
+    def execute_script(self, script, *args):
+        self.check()
+        if script == PROBE_SCRIPT:
+            return [{"found": True, "visible": True, "text": "", "element": SimpleNamespace(send_keys=self.send_keys)}
+                    for xpath in args[0]]
+        if script == SUGGESTION_WATCH_SCRIPT:
+            return True
+        if "__suggestionsAt" in script:
+            shown = self.dropdown_ms.get(self.typed)
+            return None if shown is None else [shown]
+        return None
+
+    def send_keys(self, keys):
+        if keys != Keys.ENTER:
+            self.typed = keys
+        elif self.typed not in self.stuck:
+            self.current_page = f"https://solosegment.com/?s={quote_plus(self.typed)}"
+
+
+class KeywordMatrixTests(InTempDirectory, SimpleTestCase):
+    def page(self, handler):
+        config = scenario_config(get_plan("t5search"), on_event=None, use_pool=False,
+                                 waits={"timeout": 0.05, "poll": 0.005, "max_poll": 0.005})
+        page = ScenarioPage(config, "FakeKeyword", launch=False)
+        page.handler = handler
+        return page
+
+    def test_each_keyword_is_timed_and_summarised_per_browser(self):
+        page = self.page(KeywordHandler({"seo": 120, "site search": 300}, stuck=["blog"]))
+        page.run_keywords(["seo", "site search", "blog"])
+        measured = page.timing["keywords"]["measured"]
+        self.assertEqual([row[:2] for row in measured], [["seo", 120], ["site search", 300], ["blog", None]])
+        self.assertIsNone(measured[2][2])  # never reached its results URL
+        self.assertEqual([step["status"] for step in page.steps], ["pass", "pass", "fail"])
+        summary = page.timing["keywords"]["summary"]
+        self.assertEqual(summary["time to dropdown"], {"count": 2, "p50": 120, "p95": 300, "p99": 300})
+        self.assertEqual(summary["time to results URL"]["count"], 2)
+
+    def test_percentiles_leave_out_the_keywords_that_never_got_there(self):
+        measured = [[f"k{number}", number * 10, None if number % 2 else number] for number in range(1, 101)]
+        summary = keyword_summary(measured)
+        self.assertEqual(summary["time to dropdown"], {"count": 100, "p50": 500, "p95": 950, "p99": 990})
+        self.assertEqual(summary["time to results URL"], {"count": 50, "p50": 50, "p95": 96, "p99": 100})
+        self.assertEqual(keyword_summary([["k", None, None]]), {})
+
+    def test_keywords_come_from_the_request_or_the_keywords_file(self):
+        factory = RequestFactory()
+        self.assertEqual(views.request_keywords(factory.get("/", {"keywords": "seo, ,blog "})), ["seo", "blog"])
+        self.assertEqual(views.request_keywords(factory.post("/", "seo\n\nsite search\n", content_type="text/plain")),
+                         ["seo", "site search"])
+        with open("keywords.txt", "w", encoding="utf-8") as keywords:
+            keywords.write("# monitored\nseo\n\nblog\n")
+        with override_settings(SELENIUM_KEYWORDS_FILE="keywords.txt"):
+            self.assertEqual(views.request_keywords(factory.get("/")), ["seo", "blog"])
+        many = ",".join(f"k{number}" for number in range(views.MAX_KEYWORDS + 50))
+        self.assertEqual(len(views.request_keywords(factory.get("/", {"keywords": many}))), views.MAX_KEYWORDS)
+
+    def test_the_endpoint_needs_keywords_and_a_scenario_that_can_take_them(self):
+        self.assertEqual(self.client.get("/run/t5search/keywords").status_code, 400)
+        self.assertEqual(self.client.get("/run/nothing/keywords", {"keywords": "seo"}).status_code, 404)
+
+
+###################################################
+# Submitting a run, polling it, and fetching its result
+###################################################
+@override_settings(SELENIUM_API_TOKENS=["dashboard-token"], SELENIUM_JOB_BACKEND="memory", SELENIUM_BACKGROUND_JOBS=True)
+class JobEndpointTests(InTempDirectory, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = JobQueue(max_workers=1, result_ttl=60)
+        patcher = mock.patch("searchbox.jobs._job_queue", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def run_scenario(self, name):
+        """Logs one line as a run of name, once the test lets it"""
+        self.release.wait(5)
+        run = open_run(name)
+        run.info("Info FakeHealthy search box found")
+        return run.close()
+
+    def submit(self):
+        return self.client.post("/runs/t5search/submit", HTTP_AUTHORIZATION="Bearer dashboard-token")
+
+    def test_a_run_is_polled_until_done_and_then_its_log_served(self):
+        with mock.patch("searchbox.runner.run_scenario", side_effect=self.run_scenario):
+            submitted = self.submit()
+            self.assertEqual(submitted.status_code, 202)
+            job = submitted.json()
+            self.assertIn(self.client.get(job["status_url"]).json()["status"], ("queued", "running"))
+            self.assertEqual(self.client.get(job["result_url"]).status_code, 202)  # the waiting page, for now
+            self.release.set()
+            self.queue.get(job["job_id"]).wait(5)
+        self.assertEqual(self.client.get(job["status_url"]).json()["status"], "done")
+        result = self.client.get(job["result_url"])
+        self.assertEqual(result.status_code, 200)
+        self.assertIn(b"search box found", b"".join(result.streaming_content))
+
+    def test_the_page_views_answer_at_once_with_a_waiting_page(self):
+        with mock.patch("searchbox.runner.run_scenario", side_effect=self.run_scenario):
+            response = self.client.get("/display_log5.html")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'id="job-status"', response.content)
+            self.assertEqual(self.submit().json()["attached"], 2)  # the API call joined the page's run
+
+    def test_a_failed_run_and_an_unknown_job(self):
+        with mock.patch("searchbox.runner.run_scenario", side_effect=RuntimeError("no browsers")):
+            job = self.submit().json()
+            self.queue.get(job["job_id"]).wait(5)
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], "failed")
+        self.assertIn("no browsers", status["error"])
+        self.assertEqual(self.client.get(job["result_url"]).status_code, 500)
+        self.assertEqual(self.client.get("/jobs/0123abcd").status_code, 404)
+        self.assertEqual(self.client.get("/jobs/0123abcd/result").status_code, 404)
+
+
+###################################################
+# Phase timings on /metrics
+###################################################
+class MetricsTests(InTempDirectory, SimpleTestCase):
+    def page(self, browse, phases, launched=True, status="pass", savings=None):
+        return SimpleNamespace(browse=browse, phases=phases, launched=launched, steps=[{"status": status}],
+                               resource_savings=savings)
+
+    def test_runs_are_exposed_as_prometheus_histograms_and_counters(self):
+        observe_run("t5search", [
+            self.page("Firefox", [("driver_launch", 0.07), ("page_load", 0.3)], savings={"bytes": 2048, "seconds": 0.4}),
+            self.page("Firefox", [("driver_launch", 200)], status="fail"),
+            self.page("Safari", [], launched=False),
+        ])
+        response = self.client.get("/metrics")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        lines = response.content.decode("utf-8").splitlines()
+        launch = 'scenario="t5search",browser="Firefox",phase="driver_launch"'
+        self.assertIn(f'selenium_phase_seconds_bucket{{{launch},le="0.05"}} 0', lines)
+        self.assertIn(f'selenium_phase_seconds_bucket{{{launch},le="0.1"}} 1', lines)
+        self.assertIn(f'selenium_phase_seconds_bucket{{{launch},le="120"}} 1', lines)
+        self.assertIn(f'selenium_phase_seconds_bucket{{{launch},le="+Inf"}} 2', lines)  # buckets are cumulative
+        self.assertIn(f"selenium_phase_seconds_sum{{{launch}}} 200.07", lines)
+        self.assertIn(f"selenium_phase_seconds_count{{{launch}}} 2", lines)
+        for status, count in (("pass", 1), ("fail", 1)):
+            self.assertIn(f'selenium_browser_runs_total{{scenario="t5search",browser="Firefox",status="{status}"}} {count}',
+                          lines)
+        self.assertIn('selenium_browser_runs_total{scenario="t5search",browser="Safari",status="unavailable"} 1', lines)
+        self.assertIn('selenium_blocked_bytes_total{scenario="t5search",browser="Firefox"} 2048', lines)
+        self.assertIn("# TYPE selenium_phase_seconds histogram", lines)
+
+    def test_percentiles_are_nearest_rank(self):
+        values = list(range(10, 0, -1))
+        self.assertEqual([percentile(values, p) for p in (0, 50, 95, 99, 100)], [1, 5, 10, 10, 10])
+        self.assertEqual(percentile([0.3], 99), 0.3)
+        self.assertIsNone(percentile([], 50))
+
+
+###################################################
+# The run history endpoints
+###################################################
+class HistoryParameterTests(InTempDirectory, TestCase):
+    def test_bad_paging_parameters_fall_back_instead_of_failing(self):
+        for per_page in ("0", "-3", "many", ""):
+            response = self.client.get("/history.json", {"per_page": per_page})
+            self.assertEqual(response.status_code, 200, per_page)
+        self.assertEqual(self.client.get("/timings.json", {"runs": "0"}).status_code, 200)
+        self.assertEqual(self.client.get("/timings.json", {"runs": "lots"}).status_code, 200)
+
+
+###################################################
+# The log offset index
+###################################################
+class LogIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.directory.name, "t5search.log")
+        self.index = LogIndex(self.log_path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append_run(self, key, text):
+        with open(self.log_path, "ab") as log_file:
+            start = log_file.tell()
+            log_file.write(text.encode("utf-8"))
+            end = log_file.tell()
+        stat = os.stat(self.log_path)
+        self.index.add(key, start, end, [stat.st_dev, stat.st_ino])
+
+    def read_run(self, key):
+        return b"".join(self.index.stream_run(self.index.find(key))).decode("utf-8")
+
+    def test_each_run_streams_only_its_own_bytes(self):
+        self.append_run("first", "one\n")
+        self.append_run("second", "two\nlines\n")
+        self.assertEqual(self.read_run("first"), "one\n")
+        self.assertEqual(self.read_run("second"), "two\nlines\n")
+        self.assertEqual(self.index.last()["run"], "second")
+        self.assertIsNone(self.index.find("missing"))
+
+    def test_find_reads_back_across_index_blocks(self):
+        for number in range(3000):  # an index of several read blocks
+            self.append_run(f"run{number}", f"{number}\n")
+        self.assertEqual(self.read_run("run0"), "0\n")
+        self.assertEqual(self.read_run("run1500"), "1500\n")
+        self.assertEqual(self.index.last()["run"], "run2999")
+
+    def test_old_run_is_found_in_the_rotated_file(self):
+        self.append_run("old", "old run\n")
+        os.replace(self.log_path, self.log_path + ".1")
+        self.append_run("new", "new run\n")
+        self.assertEqual(self.read_run("old"), "old run\n")
+        self.assertEqual(self.read_run("new"), "new run\n")
+
+    def test_prune_drops_runs_whose_file_is_gone(self):
+        self.append_run("old", "old run\n")
+        os.replace(self.log_path, self.log_path + ".1")
+        self.append_run("new", "new run\n")
+        os.remove(self.log_path + ".1")
+        self.assertEqual(self.index.prune(), 1)
+        self.assertIsNone(self.index.find("old"))
+        self.assertEqual(self.read_run("new"), "new run\n")
+
+
+###################################################
+# The replica benchmark
+###################################################
+class BenchRunTests(InTempDirectory, SimpleTestCase):
+    def test_benchmark_runs_stay_out_of_the_scenario_log(self):
+        browser_backends.register("FakeHealthy", fake_backend())
+        self.addCleanup(handler_pool.clear)
+        run_key = bench_run("t5search", browser_set=["FakeHealthy"], initial_url=UNREACHABLE, record=False,
+                            step_retries=0, on_event=None)
+        self.assertFalse(os.path.exists("t5search.log"))
+        self.assertIsNone(log_index("t5search").find(run_key))
+        self.assertIn(b"FakeHealthy", b"".join(log_index(BENCH_LOG).stream_run(log_index(BENCH_LOG).find(run_key))))
+
+
+###################################################
+# The HTTP load generator
+###################################################
+async def keep_alive_server(connections):
+    """An HTTP/1.1 server on the test's own event loop, counting the connections it is handed"""
+    async def answer(reader, writer):
+        connections.append(writer)
+        while await reader.readline():
+            while await reader.readline() not in (b"\r\n", b""):
+                pass
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+        writer.close()
+    return await asyncio.start_server(answer, "127.0.0.1", 0)
+
+
+class LoadGeneratorTests(SimpleTestCase):
+    def config(self, url):
+        return {"keyword": "solo", "keywords": ["solo", "site search"], "results_url_pattern": url + "?s={keyword}"}
+
+    def test_users_are_coroutines_on_one_keep_alive_connection_each(self):
+        async def load():
+            connections, threads = [], set()
+            server = await keep_alive_server(connections)
+            port = server.sockets[0].getsockname()[1]
+
+            async def watch():
+                while True:
+                    threads.add(threading.active_count())
+                    await asyncio.sleep(0.02)
+            watcher = asyncio.ensure_future(watch())
+            report = await run_load(self.config(f"http://127.0.0.1:{port}/"), users=20, duration=0.3)
+            watcher.cancel()
+            server.close()
+            return report.as_dict(), len(connections), threads
+
+        report, connections, threads = asyncio.run(load())
+        self.assertEqual(report["errors"], {})
+        self.assertGreater(report["requests"], 20)
+        self.assertEqual(connections, 20)  # each user kept its one connection
+        self.assertEqual(threads, {threading.active_count()})  # and no thread was started for them
+
+    def test_connections_the_server_closes_are_reopened(self):
+        with ReplicaServer() as replica:  # HTTP/1.0: one request per connection
+            report = asyncio.run(run_load(self.config(replica.url), users=2, duration=0.3)).as_dict()
+        self.assertEqual(report["errors"], {})
+        self.assertGreater(report["requests"], 2)
+
+    def test_the_rate_limit_holds_across_users(self):
+        with ReplicaServer() as replica:
+            report = asyncio.run(run_load(self.config(replica.url), users=5, duration=0.5, rate=20)).as_dict()
+        self.assertLessEqual(report["requests"], 11)
+
+    def test_failures_are_counted_by_kind(self):
+        with ReplicaServer() as replica:
+            missing = asyncio.run(run_load({"keyword": "solo", "results_url_pattern": replica.url + "missing?s={keyword}"},
+                                           users=1, duration=0.2)).as_dict()
+        refused = asyncio.run(run_load(self.config(UNREACHABLE), users=1, duration=0.2)).as_dict()
+        self.assertEqual(list(missing["errors"]), ["HTTP 404"])
+        self.assertEqual(missing["error_rate"], 1.0)
+        self.assertEqual(list(refused["errors"]), ["ConnectionRefusedError"])
+        self.assertIsNone(refused["p50"])
+
+    def test_search_urls_come_from_the_browser_config(self):
+        self.assertEqual(search_urls(self.config("http://site/")), ["http://site/?s=solo", "http://site/?s=site+search"])
+        self.assertEqual(search_urls({"keyword": "solo", "results_url": "http://site/?s=solo"}), ["http://site/?s=solo"])
+
+
+###################################################
+# Invalidating a scenario drops its fast-path results too
+###################################################
+class InvalidateScenarioTests(SimpleTestCase):
+    def test_key_covers_every_kind_of_run(self):
+        for key in ("t5search", "t5search:http", "t5search:keywords:seo,blog", "batch:t6search,t5search"):
+            self.assertTrue(key_covers(key, "t5search"), key)
+        for key in ("t6search", "t6search:http", "batch:t6search", "t5searchx"):
+            self.assertFalse(key_covers(key, "t5search"), key)
+
+    def test_invalidate_scenario_drops_each_of_its_cached_results(self):
+        queue = JobQueue(max_workers=1, result_ttl=60)
+        keys = ["t5search", "t5search:http", "batch:t5search,t6search", "t6search:http"]
+        jobs = {key: queue.submit("t5search", lambda: "done", key=key) for key in keys}
+        for job in jobs.values():
+            job.wait(5)
+        queue.invalidate_scenario("t5search")
+        self.assertEqual(list(queue.cache), ["t6search:http"])
+        queue.executor.shutdown(wait=True)
+
+
+###################################################
+# The browser capability probe
+###################################################
+class CapabilityProbeTests(InTempDirectory, TestCase):
+    def test_a_reprobe_keeps_the_old_entries_until_it_is_done(self):
+        capabilities = BrowserCapabilities()
+        capabilities.entries = {("Chrome",): {"browser": "Chrome", "available": True}}
+        seen = []
+
+        def probe(config, browsers):
+            seen.append(capabilities.as_list())  # what a run starting mid-probe would see
+            return {("Firefox",): {"browser": "Firefox", "available": False}}
+        with mock.patch.object(capabilities, "_probe", side_effect=probe):
+            capabilities.refresh({}, ["Firefox"])
+        self.assertEqual([entry["browser"] for entry in seen[0]], ["Chrome"])
+        self.assertEqual([entry["browser"] for entry in capabilities.as_list()], ["Firefox"])
+
+    @override_settings(SELENIUM_API_TOKENS=["ops-token"])
+    def test_only_staff_or_a_token_can_start_a_probe_and_it_is_queued(self):
+        client = Client(enforce_csrf_checks=True)
+        with mock.patch.object(views, "probe_all", return_value={}) as probe_all:
+            self.assertEqual(client.post("/capabilities").status_code, 403)
+            client.force_login(User.objects.create_user("viewer"))
+            self.assertEqual(client.post("/capabilities").status_code, 403)  # signed in, but not staff
+            response = client.post("/capabilities", HTTP_AUTHORIZATION="Bearer ops-token")
+            self.assertEqual(response.status_code, 202)
+            views.job_queue().get(response.json()["job_id"]).wait(5)
+        probe_all.assert_called_once_with()
+        self.assertEqual(client.get("/capabilities").status_code, 200)
+
+
+###################################################
+# Resource blocking and what it saves
+###################################################
+class WeighedHandler(FakeHandler):
+    """A session whose page always weighs page_bytes in Resource Timing"""
+    page_bytes = 0
+
+    def execute_script(self, script, *args):
+        self.check()
+        return {"bytes": self.page_bytes, "requests": 10}
+
+
+class ResourceBlockingTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        browser_backends.register("FakeWeighed", SimpleNamespace(launch=lambda page: WeighedHandler()))
+        patcher = mock.patch("maininterfacer.load_baselines", LoadBaselines(sample=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def page(self, resources, page_bytes):
+        WeighedHandler.page_bytes = page_bytes
+        return MainInterfacer({"initial_url": "http://site/", "results_url": "", "keyword": "", "running_platform": "Linux",
+                               "selenium_ver": "4", "handler_path": "", "resources": resources}, "FakeWeighed")
+
+    def test_the_checks_do_not_block_unless_a_scenario_opts_in(self):
+        self.assertEqual(get_plan("t5search").resources, {})
+        self.assertEqual(get_plan("t6search").resources, {})
+
+    def test_the_baseline_keeps_the_page_load_strategy_and_savings_compare_like_with_like(self):
+        baseline = self.page(SEARCH_ONLY, 1000)
+        self.assertTrue(baseline.baseline_run)
+        self.assertEqual(baseline.resources, {"page_load_strategy": "eager"})  # unblocked, but still eager
+        baseline.measure_page_load(2.0)
+        blocked = self.page(SEARCH_ONLY, 400)
+        self.assertFalse(blocked.baseline_run)
+        blocked.measure_page_load(1.5)
+        self.assertEqual(blocked.resource_savings, {"bytes": 600, "seconds": 0.5})
+
+    def test_a_normal_load_is_no_baseline_for_an_eager_one(self):
+        self.page({"block": ["image"]}, 1000).measure_page_load(3.0)  # a baseline under the normal strategy
+        eager = self.page(dict(SEARCH_ONLY), 400)
+        self.assertTrue(eager.baseline_run)  # so the eager scenario still measures its own
+
+    def test_backends_say_what_they_cannot_block(self):
+        page = SimpleNamespace(browse="Firefox", resources=dict(SEARCH_ONLY, block=["image", "stylesheet"]), report=[])
+        page.log = page.report.append
+        self.assertEqual(unsupported(page, **firefox.RESOURCES), ["stylesheet blocking", "block_urls"])
+        page.browse = "Safari"
+        self.assertEqual(len(unsupported(page, **safari.RESOURCES)), 4)
+        self.assertIn("Warning Safari can't do image blocking", page.report[-1])
+        page.resources = {}
+        self.assertEqual(unsupported(page, **safari.RESOURCES), [])
+
+
+###################################################
+# The site's own timings
+###################################################
+class LoadingHandler(FakeHandler):
+    """A session whose page finishes loading on the loaded_after'th check, and whose timing reads as it was then"""
+    def __init__(self, loaded_after=3):
+        super().__init__()
+        self.loaded_after = loaded_after
+        self.checks = 0
+        self.captured_after = None
+
+    def execute_script(self, script, *args):
+        self.check()
+        if script == PAGE_LOADED_SCRIPT:
+            self.checks += 1
+            return self.checks >= self.loaded_after
+        if script == TIMING_SCRIPT:
+            self.captured_after = self.checks
+            loaded = self.checks >= self.loaded_after
+            return {"ttfb": 80.4, "dom_content_loaded": 300.6, "load": 900.2 if loaded else None, "bytes": 5000,
+                    "resources": {"img": [3, 1200, 150.7], "script": [2, 800, 99.2]},
+                    "slowest": [["https://site/hero.png", 150.7]]}
+        return None
+
+
+class TimingCaptureTests(InTempDirectory, TestCase):
+    def page(self, handler, timeout=5):
+        browser_backends.register("FakeLoading", SimpleNamespace(launch=lambda page: handler))
+        return MainInterfacer({"initial_url": "http://site/", "results_url": "", "keyword": "", "running_platform": "Linux",
+                               "selenium_ver": "4", "handler_path": "",
+                               "waits": {"timeout": timeout, "poll": 0.001, "max_poll": 0.001}}, "FakeLoading")
+
+    def test_timing_is_captured_once_the_page_has_loaded(self):
+        handler = LoadingHandler(loaded_after=3)
+        page = self.page(handler)
+        page.capture_timing("results")
+        self.assertEqual(handler.captured_after, 3)
+        self.assertEqual(page.timing["results"]["load"], 900)
+        self.assertEqual(page.timing["results"]["ttfb"], 80)
+        self.assertEqual(page.timing["results"]["resources"], {"img": [3, 1200, 151], "script": [2, 800, 99]})
+        self.assertEqual(page.timing["results"]["slowest"], [["https://site/hero.png", 151]])
+        self.assertIn("load_wait", [phase for phase, seconds in page.phases])
+
+    def test_a_page_that_never_loads_keeps_what_it_has(self):
+        page = self.page(LoadingHandler(loaded_after=10 ** 6), timeout=0.05)
+        page.capture_timing("landing")
+        self.assertIsNone(page.timing["landing"]["load"])
+        self.assertEqual(page.timing["landing"]["dom_content_loaded"], 301)
+        self.assertTrue(any("landing page load (gave up)" in line for line in page.report))
+
+    def test_timings_json_summarises_each_browser(self):
+        now = timezone.now()
+        run = Run.objects.create(scenario="t5search", started_at=now, finished_at=now, duration=1, status="pass")
+        for number, ttfb in enumerate([100, 200, 300, 400]):
+            BrowserSession.objects.create(run=run, scenario="t5search", browser="Chrome", status="pass",
+                                          started_at=now + timedelta(seconds=number), finished_at=now, duration=1,
+                                          timing={"landing": {"ttfb": ttfb, "load": None}, "keystroke_to_dropdown": 50})
+        BrowserSession.objects.create(run=run, scenario="t6search", browser="Chrome", status="pass", started_at=now,
+                                      finished_at=now, duration=1, timing={"landing": {"ttfb": 9999}})
+        summary = self.client.get("/timings.json", {"scenario": "t5search"}).json()["browsers"]["Chrome"]
+        self.assertEqual(summary["landing_ttfb"], {"count": 4, "p50": 200, "p95": 400, "max": 400})
+        self.assertEqual(summary["keystroke_to_dropdown"]["count"], 4)
+        self.assertNotIn("landing_load", summary)  # never reached, so not summarised
+        latest = self.client.get("/timings.json", {"scenario": "t5search", "runs": "2"}).json()["browsers"]["Chrome"]
+        self.assertEqual(latest["landing_ttfb"], {"count": 2, "p50": 300, "p95": 400, "max": 400})
+
+
+###################################################
+# Running a browser_set's browsers side by side
+###################################################
+class ParallelBrowserSetTests(SimpleTestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running, self.peak = 0, 0
+
+    def scenario(self, config, browse):
+        """Holds each browser a moment, noting how many ran at once; later browsers finish first"""
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05 * (len(config["browser_set"]) - config["browser_set"].index(browse)))
+        with self.lock:
+            self.running -= 1
+        return SimpleNamespace(browse=browse)
+
+    def run_set(self, browsers, **options):
+        events = []
+        pages = run_browser_set(self.scenario, dict({"browser_set": browsers, "on_event": events.append}, **options))
+        return pages, events
+
+    def test_browsers_run_at_once_and_report_in_browser_set_order(self):
+        browsers = ["Firefox", "Chrome", "Edge", "IE"]
+        pages, events = self.run_set(browsers, parallel=True, max_workers=None)
+        self.assertEqual(self.peak, 4)
+        self.assertEqual([page.browse for page in pages], browsers)
+        self.assertTrue(all(page.started_at <= page.finished_at for page in pages))
+        self.assertEqual([event["type"] for event in events], ["run_started", "run_finished"])
+
+    def test_the_concurrency_cap_holds(self):
+        pages, _ = self.run_set(["Firefox", "Chrome", "Edge", "IE"], parallel=True, max_workers=2)
+        self.assertEqual(self.peak, 2)
+        self.assertEqual(len(pages), 4)
+
+    def test_sequential_mode_runs_one_browser_at_a_time(self):
+        pages, _ = self.run_set(["Firefox", "Chrome", "Edge"], parallel=False)
+        self.assertEqual(self.peak, 1)
+        self.assertEqual([page.browse for page in pages], ["Firefox", "Chrome", "Edge"])
+
+
+###################################################
+# A failing browser is recorded and the run moves on
+###################################################
+UNREACHABLE = "http://127.0.0.1:9/"  # refused at once, so start_the_session fails without a network
+
+
+class FailingBrowserTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.healthy, self.crashed = fake_backend(), fake_backend(crashed=True)
+        browser_backends.register("FakeHealthy", self.healthy)
+        browser_backends.register("FakeCrashed", self.crashed)
+        self.addCleanup(handler_pool.clear)
+
+    def run_both(self):
+        return run_scenario("t5search", browser_set=["FakeHealthy", "FakeCrashed"], initial_url=UNREACHABLE,
+                            record=False, step_retries=0, use_pool=True, on_event=None)
+
+    def test_crashed_session_does_not_abort_the_run(self):
+        run_key = self.run_both()
+        log = b"".join(log_index("t5search").stream_run(log_index("t5search").find(run_key))).decode("utf-8")
+        self.assertIn("FakeHealthy", log)
+        self.assertIn("FakeCrashed", log)
+
+    def test_crashed_session_is_released_and_quit(self):
+        self.run_both()
+        crashed, = self.crashed.launched
+        self.assertTrue(crashed.quit_called)
+        self.assertNotIn(id(crashed), handler_pool.in_use)
+        self.assertNotIn(id(self.healthy.launched[0]), handler_pool.in_use)
+
+    def test_a_browser_that_raises_gets_a_failed_page(self):
+        def scenario(config, browse):
+            if browse == "FakeCrashed":
+                raise RuntimeError("driver went away")
+            return SimpleNamespace(browse=browse, steps=[{"status": "pass"}])
+        pages = run_browser_set(scenario, {"browser_set": ["FakeHealthy", "FakeCrashed"], "initial_url": "",
+                                           "results_url": "", "keyword": "", "running_platform": "Linux",
+                                           "selenium_ver": "4", "handler_path": ""})
+        self.assertEqual([page.browse for page in pages], ["FakeHealthy", "FakeCrashed"])
+        self.assertEqual(pages[1].steps[-1]["status"], "fail")
+        self.assertIn("driver went away", pages[1].steps[-1]["error"])
+
+
+###################################################
+# Live progress over Server-Sent Events
+###################################################
+async def watch_events(channel, until):
+    """Be one /events/<channel> viewer until until events have arrived, then leave. Returns what was sent"""
+    sent, left = [], asyncio.Event()
+
+    async def receive():
+        await left.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if sum(part.get("body", b"").count(b"event: ") for part in sent) >= until:
+            left.set()
+    await asyncio.wait_for(sse_application({"type": "http", "path": f"/events/{channel}"}, receive, send), 5)
+    return sent
+
+
+class EventStreamTests(SimpleTestCase):
+    def test_a_viewer_gets_the_run_so_far_then_each_event_as_it_happens(self):
+        event_bus.publish("sse-live", {"type": "run_started", "browser_set": ["Firefox"]})
+        event_bus.publish("sse-live", {"type": "log", "message": "Info Firefox browser handler found"})
+
+        async def view():
+            viewer = asyncio.ensure_future(watch_events("sse-live", 3))
+            await asyncio.sleep(0.05)
+            threading.Thread(target=event_bus.publish, args=("sse-live", {"type": "step", "status": "pass"})).start()
+            return await viewer
+        start, *parts = asyncio.run(view())
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        self.assertEqual([part["body"].split(b"\n")[0] for part in parts],
+                         [b"event: run_started", b"event: log", b"event: step"])
+        self.assertEqual(json.loads(parts[2]["body"].split(b"data: ")[1])["status"], "pass")
+        self.assertEqual(event_bus.subscribers["sse-live"], set())  # gone once the viewer left
+
+    def test_many_viewers_share_one_thread(self):
+        async def view():
+            threads = threading.active_count()
+            viewers = [asyncio.ensure_future(watch_events("sse-many", 1)) for _ in range(200)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(event_bus.subscribers["sse-many"]), 200)
+            self.assertEqual(threading.active_count(), threads)
+            event_bus.publish("sse-many", {"type": "run_finished"})
+            return await asyncio.gather(*viewers)
+        for start, part in asyncio.run(view()):
+            self.assertTrue(part["body"].startswith(b"event: run_finished"))
+
+    def test_a_slow_viewer_loses_its_oldest_events_not_the_run(self):
+        async def fall_behind():
+            queue = event_bus.subscribe("sse-slow")
+            for number in range(QUEUE_SIZE + 10):
+                event_bus.publish("sse-slow", {"type": "log", "message": str(number)})
+            await asyncio.sleep(0.05)  # let the loop deliver them
+            event_bus.unsubscribe("sse-slow", queue)
+            return queue
+        queue = asyncio.run(fall_behind())
+        self.assertEqual(queue.qsize(), QUEUE_SIZE)
+        self.assertEqual(queue.get_nowait()["message"], "10")
+
+
+###################################################
+# Batches
+###################################################
+class BatchEventsTests(InTempDirectory, SimpleTestCase):
+    def test_batch_progress_reaches_the_batch_channel(self):
+        browser_backends.register("FakeHealthy", fake_backend())
+        self.addCleanup(handler_pool.clear)
+        run_keys = run_batch(["t5search", "t6search"], browser_set=["FakeHealthy"], initial_url=UNREACHABLE,
+                             record=False, step_retries=0, use_pool=True)
+        self.assertEqual(set(run_keys), {"t5search", "t6search"})
+        events = list(event_bus.replay[BATCH_CHANNEL])
+        self.assertEqual(sum(event["type"] == "run_started" for event in events), 1)
+        messages = [event["message"] for event in events if event["type"] == "log"]
+        self.assertTrue(any(f"URL {UNREACHABLE} not found" in message for message in messages))
+        self.assertEqual(sum("Looking for browser handler" in message for message in messages), 2)  # one per plan
+
+
+###################################################
+# The check scheduler
+###################################################
+class SchedulerTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.release = threading.Event()
+        self.started = []
+
+    def tearDown(self):
+        self.release.set()
+
+    def run_check(self, check):
+        self.started.append(check.name)
+        self.release.wait(5)
+
+    def scheduler(self, checks, **limits):
+        scheduler = Scheduler(checks, run=self.run_check, **limits)
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def check(self, name="t5search", on_overlap="skip", **options):
+        check = ScheduledCheck(name, every=60, mode="http", on_overlap=on_overlap, **options)
+        check.next_due = 0
+        return check
+
+    def test_a_run_still_going_is_not_started_again(self):
+        check = self.check()
+        scheduler = self.scheduler([check])
+        scheduler.tick(check, 0)
+        scheduler.tick(check, check.next_due)  # due again while the first run holds on
+        self.assertEqual(self.started, ["t5search"])
+        self.assertEqual(check.skipped, 1)
+
+    def test_overlap_queue_starts_one_run_once_the_previous_is_done(self):
+        check = self.check(on_overlap="queue")
+        scheduler = self.scheduler([check])
+        scheduler.tick(check, 0)
+        scheduler.tick(check, check.next_due)
+        scheduler.tick(check, check.next_due)  # a second overlap while one waits is skipped
+        self.assertEqual(check.skipped, 1)
+        self.assertIsNotNone(check.queued)
+        self.release.set()
+        deadline = time.monotonic() + 5
+        while check.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.release.clear()
+        scheduler.tick(check, 0)
+        self.assertIsNone(check.queued)
+        self.assertTrue(check.running)
+        self.release.set()
+        scheduler.stop()  # waits for the queued run
+        self.assertEqual(self.started, ["t5search", "t5search"])
+
+    def test_max_runs_holds_back_other_checks(self):
+        first, second = self.check("t5search"), self.check("t6search")
+        scheduler = self.scheduler([first, second], max_runs=1)
+        scheduler.tick(first, 0)
+        scheduler.tick(second, 0)
+        self.assertEqual(self.started, ["t5search"])
+        self.assertEqual(second.skipped, 1)
+
+    def test_browser_limit_holds_back_checks_needing_that_browser(self):
+        first, second = self.check("t5search"), self.check("t6search")
+        for check in (first, second):
+            check.browsers = lambda: ["Firefox"]
+        scheduler = self.scheduler([first, second], max_runs=2, browser_limits={"Firefox": 1})
+        scheduler.tick(first, 0)
+        scheduler.tick(second, 0)
+        self.assertEqual(self.started, ["t5search"])
+
+    def test_due_times_keep_to_the_cadence_within_the_jitter(self):
+        check = ScheduledCheck("t5search", every=60, jitter=10, mode="http")
+        for _ in range(200):
+            following = Scheduler.following(check, 1000, 1000)
+            self.assertTrue(1050 <= following <= 1070, following)
+        self.assertTrue(1110 <= Scheduler.following(check, 1000, 1065) <= 1130)  # a missed slot is dropped
+        self.assertEqual(ScheduledCheck("t5search", every=10, jitter=30).jitter, 5)
+
+
+class ScheduledJobTests(InTempDirectory, TestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("searchbox.jobs._job_queue", JobQueue(max_workers=1, result_ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_checks_share_single_flight_and_the_cache_with_the_views(self):
+        check = ScheduledCheck("t5search", every=60, mode="http")
+        with mock.patch("searchbox.runner.run_fast_path", return_value="run-key") as fast_path:
+            submit_job("http", "t5search", key="t5search:http").wait(5)  # a page asked first
+            self.assertEqual(run_check(check), "run-key")
+        fast_path.assert_called_once_with("t5search")
+
+    def test_a_failed_run_fails_the_check(self):
+        with mock.patch("searchbox.runner.run_scenario", side_effect=RuntimeError("no browsers")):
+            with self.assertRaisesRegex(RuntimeError, "no browsers"):
+                run_check(ScheduledCheck("t5search", every=60))
+
+    @override_settings(SELENIUM_JOB_BACKEND="db")
+    def test_with_the_database_backend_checks_go_to_the_workers(self):
+        self.assertIsNone(run_check(ScheduledCheck("t5search", every=60, mode="http"), timeout=0))
+        job, = QueuedJob.objects.all()
+        self.assertEqual((job.kind, job.key, job.status), ("http", "t5search:http", "queued"))
+        run_check(ScheduledCheck("t5search", every=60, mode="http"), timeout=0)
+        self.assertEqual(QueuedJob.objects.count(), 1)  # the next run attaches to the one still waiting
+
+    def test_one_process_holds_the_schedule(self):
+        held = lock_file("scheduler.lock")
+        self.assertIsNotNone(held)
+        self.assertIsNone(lock_file("scheduler.lock"))  # as it would be for any other process
+        held.close()
+        held = lock_file("scheduler.lock")
+        self.assertIsNotNone(held)
+        held.close()
+
+    def test_serving_processes_leave_the_schedule_to_the_lock_holder(self):
+        with mock.patch("searchbox.scheduler.claim_schedule", return_value=False), \
+                mock.patch("searchbox.scheduler.scheduler_from_settings") as from_settings:
+            SearchboxConfig.schedule()
+        from_settings.assert_not_called()
+
+
+class ServingTests(SimpleTestCase):
+    def serving(self, argv, run_main=None):
+        environ = {} if run_main is None else {"RUN_MAIN": run_main}
+        with mock.patch("sys.argv", argv), mock.patch.dict(os.environ, environ):
+            if run_main is None:
+                os.environ.pop("RUN_MAIN", None)
+            return serving()
+
+    def test_only_the_process_that_serves_counts(self):
+        self.assertTrue(self.serving(["gunicorn"]))
+        self.assertTrue(self.serving(["manage.py", "runserver"], run_main="true"))
+        self.assertTrue(self.serving(["manage.py", "runserver", "--noreload"]))
+        self.assertFalse(self.serving(["manage.py", "runserver"]))  # the autoreloader's parent
+        self.assertFalse(self.serving(["manage.py", "migrate"], run_main="true"))
+
+
+###################################################
+# The database job queue
+###################################################
+class WorkQueueTests(InTempDirectory, TestCase):
+    def worker(self, name, browsers=("Firefox", "Chrome")):
+        return workqueue.QueueWorker(name=name, browsers=list(browsers), lease=60, max_attempts=2)
+
+    def test_identical_submits_attach_to_the_job_in_flight(self):
+        first = workqueue.enqueue("browser", "t5search")
+        self.assertEqual(workqueue.enqueue("browser", "t5search").pk, first.pk)
+        self.assertNotEqual(workqueue.enqueue("http", "t5search", key="t5search:http").pk, first.pk)
+
+    def test_finished_result_is_reused_for_the_ttl_until_invalidated(self):
+        job = workqueue.enqueue("browser", "t5search")
+        QueuedJob.objects.filter(pk=job.pk).update(status=JOB_DONE, finished_at=timezone.now())
+        self.assertEqual(workqueue.enqueue("browser", "t5search").pk, job.pk)
+        workqueue.invalidate_scenario("t5search")
+        self.assertNotEqual(workqueue.enqueue("browser", "t5search").pk, job.pk)
+
+    def test_only_one_job_per_key_can_be_in_flight(self):
+        workqueue.enqueue("browser", "t5search")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            QueuedJob.objects.create(key="t5search", kind="browser", scenario="t5search", created_at=timezone.now())
+
+    def test_a_submit_waiting_on_the_key_lock_attaches_to_the_winner(self):
+        winner = QueuedJob(key="t5search", kind="browser", scenario="t5search", created_at=timezone.now())
+        real_lock = JobKey.objects.select_for_update
+
+        def lock_after_the_other_host(**options):  # the other host held the key and queued its job meanwhile
+            if winner.pk is None:
+                winner.save()
+            return real_lock(**options)
+        with mock.patch.object(JobKey.objects, "select_for_update", side_effect=lock_after_the_other_host) as lock:
+            job = workqueue.enqueue("browser", "t5search")
+        lock.assert_called_once_with()
+        self.assertEqual(job.pk, winner.pk)
+        self.assertEqual(QueuedJob.objects.count(), 1)
+
+    def test_long_keys_are_shortened_but_stay_distinct(self):
+        keywords = [f"keyword number {number}" for number in range(200)]
+        key = f"t5search:keywords:{','.join(keywords)}"
+        job = workqueue.enqueue("keywords", "t5search", [keywords], key=key)
+        self.assertLessEqual(len(job.key), workqueue.KEY_LENGTH)
+        self.assertTrue(job.key.startswith("t5search:keywords:"))
+        self.assertEqual(workqueue.enqueue("keywords", "t5search", [keywords], key=key).pk, job.pk)
+        other = workqueue.enqueue("keywords", "t5search", [keywords[:-1]], key=key[:-1])
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_a_job_is_claimed_once_and_only_by_a_worker_with_its_browsers(self):
+        job = workqueue.enqueue("browser", "t5search", browsers=["Firefox"])
+        self.assertIsNone(self.worker("chrome-only", browsers=["Chrome"]).claim())
+        first, second = self.worker("w1"), self.worker("w2")
+        claimed = first.claim()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (JOB_RUNNING, "w1", 1))
+        self.assertEqual(claimed.browser_set, ["Firefox"])
+        self.assertIsNone(second.claim())
+
+    def live_worker(self, name, browsers):
+        Worker.objects.create(name=name, host="elsewhere", browsers=browsers, started_at=timezone.now(),
+                              heartbeat_at=timezone.now())
+
+    def test_a_job_is_left_to_a_live_worker_with_more_of_its_browsers(self):
+        job = workqueue.enqueue("browser", "t5search", browsers=["Firefox", "Chrome"])
+        self.live_worker("both", ["Firefox", "Chrome"])
+        self.assertIsNone(self.worker("chrome-only", browsers=["Chrome"]).claim())
+        Worker.objects.filter(name="both").update(heartbeat_at=timezone.now() - timedelta(minutes=5))  # it died
+        claimed = self.worker("chrome-only", browsers=["Chrome"]).claim()
+        self.assertEqual(claimed.pk, job.pk)
+
+    def test_browsers_no_worker_has_are_run_as_unavailable_not_dropped(self):
+        workqueue.enqueue("browser", "t5search", browsers=["Firefox", "Chrome"])
+        self.live_worker("firefox-only", ["Firefox"])  # can't run more of it than we can
+        job = self.worker("chrome-only", browsers=["Chrome"]).claim()
+        self.assertEqual(job.browser_set, ["Firefox", "Chrome"])
+        self.assertEqual(job.unavailable, {"Firefox": "not available on worker chrome-only"})
+        with mock.patch("searchbox.runner.run_scenario", return_value="run-key") as run:
+            workqueue.run_job(job)
+        run.assert_called_once_with("t5search", browser_set=["Firefox", "Chrome"], unavailable=job.unavailable)
+
+    def test_expired_leases_are_requeued_until_the_attempts_run_out(self):
+        job = workqueue.enqueue("browser", "t5search", browsers=["Firefox"])
+        worker = self.worker("w1")
+        for attempt in (1, 2):
+            self.assertEqual(worker.claim().pk, job.pk)
+            QueuedJob.objects.filter(pk=job.pk).update(lease_expires=timezone.now() - timedelta(seconds=1))
+            workqueue.requeue_expired(max_attempts=2)
+            job.refresh_from_db()
+        self.assertEqual(job.status, JOB_FAILED)
+        self.assertIn("stopped responding", job.error)
+
+    def test_a_live_lease_is_left_alone(self):
+        job = workqueue.enqueue("browser", "t5search", browsers=["Firefox"])
+        self.worker("w1").claim()
+        self.assertEqual(workqueue.requeue_expired(max_attempts=2), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_RUNNING)
+
+    def test_worker_records_the_result_of_a_job_it_still_holds(self):
+        workqueue.enqueue("browser", "t5search", browsers=["Firefox"])
+        worker = self.worker("w1")
+        job = worker.claim()
+        with mock.patch.object(workqueue, "run_job", return_value="run-key"):
+            worker.execute(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (JOB_DONE, "run-key"))
+        self.assertEqual(worker.active, {})
+
+
+###################################################
+# Remote nodes, their slots, and failing over
+###################################################
+class RemoteSlotTests(SimpleTestCase):
+    def setUp(self):
+        self.nodes = RemoteNodes(retry_after=3600, slot_wait=0)
+        self.nodes.configure(nodes=[{"url": "http://a:4444", "slots": 2}, {"url": "http://b:4444", "slots": 1},
+                                    {"url": "http://ff:4444", "slots": 1, "browsers": ["Firefox"]}])
+        self.a, self.b, self.firefox_only = self.nodes.nodes
+
+    def test_sessions_go_to_the_least_loaded_node(self):
+        taken = [self.nodes.acquire("Chrome") for _ in range(3)]
+        self.assertEqual(sorted(node.url for node in taken), ["http://a:4444", "http://a:4444", "http://b:4444"])
+        self.assertEqual((self.a.sessions, self.b.sessions), (2, 1))
+
+    def test_no_free_slot_gives_none_and_a_release_frees_one(self):
+        for _ in range(3):
+            self.nodes.acquire("Chrome")
+        self.assertIsNone(self.nodes.acquire("Chrome"))
+        self.nodes.release(self.b)
+        self.assertIs(self.nodes.acquire("Chrome"), self.b)
+
+    def test_down_excluded_and_other_browsers_nodes_are_skipped(self):
+        self.a.healthy, self.a.down_since = False, time.time()
+        self.assertIs(self.nodes.acquire("Chrome"), self.b)
+        self.assertIsNone(self.nodes.acquire("Chrome", exclude=[self.b]))
+        self.assertIs(self.nodes.acquire("Firefox"), self.firefox_only)
+
+    def test_waiting_for_a_slot_ends_when_one_is_released(self):
+        self.nodes.slot_wait = 5
+        for _ in range(3):
+            self.nodes.acquire("Chrome")
+        threading.Timer(0.1, self.nodes.release, [self.a]).start()
+        self.assertIs(self.nodes.acquire("Chrome"), self.a)
+
+
+class FakeRemoteHandler(FakeHandler):
+    """A session on a RemoteNode: quitting it gives the slot back, like backends.remote's RemoteHandler"""
+    def __init__(self, node):
+        super().__init__()
+        self.node = node
+
+    def quit(self):
+        super().quit()
+        node, self.node = self.node, None
+        if node is not None:
+            remote_nodes.release(node)
+
+
+class FailoverTests(InTempDirectory, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.launched = []
+
+        def launch(page):
+            node = remote_nodes.acquire(page.browse)
+            if node is None:
+                return None
+            self.launched.append(FakeRemoteHandler(node))
+            return self.launched[-1]
+        browser_backends.register("Remote", SimpleNamespace(launch=launch))
+        self.addCleanup(browser_backends.register, "Remote", "backends.remote", "builtin")
+        self.addCleanup(remote_nodes.configure, nodes=[], retry_after=30, slot_wait=60)
+        # /status answers with the node's health as the test sets it, instead of going over the network
+        patcher = mock.patch.object(remote_nodes, "check", side_effect=lambda node: node.healthy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_nodes(self, *urls):
+        remote_nodes.configure(nodes=[{"url": url, "slots": 2} for url in urls], retry_after=3600, slot_wait=0)
+        return remote_nodes.nodes
+
+    def config(self, **overrides):
+        defaults = {"initial_url": UNREACHABLE, "use_pool": False, "step_retries": 1, "retry_backoff": 0, "on_event": None}
+        return scenario_config(get_plan("t5search"), **dict(defaults, **overrides))
+
+    def drop_first_node_on_first_failure(self, node):
+        """The first step fails (UNREACHABLE); make it look like that's because node went away"""
+        original = remote_nodes.check.side_effect
+
+        def check(checked):
+            node.healthy, node.down_since = False, time.time()
+            return original(checked)
+        remote_nodes.check.side_effect = check
+
+    def test_a_browser_the_run_is_told_is_unavailable_is_skipped_without_a_launch(self):
+        backend = fake_backend()
+        browser_backends.register("FakeHealthy", backend)
+        page = run_page(self.config(unavailable={"FakeHealthy": "not available on worker w1"}), "FakeHealthy")
+        self.assertIsNone(page.handler)
+        self.assertEqual(backend.launched, [])
+
+    def test_failover_with_no_spare_node_fails_the_browser_cleanly(self):
+        only, = self.use_nodes("http://a:4444")
+        self.drop_first_node_on_first_failure(only)
+        page = run_page(self.config(), "Chrome")
+        self.assertIsNone(page.handler)
+        self.assertEqual(page.steps[-1]["status"], "fail")
+        dead, = self.launched
+        self.assertTrue(dead.quit_called)
+        self.assertEqual(only.sessions, 0)
+        self.assertTrue(any("no remote node with a free slot" in line or "dropped" in line for line in page.report))
+
+    def test_no_failover_once_the_retries_are_used_up(self):
+        first, spare = self.use_nodes("http://a:4444", "http://b:4444")
+        self.drop_first_node_on_first_failure(first)
+        page = run_page(self.config(step_retries=0), "Chrome")
+        self.assertEqual(len(self.launched), 1)  # no session started on the spare for a retry that wouldn't come
+        self.assertEqual(page.steps[-1]["status"], "fail")
+        self.assertEqual(spare.sessions, 0)
+        self.assertFalse(any("failing over" in line for line in page.report))
+
+    def test_keyword_matrix_with_no_spare_node_fails_cleanly(self):
+        only, = self.use_nodes("http://a:4444")
+        self.drop_first_node_on_first_failure(only)
+        page = run_keyword_page(self.config(keywords=["seo"]), "Chrome")
+        self.assertIsNone(page.handler)
+        self.assertEqual(only.sessions, 0)
+
+    def test_failover_moves_the_session_to_a_spare_node(self):
+        first, spare = self.use_nodes("http://a:4444", "http://b:4444")
+        self.drop_first_node_on_first_failure(first)
+        page = run_page(self.config(), "Chrome")
+        self.assertEqual([handler.quit_called for handler in self.launched], [True, True])
+        self.assertEqual(self.launched[1].current_page, UNREACHABLE)  # the start page reloaded on the new node
+        self.assertEqual((first.sessions, spare.sessions), (0, 0))
+        self.assertIsNone(page.handler)
+
+
+###################################################
+# The background JSON-lines log writer
+###################################################
+class RunLogTests(InTempDirectory, SimpleTestCase):
+    def records(self, scenario, run_key):
+        index = log_index(scenario)
+        data = b"".join(index.stream_run(index.find(run_key))).decode("utf-8")
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_parallel_runs_are_written_as_separate_blocks_grouped_by_browser(self):
+        runs = {scenario: open_run(scenario) for scenario in ("t5search", "t6search")}
+
+        def browse(run, browser):
+            for step in range(20):
+                run.info(f"{browser} step {step}", browser=browser, browser_id=f"{browser}-id", step_id=f"s{step}")
+        threads = [threading.Thread(target=browse, args=(run, browser))
+                   for run in runs.values() for browser in ("Chrome", "Firefox")]
+        for run in runs.values():
+            run.info("header")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for scenario, run in runs.items():
+            run.info("footer")
+            records = self.records(scenario, run.close())
+            self.assertEqual({record["run_id"] for record in records}, {run.key})
+            self.assertEqual({record["scenario"] for record in records}, {scenario})
+            self.assertEqual(len(records), 42)
+            browsers = [record["browser"] for record in records]
+            self.assertEqual(browsers[0], None)
+            self.assertEqual(browsers[-1], None)
+            self.assertEqual(len(set(browsers[1:21])), 1)  # one browser's lines, then the other's
+            self.assertEqual(len(set(browsers[21:41])), 1)
+            self.assertEqual([record["step_id"] for record in records[1:21]], [f"s{step}" for step in range(20)])
+
+    def test_tracebacks_reach_the_general_log(self):
+        try:
+            raise ValueError("broken view")
+        except ValueError:
+            logging.getLogger("django.request").exception("Internal Server Error: /run/t5search")
+        open_run("t5search").close()  # written in order, so once this run is on disk the error is too
+        with open("searchbox.log", encoding="utf-8") as general:
+            records = [json.loads(line) for line in general]
+        error, = [record for record in records if record["logger"] == "django.request"]
+        self.assertEqual(error["level"], "ERROR")
+        self.assertIn("Traceback", error["message"])
+        self.assertIn("ValueError: broken view", error["message"])
+
+    def test_rotation_keeps_whole_blocks_and_prunes_the_index(self):
+        index = LogIndex("t5search.log")
+        log_file = LogFile("t5search.log", max_bytes=100, backups=1, index=index)
+        self.addCleanup(log_file.close)
+        for number in range(5):
+            start, end, file_id = log_file.write(f'{{"run_id": "run{number}", "message": "{"x" * 30}"}}\n'.encode())
+            log_file.flush()
+            index.add(f"run{number}", start, end, file_id)
+        self.assertEqual(sorted(os.listdir(".")), ["t5search.log", "t5search.log.1", "t5search.log.idx"])
+        self.assertIsNone(index.find("run0"))  # rotated out of existence, and out of the index
+        self.assertIn(b"run4", b"".join(index.stream_run(index.find("run4"))))
+        self.assertIn(b"run3", b"".join(index.stream_run(index.find("run3"))))
+
+    def test_messages_are_rendered_as_plain_text(self):
+        chunks = [b'{"message": "2026 Info Chrome found", "level": "INFO"}\n{"mess', b'age": "second"}\nold plain line\n']
+        self.assertEqual("".join(iter_messages(chunks)), "2026 Info Chrome found\nsecond\nold plain line\n")
@@ -2,24 +2,32 @@
 
 
 
-import logging
-import sys
-from datetime import datetime
-import time
-import requests
-# Selenium Imports
-from selenium import webdriver  # The webdriver class connects to the browser's instance
-from selenium.webdriver.common.keys import Keys  # The Keys class lets you emulate the stroke of keyboard keys
-from selenium.webdriver.common.by import By
-
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import platform  # To determne which OS platform we're running on
-from maininterfacer import MainInterfacer  # Maininterfacer is the base class of WebPage. It manages browser setup.
+from maininterfacer import browser_capabilities  # which browsers can launch here
+from backends.remote import remote_nodes  # ...and the remote nodes that run them elsewhere
+from backends import browser_backends  # imported one by one, as runs first need them
+from searchbox.apps import startup  # what importing the app and its views cost
+from searchbox.runner import BATCH_CHANNEL, read_keywords, probe_browsers  # runs a scenario's browser_set one worker per browser
+from searchbox.scenarios import get_plan  # the declarative scenarios, compiled once
+
+import hmac
+from functools import wraps
 
 # Django Imports
-from django.shortcuts import render, get_object_or_404 # this is a Django shortcut function, just like render is
-from django.views.generic.list import ListView
+from django.conf import settings
+from django.shortcuts import render # this is a Django shortcut function
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.urls import reverse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
+from django.core.paginator import Paginator
+from searchbox.models import BrowserSession
+from searchbox.logviewer import log_index, iter_messages  # streams one run's byte range out of the log files
+from searchbox.metrics import registry, percentile  # per-phase timing histograms
+from searchbox.jobs import job_queue, submit_job, get_job, DONE, FAILED  # runs are queued instead of run inside the request
+from searchbox import workqueue  # ...or in the database, for run_worker processes on any host (SELENIUM_JOB_BACKEND)
 
 
 
@@ -32,255 +40,346 @@ def home(request):
 
 
 ###################################################
-# t5search
+# API: the JSON endpoints dashboards and scripts call to start or drop runs
+###################################################
+def token_caller(request):
+    """Whether the request carries one of SELENIUM_API_TOKENS as "Authorization: Bearer <token>" """
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return scheme.lower() == "bearer" and any(hmac.compare_digest(token.encode("utf-8"), allowed.encode("utf-8"))
+                                              for allowed in getattr(settings, "SELENIUM_API_TOKENS", []))
+
+
+def refused(request, staff=False):
+    """None if the caller may start or drop runs, else the response saying why not. A script with a token has
+    no CSRF cookie, so only it skips the CSRF check; a signed-in user (staff, if staff) must pass it as our forms do"""
+    if token_caller(request):
+        return None
+    if not request.user.is_authenticated or (staff and not request.user.is_staff):
+        return JsonResponse({"error": "sign in, or send an API token"}, status=403)
+    return CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+
+
+def api_call(staff=False):
+    """POST only, and only from the callers refused() lets through"""
+    def decorator(view):
+        @csrf_exempt  # checked in refused(), where token callers can be told apart
+        @require_POST
+        @wraps(view)
+        def checked(request, *args, **kwargs):
+            denied = refused(request, staff)
+            return view(request, *args, **kwargs) if denied is None else denied
+        return checked
+    return decorator
+
+
+###################################################
+# JOBS: the display_log views queue a run and answer straight away with a job id.
+# The page polls run_status and then loads run_result once the browsers are done.
 ###################################################
+def submit_scenario(request, scenario):
+    """Queue the scenario in the mode asked for (?mode=browser|http, default SELENIUM_CHECK_MODE)"""
+    if request.GET.get('mode', getattr(settings, "SELENIUM_CHECK_MODE", "browser")) == "http":
+        return submit_job("http", scenario, key=f"{scenario}:http")
+    return submit_job("browser", scenario)
+
+
+def scenario_view(request, scenario):
+    """Run any scenario defined in searchbox.scenarios (or settings.SELENIUM_SCENARIOS)"""
+    if get_plan(scenario) is None:
+        raise Http404("unknown scenario")
+    return start_run(request, scenario)
+
 
 def t5search(request):
+    return start_run(request, "t5search")
 
-    class WebPage(MainInterfacer):  # This is the derived class
-
-        def __init__(self, config, browse):
-            super().__init__(config, browse)
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for browser handler")
-
-        def __repr__(self):
-            return f"Initial URL is {self.initial_url}\nLanding URL is {self.results_url}"
-
-        def start_the_session(self):  # This is where we load the website into the browser
-            """See if the website is up and then get the session"""
-            try:
-                resp = requests.get(self.initial_url)  # First make sure the URL exists and is obtainable
-                logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for URL {self.initial_url}")
-                if resp.status_code == 200:
-                    self.handler.get(self.initial_url)  # Now load the website
-                    logging.info(f"{datetime.now(tz=None)} Info {self.browse} URL {self.initial_url} found")
-                    logging.info(f"{datetime.now(tz=None)} Info {self.browse} Session Initialized")
-            except:
-                logging.info(
-                    f"{datetime.now(tz=None)} Fail {self.browse} URL {self.initial_url} not found. Process terminated")
-                self.handler.quit()
-                sys.exit(1)
-            import selenium
-
-        def simulation(self, message, xpath):
-            """Find the search box and type in a single keyword which will force a dropdown"""
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for {message}")
-            # time.sleep(10)
-            try:
-                elem = WebDriverWait(self.handler, 10).until(
-                    EC.presence_of_element_located((By.XPATH, xpath))  # We are looking inside the home session
-                )
-                logging.info(f"{datetime.now(tz=None)} Info {self.browse} {message} found")
-            except:
-                logging.info(f"{datetime.now(tz=None)} Fail {self.browse} {message} not found")
-                self.handler.quit()
-                sys.exit(1)
-            if message == "search box":
-                elem.send_keys(self.keyword)
-                elem.send_keys(Keys.ENTER)
-            return
-
-        def verify_results_url(self):
-            """Check on correct url which is https://solosegment.com/?s=solosegment_monitoring_test"""
-            time.sleep(4)  # Need this for both Firefox and
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} Checking the results URL")
-            if self.handler.current_url == self.results_url:
-                logging.info(f"{datetime.now(tz=None)} {self.browse} Pass")
-            else:
-                logging.info(
-                    f"{datetime.now(tz=None)} {self.browse} Fail with {self.handler.current_url} not equal to the expected ur: {self.results_url}")
-            return
-
-        def tear_down(self):
-            self.handler.quit()
-            return
-
-
-
-    """Selenium VERSION 4.0.0 Alpha 5 -- In Version 4 of Selenium, PhantomJS and Opera are no longer supported.
-    This script runs three simulations
-    1. Simulate a keyword entry ('s') without pressing enter
-    2. Locate the dropdown
-    3. Find a search suggestion in the dropdown
-    """
-    sel_version = (sys.modules[webdriver.__package__].__version__)[0]
-    running_platform = platform.system()  # Which OS are we running on?
-    if running_platform == "Windows":
-        browser_set = ["Firefox", "IE", "Edge", "Chrome"]
-        handler_path = "selenium_deps_windows/drivers/"
-    elif running_platform == "Darwin":  # Darwin is a mac
-        browser_set = ["Firefox", "Safari", "Chrome"]
-        handler_path = "selenium_deps_mac/drivers/"
-    elif running_platform == "Linux":
-        browser_set = ["Firefox", "Chrome"]
-        handler_path = "selenium_deps_linux/drivers/"
-
-    config = {
-        "initial_url": "https://solosegment.com/",
-        "results_url": "https://solosegment.com/?s=s",
-        "keyword": "s",
-        "browser_set": browser_set,  # browser_set depends on which OS is runnng
-        "running_platform": running_platform,
-        "selenium_ver": sel_version,  # detect the version of selenium
-        "handler_path": handler_path
-    }
-
-    logging.basicConfig(filename='t5search.log', level=logging.INFO)
-    logging.info('\n')
-    logging.info(f"{datetime.now(tz=None)} Info Selenium Version: {sel_version}")
-    logging.info(f"{datetime.now(tz=None)} Info Platform Running: {running_platform}")
-
-    for browse in browser_set:  # we are instantiating a new object each time we start a new browser
-        web_page = WebPage(config, browse)
-        if web_page.handler == None: continue  # If the browser handler isn't found, go on to the next browser
-        web_page.start_the_session()  # start the session we want to test
-        web_page.simulation("search box", xpath='//*[@id="search-6"]/form/label/input')  # simulate keyword entry
-        web_page.simulation("search suggestion dropdown", xpath='//*[@id="search-6"]/form/div')  # find dropdown
-        web_page.simulation("search suggestions",
-                            xpath='//*[@id="search-6"]/form/div/ul')  # find search suggestions
-        web_page.verify_results_url()
-        web_page.tear_down()
-
-    f = open("t5search.log", "r")
-    log_contents = f.read()
-
-    return render(request, 'display_log5.html', {'log_contents': log_contents})
 
+def t6search(request):
+    return start_run(request, "t6search")
+
+
+MAX_KEYWORDS = 200
+
+
+def request_keywords(request):
+    """Keywords from ?keywords=a,b (or a POST body with one per line), else from SELENIUM_KEYWORDS_FILE"""
+    if request.method == "POST" and request.body:
+        keywords = request.body.decode("utf-8").splitlines()
+    elif request.GET.get('keywords'):
+        keywords = request.GET['keywords'].split(',')
+    elif getattr(settings, "SELENIUM_KEYWORDS_FILE", None):
+        keywords = read_keywords(settings.SELENIUM_KEYWORDS_FILE)
+    else:
+        keywords = []
+    return [keyword.strip() for keyword in keywords if keyword.strip()][:MAX_KEYWORDS]
+
+
+@csrf_exempt  # scripts POST their keyword lists; refused() checks those
+@require_http_methods(["GET", "POST"])
+def keyword_matrix(request, scenario):
+    """Time each keyword's suggestion dropdown and results URL on one session per browser (see run_keywords).
+    A GET is a page like any scenario's; a POSTed keyword list must come from a signed-in user or a token"""
+    denied = refused(request) if request.method == "POST" else None
+    if denied is not None:
+        return denied
+    plan = get_plan(scenario)
+    if plan is None or plan.search_box is None or not plan.results_url_pattern:
+        raise Http404("unknown scenario, or one without a search box and results_url_pattern")
+    keywords = request_keywords(request)
+    if not keywords:
+        return JsonResponse({"error": "no keywords"}, status=400)
+    job = submit_job("keywords", scenario, keywords, key=f"{scenario}:keywords:{','.join(keywords)}")
+    return wait_for(request, job)
+
+
+def batch_names(request):
+    """The scenarios named in ?scenarios=a,b,c, or None if any of them is unknown"""
+    names = [name for name in request.GET.get('scenarios', '').split(',') if name]
+    if not names or any(get_plan(name) is None for name in names):
+        return None
+    return names
+
+
+def submit_batch(names):
+    """Queue one batch run: each browser launches once and runs every scenario in names on that handler"""
+    return submit_job("batch", BATCH_CHANNEL, names, key=f"batch:{','.join(names)}")
+
+
+def batch(request):
+    """Run ?scenarios=t5search,t6search back to back in one browser session per browser"""
+    names = batch_names(request)
+    if names is None:
+        raise Http404("unknown scenario")
+    return wait_for(request, submit_batch(names))
+
+
+def start_run(request, scenario):
+    """Queue the scenario and show a page that waits for it (or wait here if background jobs are off).
+    Either way concurrent viewers share one run, and a recent result is served from cache"""
+    return wait_for(request, submit_scenario(request, scenario))
+
+
+def wait_for(request, job):
+    """The job's result page, or a page that waits for it"""
+    if not getattr(settings, "SELENIUM_BACKGROUND_JOBS", True):
+        job.wait()
+        return run_result(request, job.id)
+    if job.status == DONE:  # cache hit, no need for the waiting page
+        return run_result(request, job.id)
+    return render(request, 'display_job.html', {'job': job})
+
+
+@api_call()
+def submit_run(request, scenario):
+    """JSON API: queue a run of the named scenario and return its job id"""
+    if get_plan(scenario) is None:
+        return JsonResponse({"error": f"unknown scenario {scenario}"}, status=404)
+    job = submit_scenario(request, scenario)
+    return JsonResponse(dict(job.as_dict(), status_url=reverse('run_status', args=[job.id]),
+                             result_url=reverse('run_result', args=[job.id])), status=202)
+
+
+@api_call()
+def submit_batch_run(request):
+    """JSON API: queue a batch of scenarios (?scenarios=a,b) sharing one browser session per browser"""
+    names = batch_names(request)
+    if names is None:
+        return JsonResponse({"error": "unknown or missing scenarios"}, status=404)
+    job = submit_batch(names)
+    return JsonResponse(dict(job.as_dict(), status_url=reverse('run_status', args=[job.id]),
+                             result_url=reverse('run_result', args=[job.id])), status=202)
+
+
+@api_call()
+def invalidate_run(request, scenario):
+    """JSON API: drop the scenario's cached results (browser and HTTP runs, keyword matrices, batches including it)
+    so the next view of the scenario starts a fresh run"""
+    if get_plan(scenario) is None:
+        return JsonResponse({"error": f"unknown scenario {scenario}"}, status=404)
+    job_queue().invalidate_scenario(scenario)
+    workqueue.invalidate_scenario(scenario)
+    return JsonResponse({"scenario": scenario, "invalidated": True})
+
+
+def run_status(request, job_id):
+    """JSON API: where the job is (queued, running, done or failed)"""
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({"error": "unknown job"}, status=404)
+    return JsonResponse(job.as_dict())
+
+
+def run_result(request, job_id):
+    """The finished run's log page; until then, the waiting page with a 202"""
+    job = get_job(job_id)
+    if job is None:
+        raise Http404("unknown job")
+    if job.status == FAILED:
+        return render(request, 'errors.html', status=500)
+    if job.status != DONE:
+        return render(request, 'display_job.html', {'job': job}, status=202)
+    if isinstance(job.result, dict):  # a batch: each scenario's run, one after the other
+        return stream_log_page(request, 'display_log.html', batch_chunks(job.result, job))
+    return stream_log_page(request, get_plan(job.scenario).template, run_chunks(job.scenario, job.result, job))
+
+
+def run_chunks(scenario, run_key, job):
+    """Stream one run out of the scenario's log. A run a worker on another host did is in that host's log,
+    so we say where it went instead (its steps are in the run history either way)"""
+    entry = log_index(scenario).find(run_key)
+    if entry:
+        return log_index(scenario).stream_run(entry)
+    if getattr(job, "worker", ""):
+        return [f"This run's log is on worker {job.worker}; its results are in the run history.\n".encode("utf-8")]
+    return []
+
+
+def batch_chunks(run_keys, job):
+    """Stream each scenario's run of a batch under a heading line"""
+    for scenario, run_key in run_keys.items():
+        yield f"\n{scenario}\n".encode("utf-8")
+        yield from run_chunks(scenario, run_key, job)
 
 
 ###################################################
-# t6search:
+# LOGS: stream one run (or the tail) of a scenario's log, never the whole file
 ###################################################
+def stream_log_page(request, template, chunks):
+    """Render the display_log template around a log stream, so only the page shell is built in memory"""
+    marker = "@@log_contents@@"
+    head, tail = render_to_string(template, {'log_contents': marker}, request).split(marker, 1)
+
+    def page():
+        yield head
+        for text in iter_messages(chunks):  # the log's JSON lines, shown as their messages
+            yield escape(text).replace("\n", "<br>")
+        yield tail
+    return StreamingHttpResponse(page())
+
+
+def view_log(request, scenario):
+    """Plain-text log: ?run=<key> streams that run's byte range, ?tail=<bytes> the end of the file,
+    and with neither we stream the most recent run. ?format=jsonl gives the structured records as they are"""
+    if get_plan(scenario) is None:
+        raise Http404("unknown scenario")
+    index = log_index(scenario)
+    if request.GET.get('tail'):
+        chunks = index.stream_tail(int_param(request, 'tail', 64 * 1024, 1, 16 * 1024 * 1024))
+    else:
+        entry = index.find(request.GET['run']) if request.GET.get('run') else index.last()
+        if entry is None:
+            raise Http404("no such run")
+        chunks = index.stream_run(entry)
+    if request.GET.get('format') == 'jsonl':
+        return StreamingHttpResponse(chunks, content_type="application/jsonl; charset=utf-8")
+    return StreamingHttpResponse(iter_messages(chunks), content_type="text/plain; charset=utf-8")
+
+
+@csrf_exempt  # refused() checks the POST
+@require_http_methods(["GET", "POST"])
+def capabilities(request):
+    """JSON: which browsers can launch here and their versions, the remote nodes' slots and health, which
+    browser backends have been imported (and what that cost), and what startup cost. A POST (staff, or a token)
+    queues a probe of every browser on this process's job queue and answers with the job to poll"""
+    if request.method == "POST":
+        denied = refused(request, staff=True)
+        if denied is not None:
+            return denied
+        job = job_queue().submit("capabilities", probe_all, key="capabilities:probe")  # launches every browser
+        return JsonResponse(dict(job.as_dict(), status_url=reverse('run_status', args=[job.id])), status=202)
+    return JsonResponse({"browsers": browser_capabilities.as_list(), "remote_nodes": remote_nodes.as_list(),
+                         "backends": browser_backends.as_list(), "startup": startup})
+
+
+def probe_all():
+    """The capability probe's job: this process's browsers and every remote node, checked again"""
+    return {"browsers": probe_browsers(), "remote_nodes": remote_nodes.check_all()}
+
+
+def metrics(request):
+    """Per-phase timing histograms and run counts in the Prometheus text format"""
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
-def t6search(request):
 
-   class WebPage(MainInterfacer):  # This is the derived class
-
-      def __init__(self, config, browse):
-         super().__init__(config, browse)
-         logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for browser handler")
-
-      def __repr__(self):
-         return f"Initial URL is {self.initial_url}\nLanding URL is {self.results_url}"
-
-      def start_the_session(self):  # This is where we load the website into the browser
-         """See if the website is up and then get the session"""
-         try:
-            resp = requests.get(self.initial_url)  # First make sure the URL exists and is obtainable
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for URL {self.initial_url}")
-            if resp.status_code == 200:
-               self.handler.get(self.initial_url)  # Now load the website
-               logging.info(f"{datetime.now(tz=None)} Info {self.browse} URL {self.initial_url} found")
-               logging.info(f"{datetime.now(tz=None)} Info {self.browse} Session Initialized")
-         except:
-            logging.info(
-               f"{datetime.now(tz=None)} Fail {self.browse} URL {self.initial_url} not found. Process terminated")
-            self.handler.quit()
-            sys.exit(1)
-         import selenium
-
-      def simulate_search_enter(self, message, xpath):
-         """Find the search box and type in a single keyword which will force a dropdown"""
-         logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for {message}")
-
-         try:
-            elem = WebDriverWait(self.handler, 10).until(
-               EC.presence_of_element_located((By.XPATH, xpath))  # We are looking inside the home session
-            )
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} {message} found")
-         except:
-            logging.info(f"{datetime.now(tz=None)} Fail {self.browse} {message} not found")
-            self.handler.quit()
-            sys.exit(1)
-
-         elem.send_keys(self.keyword)
-         elem.send_keys(Keys.ENTER)
-         return
-
-      def simulate_search_icon(self, message, xpath):
-         """Find the search box and type in a single keyword which will force a dropdown"""
-         logging.info(f"{datetime.now(tz=None)} Info {self.browse} Looking for {message}")
-
-         try:
-            elem = WebDriverWait(self.handler, 10).until(
-               EC.presence_of_element_located((By.XPATH, xpath))  # We are looking inside the home session
-            )
-            logging.info(f"{datetime.now(tz=None)} Info {self.browse} {message} found")
-         except:
-            logging.info(f"{datetime.now(tz=None)} Fail {self.browse} {message} not found")
-            self.handler.quit()
-            sys.exit(1)
-         elem.clear()  # We are running this test on the search results page, so clear the text box first
-         elem.send_keys(self.keyword)
-         elem = self.handler.find_element(By.XPATH, '//*[@id="search-6"]/form/input')
-         webdriver.ActionChains(self.handler).move_to_element(elem).perform()  # perform moves the mouse now
-         elem.click()
-         return
-
-      def verify_results_url(self):
-         """Check on correct url which is https://solosegment.com/?s=solosegment_monitoring_test"""
-         time.sleep(4)  # Need this for both Firefox and Safari
-         logging.info(f"{datetime.now(tz=None)} Info {self.browse} Checking the results URL")
-         if self.handler.current_url == self.results_url:
-            logging.info(f"{datetime.now(tz=None)} {self.browse} Pass")
-         else:
-            logging.info(
-               f"{datetime.now(tz=None)} {self.browse} Fail with {self.handler.current_url} not equal to the expected ur: {self.results_url}")
-         return
-
-      def tear_down(self):
-         self.handler.set_page_load_timeout(20)  # This helps prevent Error reading broker pipe
-         self.handler.quit()
-         return
-
-
-
-   """Selenium VERSION 4.0.0 Alpha 5 -- In Version 4 of Selenium, PhantomJS and Opera are no longer supported.
-   This script runs three simulations
-   1. Simulate a keyword entry ('s') without pressing enter
-   2. Locate the dropdown
-   3. Find a search suggestion in the dropdown 
-   """
-
-   sel_version = (sys.modules[webdriver.__package__].__version__)[0]
-   running_platform = platform.system()  # Which OS are we running on?
-   if running_platform == "Windows":
-      browser_set = ["Firefox", "Chrome", "IE", "Edge"]
-      handler_path = "selenium_deps_windows/drivers/"
-   elif running_platform == "Darwin":  # Darwin is a mac
-      browser_set = ["Firefox", "Safari", "Chrome"]
-      handler_path = "selenium_deps_mac/drivers/"
-   elif running_platform == "Linux":
-      browser_set = ["Firefox", "Chrome"]
-      handler_path = "selenium_deps_linux/drivers/"
-
-   config = {
-      "initial_url": "https://solosegment.com/",
-      "results_url": "https://solosegment.com/?s=solo_search",
-      "keyword": "solo_search",
-      "browser_set": browser_set,  # browser_set depends on which OS is runnng
-      "running_platform": platform.system(),
-      "selenium_ver": (sys.modules[webdriver.__package__].__version__)[0],  # detect the version of selenium
-      "handler_path": handler_path
-   }
-
-   logging.basicConfig(filename='t6search.log', level=logging.INFO)
-   logging.info('\n')
-   logging.info(f"{datetime.now(tz=None)} Info Selenium Version: {sel_version}")
-   logging.info(f"{datetime.now(tz=None)} Info Platform Running: {running_platform}")
-   for browse in browser_set:  # we are instantiating a new object each time we start a new browser
-      web_page = WebPage(config, browse)
-      if web_page.handler == None: continue  # If the browser handler isn't found, go on to the next browser
-      web_page.start_the_session()  # start the session we want to test, then simulate keyword entry
-      web_page.simulate_search_enter("search box for ENTER simulation", xpath='//*[@id="search-6"]/form/label/input')
-      web_page.simulate_search_icon("search box for ICON simulation", xpath='//*[@id="search-6"]/form/label/input')
-      web_page.verify_results_url()
-      web_page.tear_down()
-
-   f = open("t6search.log", "r")
-   log_contents = f.read()
-   print("__name__ is", __name__)
-   return render(request, 'display_log6.html', {'log_contents': log_contents})
+###################################################
+# HISTORY: structured results of past runs, newest first. Filtering by scenario and browser
+# is a lookup on the (scenario, browser, started_at) index, not a scan of the log files.
+###################################################
+def int_param(request, name, default, low, high):
+    """An integer query parameter, clamped to low..high. Missing or not a number gives the default"""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(value, high))
+
+
+def history_sessions(request):
+    """Browser sessions filtered by ?scenario= and ?browser=, with their run and steps"""
+    sessions = BrowserSession.objects.select_related('run').prefetch_related('steps')
+    if request.GET.get('scenario'):
+        sessions = sessions.filter(scenario=request.GET['scenario'])
+    if request.GET.get('browser'):
+        sessions = sessions.filter(browser=request.GET['browser'])
+    per_page = int_param(request, 'per_page', 25, 1, 200)
+    return Paginator(sessions.order_by('-started_at'), per_page).get_page(request.GET.get('page'))
+
+
+def history(request):
+    return render(request, 'history.html', {'page': history_sessions(request),
+                                            'scenario': request.GET.get('scenario', ''),
+                                            'browser': request.GET.get('browser', '')})
+
+
+def history_json(request):
+    page = history_sessions(request)
+    return JsonResponse({
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "count": page.paginator.count,
+        "sessions": [{
+            "run": session.run_id,
+            "scenario": session.scenario,
+            "browser": session.browser,
+            "status": session.status,
+            "started_at": session.started_at.isoformat(),
+            "duration": session.duration,
+            "error": session.error,
+            "timing": session.timing,
+            "steps": [{"name": step.name, "status": step.status, "started_at": step.started_at.isoformat(),
+                       "duration": step.duration, "url": step.url, "error": step.error}
+                      for step in session.steps.all()],
+        } for session in page],
+    })
+
+
+TIMING_FIELDS = {  # name in the summary -> where it is in BrowserSession.timing
+    "landing_ttfb": ("landing", "ttfb"),
+    "landing_dom_content_loaded": ("landing", "dom_content_loaded"),
+    "landing_load": ("landing", "load"),
+    "keystroke_to_dropdown": ("keystroke_to_dropdown",),
+    "results_ttfb": ("results", "ttfb"),
+    "results_dom_content_loaded": ("results", "dom_content_loaded"),
+}
+
+
+def timing_summary(request):
+    """JSON: the site's own timings per browser over the last ?runs= sessions of ?scenario= (p50/p95/max, ms)"""
+    sessions = BrowserSession.objects.exclude(timing={}).order_by('-started_at')
+    if request.GET.get('scenario'):
+        sessions = sessions.filter(scenario=request.GET['scenario'])
+    values = {}  # browser -> field -> [ms, ...]
+    for browser, timing in sessions.values_list('browser', 'timing')[:int_param(request, 'runs', 100, 1, 1000)]:
+        for field, path in TIMING_FIELDS.items():
+            value = timing
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                values.setdefault(browser, {}).setdefault(field, []).append(value)
+    return JsonResponse({"browsers": {
+        browser: {field: {"count": len(ms), "p50": percentile(ms, 50), "p95": percentile(ms, 95), "max": max(ms)}
+                  for field, ms in fields.items()}
+        for browser, fields in values.items()}})
 
 
 ####################################################
@@ -0,0 +1,237 @@
+"""Durable job queue shared by worker processes on any number of hosts.
+
+With SELENIUM_JOB_BACKEND = "db" the views don't run anything themselves: they add a row to the
+QueuedJob table (SQLite by default, whatever DATABASES says in production) and `manage.py run_worker`
+processes pick the rows up. A worker:
+  * registers itself with the browsers it can run (probed at start), and claims a job only if no other
+    live worker can run more of its browsers; it runs the job's whole browser_set, and the browsers it
+    doesn't have are recorded in the run as unavailable on that worker rather than left out
+  * claims a job with a conditional UPDATE (status still queued), so two workers never both get it,
+    and holds it on a lease of SELENIUM_WORKER_LEASE seconds, renewed by a heartbeat while it runs
+  * puts back any job whose lease has expired (its worker died), up to SELENIUM_JOB_MAX_ATTEMPTS tries
+Identical submits are single-flight, as with the in-process queue (searchbox.jobs): they attach to
+the queued or running job with the same key, or get a result that finished under SELENIUM_RESULT_TTL ago.
+Submits of one key take turns on a row lock (JobKey, select_for_update), so that holds on any database
+with row locks, MySQL and MariaDB included.
+"""
+import hashlib
+import logging
+import os
+import platform
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from searchbox.jobs import key_covers
+from searchbox.models import JobKey, QueuedJob, Worker, QUEUED, RUNNING, DONE, FAILED
+
+KEY_LENGTH = QueuedJob._meta.get_field("key").max_length
+
+
+def stored_key(key):
+    """key as it fits in QueuedJob.key: a long one (a big keyword matrix) keeps its start, so it still says
+    which scenario it's for (jobs.key_covers), and ends in a digest of the whole key"""
+    if len(key) <= KEY_LENGTH:
+        return key
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f"{key[:KEY_LENGTH - len(digest) - 1]}#{digest}"
+
+
+def enqueue(kind, scenario, args=(), browsers=(), key=None):
+    """Add a job (or attach to an identical one in flight or just finished) and return it"""
+    key = stored_key(key or scenario)
+    ttl = getattr(settings, "SELENIUM_RESULT_TTL", 60)
+    JobKey.objects.get_or_create(key=key)
+    with transaction.atomic():
+        JobKey.objects.select_for_update().get(key=key)  # a submit of the same key on another host waits here
+        existing = QueuedJob.objects.filter(key=key, status__in=[QUEUED, RUNNING]).first()
+        if existing is None and ttl > 0:
+            existing = QueuedJob.objects.filter(key=key, status=DONE, finished_at__gte=timezone.now() - timedelta(
+                seconds=ttl)).order_by("-finished_at").first()
+        if existing is not None:
+            return existing
+        return QueuedJob.objects.create(key=key, kind=kind, scenario=scenario, args=list(args),
+                                        browsers=list(browsers), created_at=timezone.now())
+
+
+def get(job_id):
+    """The job with this id, or None (our ids are numbers; the in-process queue's are hex)"""
+    if not str(job_id).isdigit():
+        return None
+    return QueuedJob.objects.filter(pk=int(job_id)).first()
+
+
+def invalidate(key):
+    """Forget the cached result for key, so the next submit queues a fresh run"""
+    QueuedJob.objects.filter(key=stored_key(key), status=DONE).update(finished_at=timezone.now() - timedelta(days=365))
+
+
+def invalidate_scenario(scenario):
+    """Forget every cached result that covers scenario (see jobs.key_covers). Only results still inside
+    SELENIUM_RESULT_TTL are cached, so that's all we look through"""
+    ttl = getattr(settings, "SELENIUM_RESULT_TTL", 60)
+    fresh = QueuedJob.objects.filter(status=DONE, finished_at__gte=timezone.now() - timedelta(seconds=ttl))
+    keys = {key for key in fresh.values_list("key", flat=True) if key_covers(key, scenario)}
+    fresh.filter(key__in=keys).update(finished_at=timezone.now() - timedelta(days=365))
+
+
+def requeue_expired(max_attempts):
+    """Put back jobs whose worker stopped heartbeating; fail those that have used up their attempts"""
+    now = timezone.now()
+    expired = QueuedJob.objects.filter(status=RUNNING, lease_expires__lt=now)
+    failed = expired.filter(attempts__gte=max_attempts).update(
+        status=FAILED, finished_at=now, lease_expires=None, error="the worker running it stopped responding")
+    requeued = expired.filter(attempts__lt=max_attempts).update(status=QUEUED, worker="", lease_expires=None)
+    if failed or requeued:
+        logging.info(f"{datetime.now(tz=None)} Info worker queue: {requeued} job(s) requeued, "
+                     f"{failed} failed after their worker died")
+    return requeued, failed
+
+
+def wanted_browsers(job, running_platform):
+    """The browser_set job runs with on this platform: the browsers it names, else its scenarios' (a batch's, in order)"""
+    from searchbox.scenarios import get_plan
+    if job.browsers:
+        return list(job.browsers)
+    names = job.args[0] if job.kind == "batch" else [job.scenario]
+    wanted = []
+    for name in names:
+        plan = get_plan(name)
+        wanted += [browse for browse in (plan.browser_set(running_platform) if plan else []) if browse not in wanted]
+    return wanted
+
+
+def runnable(job, running_platform, browsers, others=()):
+    """The browser_set this worker would run job with, or None if it should leave the job to another worker.
+    others are the browser lists of the other live workers: while one of them can run more of the job's browsers
+    than we can, it's theirs. Otherwise we take it whole, and whatever we lack is recorded as unavailable"""
+    wanted = wanted_browsers(job, running_platform)
+    covered = len([browse for browse in wanted if browse in browsers])
+    if not covered:
+        return None
+    if covered < len(wanted) and any(len(set(wanted) & set(other)) > covered for other in others):
+        return None
+    return wanted
+
+
+class QueueWorker():
+    """ One worker process: claims jobs it can run, keeps their leases alive, and records the outcome"""
+    def __init__(self, name=None, browsers=None, concurrency=1, lease=None, poll=2.0, max_attempts=None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.running_platform = platform.system()
+        self.browsers = browsers
+        self.concurrency = concurrency
+        self.lease = lease or getattr(settings, "SELENIUM_WORKER_LEASE", 60)
+        self.poll = poll
+        self.max_attempts = max_attempts or getattr(settings, "SELENIUM_JOB_MAX_ATTEMPTS", 3)
+        self.active = {}  # job id -> job, for the heartbeat
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def register(self):
+        """Advertise this worker and its browsers (probing them unless we were told)"""
+        if self.browsers is None:
+            from searchbox.runner import probe_browsers
+            self.browsers = [entry["browser"] for entry in probe_browsers() if entry["available"]]
+        now = timezone.now()
+        Worker.objects.update_or_create(name=self.name, defaults={
+            "host": socket.gethostname(), "running_platform": self.running_platform, "browsers": self.browsers,
+            "started_at": now, "heartbeat_at": now})
+        logging.info(f"{datetime.now(tz=None)} Info worker {self.name} ready for {', '.join(self.browsers) or 'no browsers'}")
+
+    def run(self, until=None):
+        """Claim and run jobs until stop() (or the monotonic time until)"""
+        self.register()
+        threading.Thread(target=self.heartbeat, daemon=True, name="heartbeat").start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="worker") as pool:
+                while not self.stopped.is_set() and (until is None or time.monotonic() < until):
+                    requeue_expired(self.max_attempts)
+                    claimed = False
+                    while len(self.active) < self.concurrency:
+                        job = self.claim()
+                        if job is None:
+                            break
+                        claimed = True
+                        pool.submit(self.execute, job)
+                    if not claimed:
+                        self.stopped.wait(self.poll)
+        finally:
+            self.stopped.set()
+            Worker.objects.filter(name=self.name).delete()
+
+    def stop(self):
+        self.stopped.set()
+
+    def claim(self):
+        """The oldest queued job we can run, now leased to us; None if there isn't one"""
+        others = [worker.browsers for worker in Worker.objects.exclude(name=self.name).filter(
+            heartbeat_at__gte=timezone.now() - timedelta(seconds=self.lease))]
+        for job in QueuedJob.objects.filter(status=QUEUED).order_by("created_at", "id")[:50]:
+            browser_set = runnable(job, self.running_platform, self.browsers, others)
+            if browser_set is None:
+                continue
+            now = timezone.now()
+            claimed = QueuedJob.objects.filter(pk=job.pk, status=QUEUED).update(
+                status=RUNNING, worker=self.name, started_at=now, lease_expires=now + timedelta(seconds=self.lease),
+                attempts=F("attempts") + 1)
+            if claimed:  # nobody beat us to it
+                job.refresh_from_db()
+                job.browser_set = browser_set
+                job.unavailable = {browse: f"not available on worker {self.name}"
+                                   for browse in browser_set if browse not in self.browsers}
+                with self.lock:
+                    self.active[job.pk] = job
+                return job
+        return None
+
+    def execute(self, job):
+        logging.info(f"{datetime.now(tz=None)} Info worker {self.name} running {job.kind} {job.scenario} "
+                     f"(job {job.pk}, attempt {job.attempts}) on {', '.join(job.browser_set)}"
+                     f"{'; unavailable here: ' + ', '.join(job.unavailable) if job.unavailable else ''}")
+        try:
+            result, status, error = run_job(job), DONE, ""
+        except Exception:
+            result, status, error = None, FAILED, traceback.format_exc(limit=5)
+        finally:
+            with self.lock:
+                self.active.pop(job.pk, None)
+        updated = QueuedJob.objects.filter(pk=job.pk, worker=self.name, status=RUNNING).update(
+            status=status, result=result, error=error, finished_at=timezone.now(), lease_expires=None)
+        if not updated:  # our lease ran out and the job went to someone else
+            logging.warning(f"{datetime.now(tz=None)} Warning worker {self.name} lost job {job.pk} before it finished")
+        close_old_connections()
+
+    def heartbeat(self):
+        """Renew the lease on every job we're running, a third of the lease at a time"""
+        while not self.stopped.wait(self.lease / 3):
+            now = timezone.now()
+            with self.lock:
+                running = list(self.active)
+            if running:
+                QueuedJob.objects.filter(pk__in=running, worker=self.name, status=RUNNING).update(
+                    lease_expires=now + timedelta(seconds=self.lease))
+            Worker.objects.filter(name=self.name).update(heartbeat_at=now)
+            close_old_connections()
+
+
+def run_job(job):
+    """Run a claimed job on the worker's browser_set and return what the in-process queue would.
+    The browsers the worker lacks are passed as unavailable, so each run records them as skipped"""
+    from searchbox.runner import run_scenario, run_fast_path, run_batch, run_keyword_matrix
+    if job.kind == "http":
+        return run_fast_path(job.scenario)
+    options = {"browser_set": job.browser_set, "unavailable": job.unavailable}
+    if job.kind == "batch":
+        return run_batch(job.args[0], **options)
+    if job.kind == "keywords":
+        return run_keyword_matrix(job.scenario, job.args[0], **options)
+    return run_scenario(job.scenario, **options)
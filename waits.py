@@ -0,0 +1,171 @@
+#!
+"""Condition-based waits for MainInterfacer pages.
+
+Instead of fixed sleeps and a fresh WebDriverWait per step, every page gets one Waiter. It polls a
+condition starting fast and backing off (poll, poll*backoff, ... up to max_poll), gives up after the
+step's timeout or when the page's whole-run budget is spent, whichever comes first, and records how
+long each wait actually took so we can see where the seconds go.
+"""
+import time
+# Selenium Imports
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+# selenium.webdriver's By and expected_conditions are imported where they're used: importing anything under
+# selenium.webdriver loads every browser's bindings, which should wait until a backend launches a browser
+
+# Installs a MutationObserver on first call, then reports whether the page has loaded and gone quiet
+DOM_SETTLED_SCRIPT = """
+if (window.__lastMutation === undefined) {
+    window.__lastMutation = Date.now();
+    new MutationObserver(function () { window.__lastMutation = Date.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true});
+}
+return document.readyState === 'complete' && Date.now() - window.__lastMutation >= arguments[0];
+"""
+
+# Whether the page has finished loading, load event included, so Navigation Timing's loadEventEnd is filled in
+PAGE_LOADED_SCRIPT = """
+if (document.readyState !== 'complete') return false;
+var p = window.performance;
+if (!p) return true;
+var nav = p.getEntriesByType ? p.getEntriesByType('navigation')[0] : null;
+return (nav || p.timing).loadEventEnd > 0;
+"""
+
+# Looks up every xpath in arguments[0] in one round trip: found, visible, text and the element itself.
+# Returns null where the browser has no document.evaluate (IE), and the Waiter falls back to find_elements
+PROBE_SCRIPT = """
+if (!document.evaluate) return null;
+var results = [];
+for (var i = 0; i < arguments[0].length; i++) {
+    var element = document.evaluate(arguments[0][i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!element) { results.push({found: false, visible: false, text: "", element: null}); continue; }
+    var style = window.getComputedStyle(element);
+    results.push({
+        found: true,
+        visible: !!(element.offsetWidth || element.offsetHeight || element.getClientRects().length) && style.visibility !== "hidden",
+        text: String(element.innerText || element.value || "").slice(0, 500),
+        element: element
+    });
+}
+return results;
+"""
+
+
+class Probe():
+    """What to check for one locator in a batched probe: the xpath, and optionally that it is visible
+    and that its text contains something"""
+    def __init__(self, xpath, visible=False, text=None):
+        self.xpath = xpath
+        self.visible = visible
+        self.text = text
+
+    def satisfied(self, result):
+        return (result["found"] and (result["visible"] or not self.visible)
+                and (self.text is None or self.text in result["text"]))
+
+    def describe(self, result):
+        """Why result doesn't satisfy this probe"""
+        if not result["found"]:
+            return f"{self.xpath} not found"
+        if self.visible and not result["visible"]:
+            return f"{self.xpath} not visible"
+        return f"{self.xpath} text {result['text'][:50]!r} does not contain {self.text!r}"
+
+
+class Waiter():
+    """ Shared wait engine for one page (one browser's run).
+    timeout: default seconds a single wait may take
+    poll, backoff, max_poll: first polling interval, its growth factor, and its ceiling
+    run_budget: seconds from the start of the page's run after which no wait may go on (None for no budget)
+    """
+    def __init__(self, page, timeout=10, poll=0.1, backoff=1.5, max_poll=1.0, run_budget=None):
+        self.page = page
+        self.timeout = timeout
+        self.poll = poll
+        self.backoff = backoff
+        self.max_poll = max_poll
+        self.deadline = None if run_budget is None else time.monotonic() + run_budget
+        self.timings = []  # (description, seconds waited, satisfied?) for every wait on this page
+
+    def until(self, condition, description, timeout=None, phase="wait"):
+        """Poll condition(handler) until it returns something truthy, and return that.
+        Raises TimeoutException when the timeout or the run budget runs out"""
+        start = time.monotonic()
+        limit = start + (self.timeout if timeout is None else timeout)
+        if self.deadline is not None:
+            limit = min(limit, self.deadline)
+        interval = self.poll
+        while True:
+            try:
+                value = condition(self.page.handler)
+                if value:
+                    self._record(description, phase, time.monotonic() - start, True)
+                    return value
+            except (NoSuchElementException, StaleElementReferenceException):
+                pass
+            remaining = limit - time.monotonic()
+            if remaining <= 0:
+                self._record(description, phase, time.monotonic() - start, False)
+                raise TimeoutException(f"waited {time.monotonic() - start:.2f}s for {description}")
+            time.sleep(min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_poll)
+
+    def element_present(self, locator, description, timeout=None):
+        from selenium.webdriver.support import expected_conditions as EC
+        return self.until(EC.presence_of_element_located(locator), description, timeout, "element_lookup")
+
+    def probe(self, xpaths):
+        """Look up every xpath in one execute_script round trip instead of one (or more) per locator.
+        Returns a dict per xpath: found, visible, text (innerText or value) and element"""
+        results = self.page.handler.execute_script(PROBE_SCRIPT, list(xpaths))
+        if results is None:  # no XPath in this browser's DOM; ask the driver one locator at a time
+            results = []
+            from selenium.webdriver.common.by import By
+            for xpath in xpaths:
+                elements = self.page.handler.find_elements(By.XPATH, xpath)
+                element = elements[0] if elements else None
+                results.append({"found": element is not None, "element": element,
+                                "visible": element is not None and element.is_displayed(),
+                                "text": (element.text or element.get_attribute("value") or "") if element else ""})
+        return results
+
+    def all_present(self, probes, description, timeout=None):
+        """Wait for every Probe to be satisfied, checking them all together on each poll.
+        Returns their probe results in order. The TimeoutException says which ones never were"""
+        last = []
+
+        def condition(handler):
+            last[:] = self.probe([probe.xpath for probe in probes])
+            return all(probe.satisfied(result) for probe, result in zip(probes, last)) and list(last)
+        try:
+            return self.until(condition, description, timeout, "element_lookup")
+        except TimeoutException as exc:
+            missing = [probe.describe(result) for probe, result in zip(probes, last) if not probe.satisfied(result)]
+            raise TimeoutException(f"{exc.msg}: {'; '.join(missing) or 'nothing probed'}")
+
+    def url_is(self, url, description="results URL", timeout=None):
+        from selenium.webdriver.support import expected_conditions as EC
+        return self.until(EC.url_to_be(url), description, timeout, "verify_wait")
+
+    def url_contains(self, fragment, description="results URL", timeout=None):
+        from selenium.webdriver.support import expected_conditions as EC
+        return self.until(EC.url_contains(fragment), description, timeout, "verify_wait")
+
+    def dom_settled(self, quiet=0.3, description="DOM settled", timeout=None):
+        """The page has finished loading and nothing in the DOM has changed for quiet seconds"""
+        return self.until(lambda handler: handler.execute_script(DOM_SETTLED_SCRIPT, int(quiet * 1000)),
+                          description, timeout, "dom_settled")
+
+    def page_loaded(self, description="page load", timeout=None):
+        """The page (under any page-load strategy) has finished loading and run its load event"""
+        return self.until(lambda handler: handler.execute_script(PAGE_LOADED_SCRIPT), description, timeout, "load_wait")
+
+    def spent(self):
+        """Total seconds this page has spent waiting"""
+        return sum(seconds for description, seconds, satisfied in self.timings)
+
+    def _record(self, description, phase, seconds, satisfied):
+        self.timings.append((description, seconds, satisfied))
+        self.page.phases.append((phase, seconds))
+        self.page.log(f"Info {self.page.browse} waited {seconds:.2f}s for {description}"
+                      f"{'' if satisfied else ' (gave up)'}")